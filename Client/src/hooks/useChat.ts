@@ -27,7 +27,10 @@ const fetchChatSession = async (): Promise<ChatMessage[]> => {
   return data.messages || [];
 };
 
-const sendMessage = async (message: string): Promise<ChatMessage> => {
+const sendMessage = async (
+  message: string,
+  onToken: (text: string) => void
+): Promise<ChatMessage> => {
   const token = localStorage.getItem("token");
   let userId = "default";
   
@@ -40,10 +43,11 @@ const sendMessage = async (message: string): Promise<ChatMessage> => {
     }
   }
 
-  const response = await fetch(`${API_URL}/chat/message`, {
+  const response = await fetch(`${API_URL}/chat/message/stream`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
+      Accept: 'text/event-stream',
       ...getAuthHeaders(),
     },
     body: JSON.stringify({ 
@@ -52,12 +56,42 @@ const sendMessage = async (message: string): Promise<ChatMessage> => {
     }),
   });
   
-  if (!response.ok) {
+  if (!response.ok || !response.body) {
     throw new Error('Failed to send message');
   }
-  
-  const data = await response.json();
-  return data.message;
+
+  // Parse the Server-Sent Events stream: route -> token* -> done
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let streamed = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf("\n\n");
+
+      const event = raw.match(/^event: (.*)$/m)?.[1];
+      const data = raw.match(/^data: (.*)$/m)?.[1];
+      if (!event || !data) continue;
+
+      const payload = JSON.parse(data);
+      if (event === "token") {
+        streamed += payload.text;
+        onToken(streamed);
+      } else if (event === "done") {
+        return payload.message;
+      }
+    }
+  }
+
+  throw new Error('Stream ended before the response was complete');
 };
 
 export const useChat = () => {
@@ -85,7 +119,24 @@ export const useChat = () => {
   });
 
   const sendMessageMutation = useMutation({
-    mutationFn: sendMessage,
+    mutationFn: (newMessage: string) => {
+      const streamingId = `stream-${Date.now()}`;
+      return sendMessage(newMessage, (text) => {
+        // Grow a placeholder AI message while tokens arrive
+        queryClient.setQueryData<ChatMessage[]>(['chat', userId], old => {
+          const current = old || [];
+          const placeholder: ChatMessage = {
+            id: streamingId,
+            text,
+            isUser: false,
+            timestamp: new Date().toISOString(),
+          };
+          return current.some(m => m.id === streamingId)
+            ? current.map(m => (m.id === streamingId ? placeholder : m))
+            : [...current, placeholder];
+        });
+      });
+    },
     onMutate: async (newMessage: string) => {
       await queryClient.cancelQueries({ queryKey: ['chat', userId] });
       
@@ -103,7 +154,11 @@ export const useChat = () => {
       return { previousMessages };
     },
     onSuccess: (aiMessage) => {
-      queryClient.setQueryData<ChatMessage[]>(['chat', userId], old => [...(old || []), aiMessage]);
+      // Replace the streaming placeholder with the final stored message
+      queryClient.setQueryData<ChatMessage[]>(['chat', userId], old => [
+        ...(old || []).filter(m => !m.id.startsWith('stream-')),
+        aiMessage,
+      ]);
     },
     onError: (err, newMessage, context) => {
       queryClient.setQueryData(['chat', userId], context?.previousMessages);
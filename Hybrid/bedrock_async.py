@@ -0,0 +1,204 @@
+"""
+Async-friendly Bedrock invocation layer.
+
+boto3 is blocking, so every Bedrock call made from an `async def` endpoint
+stalls the uvicorn event loop. BedrockExecutor runs those calls on a dedicated,
+bounded thread pool instead:
+
+- One shared boto3 client with a sized connection pool (connection reuse)
+- Per-model concurrency limits (shared by sync and async callers)
+- Per-call timeouts
+- `run()` for offloading other blocking work (Mongo, Pinecone) to the same pool
+- `astream_converse()` to consume converse_stream text deltas from async code
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+import boto3
+from botocore.config import Config
+
+logger = logging.getLogger("formatted-nova-assistant.bedrock")
+
+
+def make_bedrock_client(
+    region: str,
+    max_pool_connections: int = 32,
+    connect_timeout: float = 5.0,
+    read_timeout: float = 60.0,
+):
+    """Create a bedrock-runtime client that keeps and reuses its HTTPS connections."""
+    config = Config(
+        region_name=region,
+        max_pool_connections=max_pool_connections,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        tcp_keepalive=True,
+        retries={"max_attempts": 3, "mode": "adaptive"},
+    )
+    return boto3.client("bedrock-runtime", config=config)
+
+
+def model_limits_from_env(default: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """Parse BEDROCK_MODEL_LIMITS='{"amazon.nova-lite-v1:0": 8}' into a dict."""
+    raw = os.getenv("BEDROCK_MODEL_LIMITS")
+    if not raw:
+        return dict(default or {})
+    try:
+        return {str(k): int(v) for k, v in json.loads(raw).items()}
+    except (ValueError, AttributeError) as e:
+        logger.warning(f"⚠️ Ignoring invalid BEDROCK_MODEL_LIMITS: {e}")
+        return dict(default or {})
+
+
+class BedrockExecutor:
+    """Bounded thread-pool executor for blocking Bedrock calls."""
+
+    def __init__(
+        self,
+        client,
+        max_workers: int = 16,
+        default_model_limit: int = 8,
+        model_limits: Optional[Dict[str, int]] = None,
+        timeout: float = 60.0,
+    ):
+        self.client = client
+        self.default_model_limit = default_model_limit
+        self.model_limits = model_limits or {}
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bedrock")
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, int] = {}
+        self._waiting: Dict[str, int] = {}
+        self._calls: Dict[str, int] = {}
+        self._timeouts: Dict[str, int] = {}
+
+    def _semaphore(self, model_id: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            sem = self._semaphores.get(model_id)
+            if sem is None:
+                limit = self.model_limits.get(model_id, self.default_model_limit)
+                sem = threading.BoundedSemaphore(max(1, limit))
+                self._semaphores[model_id] = sem
+            return sem
+
+    def _bump(self, counter: Dict[str, int], model_id: str, delta: int):
+        with self._lock:
+            counter[model_id] = counter.get(model_id, 0) + delta
+
+    def _limited(self, model_id: str, fn: Callable, **kwargs):
+        if self.client is None:
+            raise RuntimeError("Bedrock client not initialized")
+        sem = self._semaphore(model_id)
+        self._bump(self._waiting, model_id, 1)
+        acquired = sem.acquire(timeout=self.timeout)
+        self._bump(self._waiting, model_id, -1)
+        if not acquired:
+            self._bump(self._timeouts, model_id, 1)
+            raise TimeoutError(f"Timed out waiting for a {model_id} slot")
+        self._bump(self._in_flight, model_id, 1)
+        try:
+            return fn(modelId=model_id, **kwargs)
+        finally:
+            self._bump(self._in_flight, model_id, -1)
+            self._bump(self._calls, model_id, 1)
+            sem.release()
+
+    # ---------- sync API (call from worker threads) ----------
+    def invoke_model(self, modelId: str, **kwargs):
+        return self._limited(modelId, self.client.invoke_model, **kwargs)
+
+    def converse(self, modelId: str, **kwargs):
+        return self._limited(modelId, self.client.converse, **kwargs)
+
+    def converse_stream(self, modelId: str, **kwargs):
+        return self._limited(modelId, self.client.converse_stream, **kwargs)
+
+    def stream_converse_text(self, modelId: str, **kwargs) -> Iterator[str]:
+        """Yield text deltas from converse_stream, holding the model slot until the stream ends."""
+        if self.client is None:
+            raise RuntimeError("Bedrock client not initialized")
+        # _limited only guards the call itself; keep the slot while reading events
+        sem = self._semaphore(modelId)
+        if not sem.acquire(timeout=self.timeout):
+            self._bump(self._timeouts, modelId, 1)
+            raise TimeoutError(f"Timed out waiting for a {modelId} slot")
+        self._bump(self._in_flight, modelId, 1)
+        try:
+            stream = self.client.converse_stream(modelId=modelId, **kwargs)["stream"]
+            for event in stream:
+                delta = (event.get("contentBlockDelta") or {}).get("delta") or {}
+                if delta.get("text"):
+                    yield delta["text"]
+        finally:
+            self._bump(self._in_flight, modelId, -1)
+            self._bump(self._calls, modelId, 1)
+            sem.release()
+
+    # ---------- async API (call from the event loop) ----------
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run blocking `fn(*args, **kwargs)` on the pool and await it with a timeout."""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        return await asyncio.wait_for(future, timeout=timeout or self.timeout)
+
+    async def ainvoke_model(self, modelId: str, timeout: Optional[float] = None, **kwargs):
+        return await self.run(self.invoke_model, modelId, timeout=timeout, **kwargs)
+
+    async def aconverse(self, modelId: str, timeout: Optional[float] = None, **kwargs):
+        return await self.run(self.converse, modelId, timeout=timeout, **kwargs)
+
+    async def astream_converse(self, modelId: str, timeout: Optional[float] = None, **kwargs) -> AsyncIterator[str]:
+        """Async iterator over converse_stream text deltas; the stream is read on the pool."""
+        if self.client is None:
+            raise RuntimeError("Bedrock client not initialized")
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        cancelled = threading.Event()
+
+        def pump():
+            try:
+                for text in self.stream_converse_text(modelId, **kwargs):
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        self._executor.submit(pump)
+        try:
+            while True:
+                item = await asyncio.wait_for(queue.get(), timeout=timeout or self.timeout)
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = set(self._semaphores) | set(self._calls)
+            return {
+                model: {
+                    "limit": self.model_limits.get(model, self.default_model_limit),
+                    "in_flight": self._in_flight.get(model, 0),
+                    "waiting": self._waiting.get(model, 0),
+                    "calls": self._calls.get(model, 0),
+                    "timeouts": self._timeouts.get(model, 0),
+                }
+                for model in models
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
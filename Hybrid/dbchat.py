@@ -1,5 +1,6 @@
 
 
+import asyncio
 import os
 import json
 import boto3
@@ -7,13 +8,20 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from pydantic import BaseModel
-import re
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import List, Optional, Dict, Any
+import psycopg2.extensions
+from typing import Callable, List, Optional, Dict, Any
 import uuid
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from bedrock_async import BedrockExecutor, make_bedrock_client, model_limits_from_env
+from pg_pool import PoolTimeout, PostgresPool, ping
+from sql_cache import SqlCache, table_ttls_from_env
+from sql_guard import GuardedSql, SqlGuardError, explain_and_budget, guard_sql, set_read_only, set_statement_timeout
+from sql_prompt import SqlPromptBuilder, extract_sql
+from sql_summaries import SummaryRefresher
+from table_stats import TableStats
 
 CHAT_ROOT = os.path.join(os.getcwd(), "db_chat_store", "users")
 os.makedirs(CHAT_ROOT, exist_ok=True)
@@ -27,6 +35,47 @@ REGION = os.getenv("AWS_REGION", "us-east-1")
 MODEL_ID = os.getenv("TEXT_MODEL_ID", "amazon.nova-lite-v1:0")
 NEON_DATABASE_URL = os.getenv("NEON_DATABASE_URL")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:8081")
+BEDROCK_MAX_WORKERS = int(os.getenv("BEDROCK_MAX_WORKERS", 32))
+BEDROCK_MODEL_CONCURRENCY = int(os.getenv("BEDROCK_MODEL_CONCURRENCY", 8))
+BEDROCK_TIMEOUT = float(os.getenv("BEDROCK_TIMEOUT", 60))
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", 1))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", 10))
+PG_STATEMENT_TIMEOUT_MS = int(os.getenv("PG_STATEMENT_TIMEOUT_MS", 15000))
+PG_ACQUIRE_TIMEOUT = float(os.getenv("PG_ACQUIRE_TIMEOUT", 10))
+# Client-side wait for a query; the server-side statement_timeout is the backstop
+PG_QUERY_TIMEOUT = float(os.getenv("PG_QUERY_TIMEOUT", PG_STATEMENT_TIMEOUT_MS / 1000))
+DBCHAT_REQUEST_TIMEOUT = float(os.getenv("DBCHAT_REQUEST_TIMEOUT", 90))
+# SQL generation: one short statement per call, with only the relevant schema in the prompt
+SQL_MAX_TOKENS = int(os.getenv("SQL_MAX_TOKENS", 200))
+# Budget for generated SQL: LIMITs, planner cost and per-query timeout
+SQL_DEFAULT_LIMIT = int(os.getenv("SQL_DEFAULT_LIMIT", 50))
+SQL_MAX_LIMIT = int(os.getenv("SQL_MAX_LIMIT", 500))
+SQL_MAX_COST = float(os.getenv("SQL_MAX_COST", 1000000))
+SQL_MAX_PLAN_ROWS = int(os.getenv("SQL_MAX_PLAN_ROWS", 10000))
+SQL_STATEMENT_TIMEOUT_MS = int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", 10000))
+STREAM_STATEMENT_TIMEOUT_MS = int(os.getenv("STREAM_STATEMENT_TIMEOUT_MS", 120000))
+# Client-side wait per streamed round trip; the first fetch can take as long as the statement
+STREAM_FETCH_TIMEOUT = float(os.getenv("STREAM_FETCH_TIMEOUT", STREAM_STATEMENT_TIMEOUT_MS / 1000))
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", 1000))
+STREAM_MAX_ROWS = int(os.getenv("STREAM_MAX_ROWS", 1000000))
+STREAM_MAX_MB = int(os.getenv("STREAM_MAX_MB", 256))
+SQL_CACHE_SQL_TTL = float(os.getenv("SQL_CACHE_SQL_TTL", 86400))
+SQL_CACHE_RESULT_TTL = float(os.getenv("SQL_CACHE_RESULT_TTL", 600))
+SQL_CACHE_MAX_ROWS = int(os.getenv("SQL_CACHE_MAX_ROWS", 200000))
+SQL_CACHE_MAX_MB = int(os.getenv("SQL_CACHE_MAX_MB", 64))
+# Materialized current-state summaries (salary per department, headcount by title, managers)
+SUMMARY_VIEWS_ENABLED = os.getenv("SUMMARY_VIEWS_ENABLED", "true").lower() == "true"
+SUMMARY_REFRESH_SECONDS = float(os.getenv("SUMMARY_REFRESH_SECONDS", 3600))
+SUMMARY_REFRESH_TIMEOUT_MS = int(os.getenv("SUMMARY_REFRESH_TIMEOUT_MS", 600000))
+# /api/stats: catalog estimates cached for STATS_TTL, exact counts refreshed in the background
+STATS_TTL = float(os.getenv("STATS_TTL", 60))
+STATS_EXACT_COUNTS = os.getenv("STATS_EXACT_COUNTS", "true").lower() == "true"
+STATS_EXACT_TTL = float(os.getenv("STATS_EXACT_TTL", 3600))
+STATS_EXACT_TIMEOUT = float(os.getenv("STATS_EXACT_TIMEOUT", 300))
+# Pooled connections the background COUNT(*)s may hold at once (the rest serve chat queries)
+STATS_EXACT_CONCURRENCY = int(os.getenv("STATS_EXACT_CONCURRENCY", 1))
+# Wait after failed exact counts before scanning again
+STATS_EXACT_RETRY = float(os.getenv("STATS_EXACT_RETRY", STATS_EXACT_TTL))
 
 if not NEON_DATABASE_URL:
     raise ValueError("NEON_DATABASE_URL environment variable is required")
@@ -43,20 +92,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-bedrock_runtime = boto3.client("bedrock-runtime", region_name=REGION)
+bedrock_runtime = make_bedrock_client(
+    REGION,
+    max_pool_connections=BEDROCK_MAX_WORKERS,
+    read_timeout=BEDROCK_TIMEOUT
+)
+bedrock_executor = BedrockExecutor(
+    bedrock_runtime,
+    max_workers=BEDROCK_MAX_WORKERS,
+    default_model_limit=BEDROCK_MODEL_CONCURRENCY,
+    model_limits=model_limits_from_env(),
+    timeout=BEDROCK_TIMEOUT
+)
+
+# The employees dataset changes rarely: cache generated SQL and result rows
+sql_cache = SqlCache(
+    sql_ttl=SQL_CACHE_SQL_TTL,
+    result_ttl=SQL_CACHE_RESULT_TTL,
+    table_ttls=table_ttls_from_env(),
+    max_rows=SQL_CACHE_MAX_ROWS,
+    max_bytes=SQL_CACHE_MAX_MB * 1024 * 1024
+)
 
 # ---------------- DATABASE CONNECTION ---------------- #
-def get_db_connection():
-    """Create and return a PostgreSQL connection"""
-    try:
-        conn = psycopg2.connect(
-            NEON_DATABASE_URL,
-            cursor_factory=RealDictCursor
-        )
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        raise
+# Connections are opened once and reused; every one runs with a statement timeout
+db_pool = PostgresPool(
+    NEON_DATABASE_URL,
+    min_size=PG_POOL_MIN,
+    max_size=PG_POOL_MAX,
+    statement_timeout_ms=PG_STATEMENT_TIMEOUT_MS,
+    acquire_timeout=PG_ACQUIRE_TIMEOUT
+)
+
+# Summary views are built in the background and advertised to the model once ready;
+# each refresh drops the cached results that read them
+summary_refresher = SummaryRefresher(
+    db_pool,
+    interval=SUMMARY_REFRESH_SECONDS,
+    refresh_timeout_ms=SUMMARY_REFRESH_TIMEOUT_MS,
+    on_refresh=sql_cache.invalidate
+)
+if SUMMARY_VIEWS_ENABLED:
+    summary_refresher.start()
+
+# Static rules, then only the tables (and ready views) a question needs
+sql_prompt = SqlPromptBuilder(
+    views=summary_refresher.available_views,
+    max_tokens=SQL_MAX_TOKENS
+)
+
+STATS_TABLES = ['employee', 'department', 'department_employee', 'department_manager', 'title', 'salary']
+table_stats = TableStats(
+    db_pool,
+    "employees",
+    STATS_TABLES,
+    ttl=STATS_TTL,
+    exact_ttl=STATS_EXACT_TTL,
+    exact_counts=STATS_EXACT_COUNTS,
+    timeout=PG_QUERY_TIMEOUT,
+    exact_timeout=STATS_EXACT_TIMEOUT,
+    exact_concurrency=STATS_EXACT_CONCURRENCY,
+    exact_retry=STATS_EXACT_RETRY
+)
 
 def get_current_user_id(request: Request) -> str:
     auth = request.headers.get("Authorization")
@@ -109,152 +206,132 @@ def get_current_user_id(request: Request) -> str:
     return str(user_id)
 
 # ---------------- HELPERS ---------------- #
-def execute_postgres_query(query_str):
-    """Execute PostgreSQL query safely"""
+def guard_postgres_query(query_str, max_limit=SQL_MAX_LIMIT):
+    """Validate generated SQL (SELECT only, LIMIT enforced); returns (guarded, error)"""
     try:
-        print(f"Original query string: {query_str}")
-        
-        # Clean up the query string
-        query_str = query_str.strip().rstrip(';')
-        
-        # Basic safety check - prevent destructive operations
-        destructive_keywords = ['drop', 'delete', 'truncate', 'update', 'insert', 'alter', 'create', 'modify']
-        if any(keyword in query_str.lower() for keyword in destructive_keywords):
-            return {"error": "Destructive operations are not allowed"}
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute(query_str)
-            
-            if query_str.lower().startswith('select'):
-                results = cursor.fetchall()
-                # Convert to list of dictionaries
-                results_list = [dict(row) for row in results]
-                return results_list if results_list else []
-            else:
-                conn.commit()
-                return {"success": True, "rows_affected": cursor.rowcount}
-                
-        except Exception as e:
-            conn.rollback()
-            return {"error": f"Error executing query: {str(e)}"}
-        finally:
-            cursor.close()
-            conn.close()
-    
+        guarded = guard_sql(query_str, max_limit=max_limit, default_limit=SQL_DEFAULT_LIMIT)
+    except SqlGuardError as e:
+        return None, str(e)
+    if guarded.rewrites:
+        print(f"SQL guard: {', '.join(guarded.rewrites)}")
+    return guarded, None
+
+def explain_postgres_query(conn, guarded: GuardedSql, max_rows=SQL_MAX_PLAN_ROWS, timeout_ms=SQL_STATEMENT_TIMEOUT_MS):
+    """EXPLAIN a guarded query (read-only, under its statement timeout) and check the plan budget"""
+    with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cursor:
+        # The query runs later in the same transaction, so it is read-only too
+        set_read_only(cursor)
+        set_statement_timeout(cursor, timeout_ms)
+        return explain_and_budget(cursor, guarded, SQL_MAX_COST, max_rows)
+
+def run_postgres_query(conn, guarded: GuardedSql):
+    """Run a guarded query on a pooled connection (called on the pool's threads)"""
+    # Tuples, not RealDictRows: each row becomes a dict once, below
+    cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+
+    try:
+        explain_postgres_query(conn, guarded)
+        print(f"Plan: {guarded.plan}")
+        cursor.execute(guarded.sql)
+
+        results = cursor.fetchall()
+        # Convert to list of dictionaries
+        columns = [column.name for column in cursor.description]
+        return [dict(zip(columns, row)) for row in results]
+
+    except SqlGuardError as e:
+        conn.rollback()
+        return {"error": str(e)}
     except Exception as e:
-        return {"error": f"Database error: {str(e)}"}
+        conn.rollback()
+        return {"error": f"Error executing query: {str(e)}"}
+    finally:
+        cursor.close()
 
-def bedrock_generate_text(prompt: str, max_tokens: int = 500) -> str:
-    """Generate PostgreSQL query using Bedrock"""
-    system_prompt = """
-    
-    ** if user asks like greeting message response them like "Hello! I'm here to help you with SQL queries."  dont generate any query**
-    
-    You are an expert SQL query generator for PostgreSQL. 
-Your task is to translate user questions into efficient SQL queries. 
-Always generate correct and optimized queries based on the schema below. 
-Do not add or assume extra tables or columns outside the schema. 
-Never use DROP, DELETE, or destructive operations unless explicitly asked. 
-Always return a query with LIMIT 50 for preview queries unless the user specifies otherwise.
-
-Database schema (PostgreSQL):
-
-Table: employees.employee
-- id (BIGINT, PRIMARY KEY)
-- birth_date (DATE)
-- first_name (VARCHAR)
-- last_name (VARCHAR)
-- gender (USER-DEFINED)
-- hire_date (DATE)
-
-Table: employees.department
-- id (CHAR, PRIMARY KEY)
-- dept_name (VARCHAR)
-
-Table: employees.department_employee
-- employee_id (BIGINT, FOREIGN KEY → employee.id)
-- department_id (CHAR, FOREIGN KEY → department.id)
-- from_date (DATE)
-- to_date (DATE)
-
-Table: employees.department_manager
-- employee_id (BIGINT, FOREIGN KEY → employee.id)
-- department_id (CHAR, FOREIGN KEY → department.id)
-- from_date (DATE)
-- to_date (DATE)
-
-Table: employees.title
-- employee_id (BIGINT, FOREIGN KEY → employee.id)
-- title (VARCHAR)
-- from_date (DATE)
-- to_date (DATE)
-
-Table: employees.salary
-- employee_id (BIGINT, FOREIGN KEY → employee.id)
-- amount (BIGINT)
-- from_date (DATE)
-- to_date (DATE)
-
-Relationships:
-- Each employee belongs to one or more departments (via department_employee).
-- Each department has one or more managers (via department_manager).
-- Each employee can hold multiple titles over time (via title).
-- Each employee has multiple salary records with valid date ranges (via salary).
-- Departments are identified by id and employees by id.
-
-Query rules:
-1. Use explicit JOINs instead of subqueries when possible for clarity.
-2. Use table aliases for readability (e.g., e for employee, d for department, s for salary).
-3. Use ORDER BY for sorting results and LIMIT 50 for preview queries.
-4. Only generate SELECT queries unless explicitly asked for updates.
-5. If a user asks for a vague question (e.g., "highest salary"), assume they want employee names along with the requested value.
-6. Use the exact table and column names as shown above.
-
-Always return only the SQL query, nothing else.
-"""
-
-    messages = [
-        {"role": "user", "content": [{"text": prompt}]}
-    ]
-
-    inf_params = {"maxTokens": max_tokens, "temperature": 0.1, "topP": 0.9}
+async def execute_postgres_query(guarded: GuardedSql):
+    """Execute a guarded PostgreSQL query"""
+    try:
+        print(f"Executing query: {guarded.sql}")
+        return await db_pool.run(run_postgres_query, guarded, timeout=PG_QUERY_TIMEOUT)
+
+    except asyncio.TimeoutError:
+        return {"error": f"Query took longer than {PG_QUERY_TIMEOUT:.0f}s and was cancelled"}
+    except Exception as e:
+        return {"error": f"Database error: {str(e)}"}
 
+async def stream_postgres_query(
+    query_str: str,
+    max_rows: int,
+    max_bytes: int,
+    token_usage: Optional[Dict[str, Any]] = None,
+    on_success: Optional[Callable[[], None]] = None
+):
+    """
+    NDJSON lines for a query streamed from a server-side cursor:
+    {"type": "columns"} (with the SQL generation's `token_usage`), then
+    {"type": "rows"} per batch, then {"type": "end"} (or {"type": "error"}).
+    Stops at `max_rows` rows or `max_bytes` bytes; `on_success` is called
+    when the query ran without error.
+    """
+    sent_rows = sent_bytes = 0
+    truncated = None
+    batches = db_pool.stream(
+        query_str,
+        batch_size=STREAM_BATCH_ROWS,
+        timeout=STREAM_FETCH_TIMEOUT,
+        statement_timeout_ms=STREAM_STATEMENT_TIMEOUT_MS,
+        read_only=True
+    )
     try:
-        resp = bedrock_runtime.converse(
-            modelId=MODEL_ID,
-            system=[{"text": system_prompt}],
-            messages=messages,
-            inferenceConfig=inf_params
-        )
-        
+        first = True
+        async for columns, rows in batches:
+            if first:
+                yield json.dumps({"type": "columns", "query": query_str, "columns": columns, "token_usage": token_usage}) + "\n"
+                first = False
+            if sent_rows + len(rows) > max_rows:
+                rows = rows[:max_rows - sent_rows]
+                truncated = "max_rows"
+            if rows:
+                line = json.dumps({"type": "rows", "rows": rows}, default=str) + "\n"
+                sent_rows += len(rows)
+                sent_bytes += len(line)
+                yield line
+            if not truncated and sent_bytes >= max_bytes:
+                truncated = "max_bytes"
+            if truncated:
+                break
+    except asyncio.TimeoutError:
+        yield json.dumps({"type": "error", "error": f"Query took longer than {STREAM_FETCH_TIMEOUT:.0f}s and was cancelled"}) + "\n"
+        return
+    except Exception as e:
+        yield json.dumps({"type": "error", "error": f"Error executing query: {str(e)}"}) + "\n"
+        return
+    finally:
+        # Stops the query right away when the cap is hit or the client goes away
+        await batches.aclose()
+    if on_success is not None:
+        on_success()
+    yield json.dumps({"type": "end", "rows": sent_rows, "bytes": sent_bytes, "truncated": truncated}) + "\n"
+
+FALLBACK_QUERY = "SELECT * FROM employees.employee LIMIT 5;"
+
+async def bedrock_generate_text(question: str, usage: Optional[Dict[str, Any]] = None) -> str:
+    """Generate PostgreSQL query using Bedrock; token usage is written to `usage` when given"""
+    try:
+        resp = await bedrock_executor.aconverse(modelId=MODEL_ID, **sql_prompt.build(question))
+
+        record = sql_prompt.record(resp)
+        if usage is not None:
+            usage.update(record)
         response_text = resp["output"]["message"]["content"][0]["text"]
-        print(f"Bedrock response: {response_text}")
-        
-        # Extract PostgreSQL query using regex
-        query_match = re.search(r'SELECT.*?;', response_text, re.DOTALL | re.IGNORECASE)
-        if query_match:
-            return query_match.group(0)
-        
-        # If no complete query found, look for query patterns
-        select_match = re.search(r'SELECT.*', response_text, re.DOTALL | re.IGNORECASE)
-        if select_match:
-            query = select_match.group(0).strip()
-            if not query.endswith(';'):
-                query += ';'
-            # Add LIMIT if not present
-            if 'limit' not in query.lower():
-                query = query.rstrip(';') + ' LIMIT 10;'
-            return query
-        
-        # Fallback query
-        return "SELECT * FROM employees.employee LIMIT 5;"
+        print(f"Bedrock response: {response_text} ({record['input_tokens']} in / {record['output_tokens']} out tokens)")
+
+        # The stop sequence ends generation at ';' - take the statement, drop any prose or fences
+        return extract_sql(response_text) or FALLBACK_QUERY
     
     except Exception as e:
         print("Bedrock API Error:", e)
-        return "SELECT * FROM employees.employee LIMIT 5;"
+        return FALLBACK_QUERY
 
 def is_greeting_message(message: str) -> bool:
     """Check if the message is a greeting (more precise detection)"""
@@ -279,6 +356,13 @@ def is_greeting_message(message: str) -> bool:
 
 async def generate_response(user_query: str):
     """Generate response by creating PostgreSQL query and executing it"""
+    cache_status = {"sql_cache": None, "result_cache": None, "result_age_seconds": None, "token_usage": None}
+    response = await answer_question(user_query, cache_status)
+    response.update(cache_status)
+    return response
+
+async def answer_question(user_query: str, cache_status: Dict[str, Any]):
+    """Generate and run the SQL for a question; cache hits are recorded in `cache_status`"""
     try:
         print(f"User query: {user_query}")
         
@@ -291,14 +375,41 @@ async def generate_response(user_query: str):
                 "error": None
             }
         
-        # Generate PostgreSQL query using Bedrock
-        query_prompt = f"User question: {user_query}\n\nGenerate a simple PostgreSQL query to answer this question:"
-        postgres_query = bedrock_generate_text(query_prompt)
+        # Generate PostgreSQL query using Bedrock (unless this question was answered before)
+        postgres_query = sql_cache.get_sql(user_query)
+        cache_status["sql_cache"] = "hit" if postgres_query else "miss"
+        if not postgres_query:
+            cache_status["token_usage"] = {}
+            postgres_query = await bedrock_generate_text(user_query, cache_status["token_usage"])
         
         print(f"Generated PostgreSQL query: {postgres_query}")
         
-        # Execute the query
-        query_results = execute_postgres_query(postgres_query)
+        # Reject anything but a single SELECT and enforce a LIMIT before touching the database
+        guarded, error = guard_postgres_query(postgres_query)
+        if error:
+            return {
+                "query": postgres_query,
+                "results": [],
+                "message": f"❌ Error: {error}",
+                "error": error
+            }
+        generated_query, postgres_query = postgres_query, guarded.sql
+
+        # Execute the query (or reuse its cached rows)
+        cached = sql_cache.get_rows(postgres_query)
+        cache_status["result_cache"] = "hit" if cached else "miss"
+        if cached:
+            query_results, age = cached
+            cache_status["result_age_seconds"] = round(age, 1)
+        else:
+            query_results = await execute_postgres_query(guarded)
+            if isinstance(query_results, list):
+                sql_cache.put_rows(postgres_query, query_results)
+        # Only SQL that ran cleanly is remembered for the question, as generated:
+        # the LIMIT added here must not cap /api/chat/stream, which guards it again
+        if cache_status["sql_cache"] == "miss" and generated_query != FALLBACK_QUERY and isinstance(query_results, list):
+            sql_cache.put_sql(user_query, generated_query)
+        postgres_query = guarded.sql  # as executed (the plan budget may have lowered the LIMIT)
         
         print(f"Query results type: {type(query_results)}")
         
@@ -375,78 +486,33 @@ async def generate_response(user_query: str):
             "message": f"❌ Sorry, I'm having trouble processing your request right now. Error: {str(e)}",
             "error": str(e)
         }
-    """Generate response by creating PostgreSQL query and executing it"""
+
+async def generate_response_for_request(request: Request, user_query: str) -> Optional[Dict[str, Any]]:
+    """
+    generate_response with a per-request timeout. Returns None when the client
+    disconnects; the task is then cancelled, which cancels its running query.
+    """
+    task = asyncio.create_task(generate_response(user_query))
+    deadline = asyncio.get_running_loop().time() + DBCHAT_REQUEST_TIMEOUT
     try:
-        print(f"User query: {user_query}")
-        
-        # Check for greetings or non-query questions with more precise detection
-        if is_greeting_message(user_query):
-            return {
-                "query": "",
-                "results": [],
-                "message": "Hello! I'm here to help you with SQL queries. Ask me questions about employees, departments, salaries, or any other data in the database.",
-                "error": None
-            }
-        
-        # Generate PostgreSQL query using Bedrock
-        query_prompt = f"User question: {user_query}\n\nGenerate a simple PostgreSQL query to answer this question:"
-        postgres_query = bedrock_generate_text(query_prompt)
-        
-        print(f"Generated PostgreSQL query: {postgres_query}")
-        
-        # Execute the query
-        query_results = execute_postgres_query(postgres_query)
-        
-        print(f"Query results type: {type(query_results)}")
-        
-        if isinstance(query_results, dict) and "error" in query_results:
-            return {
-                "query": postgres_query,
-                "results": [],
-                "message": f"❌ Error: {query_results['error']}",
-                "error": query_results['error']
-            }
-        
-        if isinstance(query_results, dict) and "success" in query_results:
-            return {
-                "query": postgres_query,
-                "results": [],
-                "message": f"✅ Query executed successfully. Rows affected: {query_results.get('rows_affected', 0)}",
-                "error": None
-            }
-        
-        # For SELECT queries
-        if isinstance(query_results, list):
-            if len(query_results) == 0:
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
                 return {
-                    "query": postgres_query,
+                    "query": "",
                     "results": [],
-                    "message": "No matching records found.",
-                    "error": None
-                }
-            else:
-                return {
-                    "query": postgres_query,
-                    "results": query_results,
-                    "message": f"Found {len(query_results)} matching records.",
-                    "error": None
+                    "message": f"❌ Sorry, the request took longer than {DBCHAT_REQUEST_TIMEOUT:.0f}s and was cancelled.",
+                    "error": "Request timed out"
                 }
-        
-        return {
-            "query": postgres_query,
-            "results": [],
-            "message": "Query executed successfully.",
-            "error": None
-        }
-    
-    except Exception as e:
-        print("Error in generate_response:", e)
-        return {
-            "query": "Error generating query",
-            "results": [],
-            "message": f"❌ Sorry, I'm having trouble processing your request right now. Error: {str(e)}",
-            "error": str(e)
-        }
+            done, _ = await asyncio.wait({task}, timeout=min(0.5, remaining))
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                print("Client disconnected, cancelling request")
+                return None
+    finally:
+        if not task.done():
+            task.cancel()
 
 # ============================================================
 # Session-based chat storage (React Query compatible)
@@ -491,6 +557,18 @@ class ChatResponse(BaseModel):
     results: List[Dict[str, Any]]
     message: str
     error: Optional[str] = None
+    sql_cache: Optional[str] = None          # "hit" | "miss" (None when no SQL was needed)
+    result_cache: Optional[str] = None       # "hit" | "miss"
+    result_age_seconds: Optional[float] = None
+    token_usage: Optional[Dict[str, Any]] = None  # SQL generation tokens/latency (None on a SQL cache hit)
+
+class StreamRequest(BaseModel):
+    message: str
+    max_rows: Optional[int] = None  # capped by STREAM_MAX_ROWS
+    max_bytes: Optional[int] = None  # capped by STREAM_MAX_MB
+
+class CacheInvalidateRequest(BaseModel):
+    tables: Optional[List[str]] = None  # None drops everything
 
 # In-memory storage for chat history (in production, use a database)
 def get_user_chat_dir(user_id: str):
@@ -560,7 +638,9 @@ async def send_db_chat_message(
     add_db_message_to_session(session_id, user_message)
 
     # Generate response
-    response_data = await generate_response(message)
+    response_data = await generate_response_for_request(request, message)
+    if response_data is None:
+        return Response(status_code=499)
 
     # Add AI response to session
     ai_message = {
@@ -570,7 +650,11 @@ async def send_db_chat_message(
         "timestamp": str(uuid.uuid1()),
         "query": response_data["query"],
         "results": response_data["results"],
-        "error": response_data["error"]
+        "error": response_data["error"],
+        "sql_cache": response_data.get("sql_cache"),
+        "result_cache": response_data.get("result_cache"),
+        "result_age_seconds": response_data.get("result_age_seconds"),
+        "token_usage": response_data.get("token_usage")
     }
     add_db_message_to_session(session_id, ai_message)
 
@@ -607,7 +691,7 @@ async def chat_endpoint(
     session_id = req.session_id or str(uuid.uuid4())
 
     # Load existing chat
-    messages = load_chat_from_file(user_id, session_id)
+    messages = await bedrock_executor.run(load_chat_from_file, user_id, session_id)
 
     # Add user message
     messages.append({
@@ -618,7 +702,9 @@ async def chat_endpoint(
     })
 
     # Generate response
-    response_data = await generate_response(req.message)
+    response_data = await generate_response_for_request(request, req.message)
+    if response_data is None:
+        return Response(status_code=499)
 
     # Add AI message
     messages.append({
@@ -628,15 +714,61 @@ async def chat_endpoint(
         "timestamp": str(uuid.uuid1())
     })
 
-    # ✅ SAVE TO FILE
-    save_chat_to_file(user_id, session_id, messages)
+    # ✅ SAVE TO FILE (off the event loop)
+    await bedrock_executor.run(save_chat_to_file, user_id, session_id, messages)
 
     return ChatResponse(
         success=response_data["error"] is None,
         query=response_data["query"],
         results=response_data["results"],
         message=response_data["message"],
-        error=response_data["error"]
+        error=response_data["error"],
+        sql_cache=response_data.get("sql_cache"),
+        result_cache=response_data.get("result_cache"),
+        result_age_seconds=response_data.get("result_age_seconds"),
+        token_usage=response_data.get("token_usage")
+    )
+
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(
+    req: StreamRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Answer a question with its full result, streamed as NDJSON batches of row arrays"""
+    postgres_query = sql_cache.get_sql(req.message)
+    token_usage = None
+    if not postgres_query:
+        token_usage = {}
+        postgres_query = await bedrock_generate_text(req.message, token_usage)
+    generated_query = postgres_query
+
+    # Streaming caps rows itself, so no LIMIT is forced; the cost budget still applies
+    guarded, error = guard_postgres_query(postgres_query, max_limit=None)
+    if error:
+        raise HTTPException(400, error)
+    try:
+        await db_pool.run(explain_postgres_query, guarded, None, STREAM_STATEMENT_TIMEOUT_MS, timeout=PG_QUERY_TIMEOUT)
+    except SqlGuardError as e:
+        raise HTTPException(400, str(e))
+    except (PoolTimeout, asyncio.TimeoutError, psycopg2.extensions.QueryCanceledError):
+        raise HTTPException(504, "The database did not answer in time, please try again")
+    except (psycopg2.ProgrammingError, psycopg2.DataError) as e:
+        # Bad generated SQL: unknown column, type mismatch, ...
+        raise HTTPException(400, f"Error in generated query: {str(e).strip()}")
+    postgres_query = guarded.sql
+
+    def remember_sql():
+        # Same rule as /api/chat: generated SQL that ran cleanly, before any guard rewrite
+        if token_usage is not None and generated_query != FALLBACK_QUERY:
+            sql_cache.put_sql(req.message, generated_query)
+
+    max_rows = min(req.max_rows or STREAM_MAX_ROWS, STREAM_MAX_ROWS)
+    max_bytes = min(req.max_bytes or STREAM_MAX_MB * 1024 * 1024, STREAM_MAX_MB * 1024 * 1024)
+    return StreamingResponse(
+        stream_postgres_query(postgres_query, max_rows, max_bytes, token_usage, remember_sql),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
@@ -646,7 +778,7 @@ async def save_chat(
     request: Request,
     user_id: str = Depends(get_current_user_id)
 ):
-    save_chat_to_file(user_id, chat.session_id, chat.messages)
+    await bedrock_executor.run(save_chat_to_file, user_id, chat.session_id, [m.dict() for m in chat.messages])
     return {"success": True}
 
 
@@ -656,31 +788,36 @@ async def load_chat(
     request: Request,
     user_id: str = Depends(get_current_user_id)
 ):
-    messages = load_chat_from_file(user_id, session_id)
+    messages = await bedrock_executor.run(load_chat_from_file, user_id, session_id)
     return {"success": True, "messages": messages}
 
 
+@app.post("/api/cache/invalidate")
+async def invalidate_sql_cache(
+    req: CacheInvalidateRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Drop cached SQL and results (all, or only results that read the given tables)"""
+    dropped = sql_cache.invalidate(req.tables)
+    return {"success": True, "dropped": dropped, "cache": sql_cache.stats()}
+
 @app.get("/api/stats")
 async def get_stats():
-    """Get database statistics"""
+    """Get database statistics (estimated or background-counted; never a scan per request)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        stats = {}
-        
-        # Get counts for each table
-        tables = ['employee', 'department', 'department_employee', 'department_manager', 'title', 'salary']
-        
-        for table in tables:
-            cursor.execute(f"SELECT COUNT(*) as count FROM employees.{table}")
-            result = cursor.fetchone()
-            stats[f"{table}_count"] = result["count"]
-        
-        cursor.close()
-        conn.close()
-        
-        return {"success": True, "stats": stats}
+        counts = await table_stats.get()
+        stats = {f"{table}_count": info["count"] for table, info in counts["tables"].items()}
+        return {
+            "success": True,
+            "stats": stats,
+            "source": counts["source"],
+            "age_seconds": counts["age_seconds"],
+            "exact_as_of": counts["exact_as_of"],
+            "exact_refreshing": counts["exact_refreshing"],
+            "tables": counts["tables"]
+        }
+    except asyncio.TimeoutError:
+        return {"success": False, "error": f"Statistics took longer than {PG_QUERY_TIMEOUT:.0f}s"}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -688,11 +825,18 @@ async def get_stats():
 @app.get("/api/health")
 async def health_check():
     try:
-        conn = get_db_connection()
-        conn.close()
-        return {"status": "healthy", "database": "connected"}
+        await db_pool.run(ping, timeout=PG_ACQUIRE_TIMEOUT + 5)
+        return {
+            "status": "healthy",
+            "database": "connected",
+            "pool": db_pool.stats(),
+            "sql_cache": sql_cache.stats(),
+            "summaries": summary_refresher.stats(),
+            "table_stats": table_stats.stats(),
+            "sql_prompt": sql_prompt.stats()
+        }
     except Exception as e:
-        return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
+        return {"status": "unhealthy", "database": "disconnected", "error": str(e), "pool": db_pool.stats()}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,158 @@
+"""
+Per-user manifest of indexed documents, for incremental re-indexing.
+
+For every (user, filename) the manifest records the sha256 of the uploaded
+file and, for every chunk that was indexed, its vector id and a fingerprint
+of what was stored under that id.
+
+Vector ids are derived from the chunk text - `{user}:{filename}:{hash}` - not
+from the upload time, so re-uploading a file maps unchanged chunks onto the
+same ids:
+
+- same file hash           -> nothing to do
+- chunk id and fingerprint -> unchanged, not embedded or upserted again
+  already in the manifest
+- new id or new fingerprint (e.g. same text moved to another page)
+                           -> embedded (cache hit when the text is known)
+                              and upserted over the old vector
+- ids no longer produced   -> deleted from the vector store
+
+The manifest is only written after the vectors are in the store, so an
+interrupted job simply redoes its work on the next run.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from chunking import Chunk
+
+logger = logging.getLogger("formatted-nova-assistant.manifest")
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_fingerprint(chunk: Chunk) -> str:
+    """Hash of everything stored for a chunk: its text and its location metadata."""
+    payload = json.dumps({"text": chunk.text, "location": chunk.location}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass
+class DocumentEntry:
+    file_hash: str
+    chunks: Dict[str, str] = field(default_factory=dict)  # vector id -> fingerprint
+    updated_at: float = 0.0
+
+
+@dataclass
+class ChunkPlan:
+    """Chunk ids of a new version of a document, compared against the previous one."""
+    previous: Optional[DocumentEntry]
+    chunks: Dict[str, str] = field(default_factory=dict)
+    unchanged: int = 0
+    _occurrences: Dict[str, int] = field(default_factory=dict)
+
+    def assign(self, user_id: str, filename: str, chunk: Chunk) -> Optional[str]:
+        """Vector id for `chunk`, or None when the stored vector is already up to date."""
+        text_hash = hashlib.sha256(chunk.text.encode("utf-8")).hexdigest()[:16]
+        # Repeated text in one document (boilerplate, footers) gets distinct ids
+        seen = self._occurrences.get(text_hash, 0)
+        self._occurrences[text_hash] = seen + 1
+        vector_id = f"{user_id}:{filename}:{text_hash}" + (f"-{seen + 1}" if seen else "")
+
+        fingerprint = chunk_fingerprint(chunk)
+        self.chunks[vector_id] = fingerprint
+        if self.previous is not None and self.previous.chunks.get(vector_id) == fingerprint:
+            self.unchanged += 1
+            return None
+        return vector_id
+
+    def stale_ids(self) -> List[str]:
+        if self.previous is None:
+            return []
+        return [vector_id for vector_id in self.previous.chunks if vector_id not in self.chunks]
+
+
+class DocumentManifest:
+    """SQLite-backed record of which chunks of which file are in the vector store."""
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS documents (
+                user_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (user_id, filename)
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS chunks (
+                user_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                vector_id TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                PRIMARY KEY (user_id, filename, vector_id)
+            )"""
+        )
+        self._conn.commit()
+
+    def get(self, user_id: str, filename: str) -> Optional[DocumentEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_hash, updated_at FROM documents WHERE user_id = ? AND filename = ?", (user_id, filename)
+            ).fetchone()
+            if row is None:
+                return None
+            chunks = dict(self._conn.execute(
+                "SELECT vector_id, fingerprint FROM chunks WHERE user_id = ? AND filename = ?", (user_id, filename)
+            ).fetchall())
+        return DocumentEntry(file_hash=row[0], chunks=chunks, updated_at=row[1])
+
+    def plan(self, user_id: str, filename: str) -> ChunkPlan:
+        return ChunkPlan(previous=self.get(user_id, filename))
+
+    def save(self, user_id: str, filename: str, file_hash: str, chunks: Dict[str, str]):
+        """Replace the entry of a document once its vectors are stored."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE user_id = ? AND filename = ?", (user_id, filename))
+            self._conn.executemany(
+                "INSERT INTO chunks (user_id, filename, vector_id, fingerprint) VALUES (?, ?, ?, ?)",
+                [(user_id, filename, vector_id, fingerprint) for vector_id, fingerprint in chunks.items()],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (user_id, filename, file_hash, updated_at) VALUES (?, ?, ?, ?)",
+                (user_id, filename, file_hash, time.time()),
+            )
+            self._conn.commit()
+
+    def delete(self, user_id: str, filename: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE user_id = ? AND filename = ?", (user_id, filename))
+            self._conn.execute("DELETE FROM documents WHERE user_id = ? AND filename = ?", (user_id, filename))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            chunks = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return {"documents": documents, "chunks": chunks}
@@ -0,0 +1,277 @@
+"""
+Concurrent embedding pipeline for document ingestion.
+
+- Runs a bounded number of Bedrock embedding calls at once
+- Retries throttled calls with exponential backoff + jitter
+- Streams finished vectors into upsert batches while later chunks are still embedding
+- Reports chunks-per-second metrics for every run
+- Consults an optional EmbeddingCache before calling Bedrock
+
+Run `python embedding_pipeline.py` for a benchmark against a local fake Bedrock client.
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger("formatted-nova-assistant.embeddings")
+
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+
+def is_throttling_error(exc: Exception) -> bool:
+    """Check if a botocore error means 'slow down and try again'."""
+    response = getattr(exc, "response", None) or {}
+    code = (response.get("Error") or {}).get("Code", "")
+    return code in THROTTLING_ERROR_CODES or "Throttl" in type(exc).__name__
+
+
+@dataclass
+class PipelineMetrics:
+    chunks: int = 0
+    embedded: int = 0
+    upserted: int = 0
+    batches: int = 0
+    retries: int = 0
+    fallbacks: int = 0
+    cache_hits: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def count(self, name: str, n: int = 1):
+        """Increment a counter from a worker thread."""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return max(end - self.started_at, 1e-9)
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.embedded / self.elapsed
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "chunks": self.chunks,
+            "embedded": self.embedded,
+            "upserted": self.upserted,
+            "batches": self.batches,
+            "retries": self.retries,
+            "fallbacks": self.fallbacks,
+            "cache_hits": self.cache_hits,
+            "seconds": round(self.elapsed, 3),
+            "chunks_per_second": round(self.chunks_per_second, 2),
+        }
+
+
+class EmbeddingPipeline:
+    """Bounded-concurrency Bedrock embedding with streaming upserts."""
+
+    def __init__(
+        self,
+        client,
+        model_id: str,
+        max_concurrency: int = 8,
+        batch_size: int = 100,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        fallback: Optional[Callable[[str], List[float]]] = None,
+        cache=None,
+    ):
+        self.client = client
+        self.model_id = model_id
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.fallback = fallback
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="embed"
+        )
+
+    def _invoke(self, text: str) -> List[float]:
+        response = self.client.invoke_model(
+            modelId=self.model_id,
+            body=json.dumps({"inputText": text}),
+            contentType="application/json",
+            accept="application/json"
+        )
+        embedding = json.loads(response.get("body").read()).get("embedding")
+        if not embedding:
+            raise ValueError("Empty embedding in Bedrock response")
+        return embedding
+
+    def _embed_with_retry(self, text: str, metrics: Optional[PipelineMetrics] = None) -> List[float]:
+        if self.cache is not None:
+            cached = self.cache.get(self.model_id, text)
+            if cached is not None:
+                if metrics:
+                    metrics.count("cache_hits")
+                return cached
+
+        if self.client is None or not self.model_id:
+            if self.fallback is None:
+                raise RuntimeError("Bedrock client not initialized")
+            if metrics:
+                metrics.count("fallbacks")
+            return self.fallback(text)
+
+        attempt = 0
+        while True:
+            try:
+                embedding = self._invoke(text)
+                if self.cache is not None:
+                    self.cache.put(self.model_id, text, embedding)
+                return embedding
+            except Exception as e:
+                if is_throttling_error(e) and attempt < self.max_retries:
+                    delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                    delay *= random.uniform(0.5, 1.0)
+                    attempt += 1
+                    if metrics:
+                        metrics.count("retries")
+                    logger.warning(f"⏳ Embedding throttled, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                    time.sleep(delay)
+                    continue
+                if self.fallback is None:
+                    raise
+                logger.warning(f"⚠️ Embedding failed, using fallback: {e}")
+                if metrics:
+                    metrics.count("fallbacks")
+                return self.fallback(text)
+
+    def embed(self, text: str) -> List[float]:
+        """Embed a single text (retries included), blocking the caller."""
+        return self._embed_with_retry(text)
+
+    def run(
+        self,
+        chunks: Iterable[Any],
+        build_vector: Callable[[int, Any, List[float]], Dict[str, Any]],
+        upsert: Optional[Callable[[List[Dict[str, Any]]], Any]] = None,
+        on_progress: Optional[Callable[[PipelineMetrics], None]] = None,
+    ) -> PipelineMetrics:
+        """
+        Embed `chunks` with at most `max_concurrency` calls in flight.
+
+        `build_vector(index, chunk, embedding)` turns a result into an upsert record;
+        `upsert(batch)` is called as soon as `batch_size` records are ready, so
+        upserts overlap with the embedding of later chunks. `chunks` may be lazy,
+        and may be any objects whose str() is the text to embed.
+        `on_progress(metrics)` is called after every upserted batch.
+        """
+        metrics = PipelineMetrics()
+        pending = {}
+        batch: List[Dict[str, Any]] = []
+
+        def flush():
+            if batch and upsert is not None:
+                upsert(list(batch))
+                metrics.upserted += len(batch)
+                metrics.batches += 1
+                if on_progress is not None:
+                    on_progress(metrics)
+            batch.clear()
+
+        def drain(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                i, chunk = pending.pop(future)
+                batch.append(build_vector(i, chunk, future.result()))
+                metrics.embedded += 1
+                if len(batch) >= self.batch_size:
+                    flush()
+
+        try:
+            for i, chunk in enumerate(chunks):
+                metrics.chunks += 1
+                future = self._executor.submit(self._embed_with_retry, str(chunk), metrics)
+                pending[future] = (i, chunk)
+                if len(pending) >= self.max_concurrency:
+                    drain(FIRST_COMPLETED)
+            while pending:
+                drain(FIRST_COMPLETED)
+            flush()
+        finally:
+            for future in pending:
+                future.cancel()
+            metrics.finished_at = time.perf_counter()
+
+        logger.info(
+            f"📊 Embedded {metrics.embedded} chunks in {metrics.elapsed:.2f}s "
+            f"({metrics.chunks_per_second:.1f} chunks/s, {metrics.retries} retries)"
+        )
+        return metrics
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ============================================================
+# Benchmark (local fake Bedrock client, no network)
+# ============================================================
+class FakeBedrockClient:
+    """Mimics bedrock-runtime invoke_model latency and throttling."""
+
+    class _Body:
+        def __init__(self, payload: bytes):
+            self._payload = payload
+
+        def read(self) -> bytes:
+            return self._payload
+
+    class ThrottlingException(Exception):
+        response = {"Error": {"Code": "ThrottlingException"}}
+
+    def __init__(self, latency: float = 0.05, throttle_rate: float = 0.05, dims: int = 1024):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.dims = dims
+        self.calls = 0
+
+    def invoke_model(self, modelId, body, contentType, accept):
+        self.calls += 1
+        time.sleep(self.latency)
+        if random.random() < self.throttle_rate:
+            raise self.ThrottlingException("Rate exceeded")
+        payload = json.dumps({"embedding": [0.0] * self.dims}).encode()
+        return {"body": self._Body(payload)}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    chunks = [f"chunk {i} " * 50 for i in range(300)]
+    upserts = []
+
+    for concurrency in (1, 4, 8, 16):
+        pipeline = EmbeddingPipeline(
+            FakeBedrockClient(),
+            "fake-titan",
+            max_concurrency=concurrency,
+            base_delay=0.01,
+            max_delay=0.1
+        )
+        metrics = pipeline.run(
+            chunks,
+            build_vector=lambda i, chunk, emb: {"id": str(i), "values": emb},
+            upsert=upserts.append
+        )
+        pipeline.shutdown()
+        print(f"concurrency={concurrency:>2}  {json.dumps(metrics.as_dict())}")
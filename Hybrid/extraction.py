@@ -0,0 +1,366 @@
+"""
+Parallel text extraction for uploaded documents.
+
+PDFs are split into page ranges that worker processes extract concurrently;
+the text is reassembled in page order. DOCX, PPTX, CSV and spreadsheets go
+through the same process pool (one task per workbook sheet), so CPU-heavy
+parsing never runs on the server's threads and never serializes behind the
+GIL.
+
+iter_parts() streams a document as (text, location) parts - pages
+({"page": 3}), slides, sheets, blocks of a text file - whose texts
+concatenate to the full text; iter_text() is the same stream without
+locations and extract() joins it into one string. Only a bounded window of
+page ranges is in flight, so memory stays flat however large the document is.
+
+Every extraction records per-page (or per-part) timings in an
+ExtractionResult, so slow pages in large reports show up in the logs.
+
+A task that does not finish within `task_timeout` seconds (counted from when
+its result is awaited, so time queued behind other jobs counts too) fails the
+extraction with TimeoutError. The hung worker cannot be interrupted, so the pool
+is replaced and the old workers are terminated; tasks still running on the old
+pool fail with BrokenProcessPool and their jobs fail with them.
+
+Run `python extraction.py [files...]` for a benchmark over uploads/*.pdf, or
+`python extraction.py --memory` for the tracemalloc check of the streaming path.
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from chunking import Location
+
+import docx
+import pandas as pd
+import PyPDF2
+from pptx import Presentation
+
+logger = logging.getLogger("formatted-nova-assistant.extraction")
+
+DOCUMENT_EXTENSIONS = {".pdf", ".docx", ".pptx", ".csv", ".xlsx", ".txt", ".py", ".md"}
+PLAIN_TEXT_EXTENSIONS = {".txt", ".py", ".md"}
+TEXT_BLOCK_SIZE = 1024 * 1024
+
+
+@dataclass
+class PartTiming:
+    part: int       # 1-based page, slide, sheet or text-block number
+    chars: int
+    seconds: float
+
+
+@dataclass
+class ExtractionResult:
+    text: str = ""
+    parts: List[PartTiming] = field(default_factory=list)
+    elapsed: float = 0.0
+    tasks: int = 1
+    total_parts: Optional[int] = None  # known up front for PDFs and workbooks
+
+    @property
+    def progress(self) -> Optional[float]:
+        return len(self.parts) / self.total_parts if self.total_parts else None
+
+    def summary(self, slowest: int = 3) -> Dict[str, Any]:
+        worst = sorted(self.parts, key=lambda p: p.seconds, reverse=True)[:slowest]
+        return {
+            "parts": len(self.parts),
+            "chars": sum(p.chars for p in self.parts),
+            "tasks": self.tasks,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "slowest_parts": [{"part": p.part, "seconds": round(p.seconds, 3)} for p in worst],
+        }
+
+
+# ============================================================
+# Worker functions (run in the pool; must stay module-level)
+# ============================================================
+def _pdf_page_count(path: str) -> int:
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+def _extract_pdf_range(path: str, start: int, end: int) -> List[Tuple[int, str, float]]:
+    reader = PyPDF2.PdfReader(path)
+    pages = []
+    for number in range(start, end):
+        started = time.perf_counter()
+        text = reader.pages[number].extract_text() or ""
+        pages.append((number + 1, text, time.perf_counter() - started))
+    return pages
+
+
+def _extract_docx(path: str) -> str:
+    d = docx.Document(path)
+    text = [p.text for p in d.paragraphs if p.text.strip()]
+    for table in d.tables:
+        for row in table.rows:
+            text.append(" | ".join(cell.text for cell in row.cells))
+    return "\n".join(text)
+
+
+def _extract_pptx_slides(path: str) -> List[Tuple[int, str, float]]:
+    prs = Presentation(path)
+    slides = []
+    for number, slide in enumerate(prs.slides, start=1):
+        started = time.perf_counter()
+        text = [shape.text for shape in slide.shapes if hasattr(shape, "text")]
+        if text:
+            slides.append((number, "\n".join(text), time.perf_counter() - started))
+    return slides
+
+
+def _extract_csv(path: str) -> str:
+    return pd.read_csv(path).to_string(index=False)
+
+
+def _sheet_names(path: str) -> List[str]:
+    with pd.ExcelFile(path) as workbook:
+        return list(workbook.sheet_names)
+
+
+def _extract_sheet(path: str, sheet_name: str) -> str:
+    return pd.read_excel(path, sheet_name=sheet_name).to_string(index=False)
+
+
+def _iter_plain(path: str, stats: ExtractionResult) -> Iterator[Tuple[str, Location]]:
+    """Read a text file in blocks, cutting each block after its last newline."""
+    carry = ""
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        while True:
+            started = time.perf_counter()
+            block = f.read(TEXT_BLOCK_SIZE)
+            if not block:
+                break
+            block = carry + block
+            cut = block.rfind("\n") + 1 or len(block)
+            carry = block[cut:]
+            stats.parts.append(PartTiming(len(stats.parts) + 1, cut, time.perf_counter() - started))
+            yield block[:cut], {}
+    if carry:
+        yield carry, {}
+
+
+def _timed(fn, *args) -> Tuple[str, float]:
+    started = time.perf_counter()
+    text = fn(*args)
+    return text, time.perf_counter() - started
+
+
+# ============================================================
+# Engine
+# ============================================================
+class ExtractionEngine:
+    """Process pool that extracts documents part by part and reassembles them in order."""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        pages_per_task: Optional[int] = None,
+        task_timeout: Optional[float] = None,
+    ):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.pages_per_task = pages_per_task
+        self.task_timeout = task_timeout
+        self.recycled = 0
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn: workers never inherit the server's threads, sockets or models
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def _recycle(self, pool: ProcessPoolExecutor):
+        """Replace a pool whose worker hung and terminate its processes."""
+        with self._lock:
+            if self._pool is not pool:
+                return  # another timed-out task already replaced it
+            self._pool = self._new_pool()
+            self.recycled += 1
+        processes = list((getattr(pool, "_processes", None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+        logger.warning(f"⚠️ Extraction pool recycled after a hung task ({len(processes)} workers terminated)")
+
+    def _result(self, pool: ProcessPoolExecutor, future: Future, path: str):
+        try:
+            return future.result(timeout=self.task_timeout)
+        except FutureTimeoutError:
+            self._recycle(pool)
+            raise TimeoutError(
+                f"Extracting {os.path.basename(path)} took longer than {self.task_timeout:.0f}s"
+            ) from None
+
+    def _page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        # ~4 ranges per worker keeps workers busy when some pages are much slower
+        size = self.pages_per_task or max(1, min(32, math.ceil(page_count / (self.max_workers * 4))))
+        return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+    def _iter_pdf(self, path: str, stats: ExtractionResult) -> Iterator[Tuple[str, Location]]:
+        pool = self._pool
+        page_count = self._result(pool, pool.submit(_pdf_page_count, path), path)
+        ranges = deque(self._page_ranges(page_count))
+        stats.total_parts = page_count
+        stats.tasks = len(ranges)
+
+        # Keep a bounded window of ranges in flight; results are consumed in page order
+        window: Deque = deque()
+        try:
+            while ranges or window:
+                while ranges and len(window) < self.max_workers * 2:
+                    window.append(pool.submit(_extract_pdf_range, path, *ranges.popleft()))
+                for number, text, seconds in self._result(pool, window.popleft(), path):
+                    stats.parts.append(PartTiming(number, len(text), seconds))
+                    yield (text if number == 1 else "\n" + text), {"page": number}
+        finally:
+            for future in window:
+                future.cancel()
+
+    def _iter_slides(self, path: str, stats: ExtractionResult) -> Iterator[Tuple[str, Location]]:
+        pool = self._pool
+        slides = self._result(pool, pool.submit(_extract_pptx_slides, path), path)
+        stats.total_parts = len(slides)
+        for i, (number, text, seconds) in enumerate(slides):
+            stats.parts.append(PartTiming(number, len(text), seconds))
+            yield (text if i == 0 else "\n" + text), {"slide": number}
+
+    def _iter_spreadsheet(self, path: str, stats: ExtractionResult) -> Iterator[Tuple[str, Location]]:
+        pool = self._pool
+        sheets = self._result(pool, pool.submit(_sheet_names, path), path)
+        stats.total_parts = stats.tasks = len(sheets)
+        futures = [pool.submit(_timed, _extract_sheet, path, name) for name in sheets]
+        for number, (name, future) in enumerate(zip(sheets, futures), start=1):
+            text, seconds = self._result(pool, future, path)
+            stats.parts.append(PartTiming(number, len(text), seconds))
+            yield (text if number == 1 else "\n\n" + text), {"sheet": str(name)}
+
+    def _iter_single(self, fn, path: str, stats: ExtractionResult) -> Iterator[Tuple[str, Location]]:
+        stats.total_parts = 1
+        pool = self._pool
+        text, seconds = self._result(pool, pool.submit(_timed, fn, path), path)
+        stats.parts.append(PartTiming(1, len(text), seconds))
+        yield text, {}
+
+    def iter_parts(self, path: str, stats: Optional[ExtractionResult] = None) -> Iterator[Tuple[str, Location]]:
+        """Yield (text, location) parts in document order; timings are recorded into `stats`."""
+        stats = stats if stats is not None else ExtractionResult()
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".pdf":
+            source = self._iter_pdf(path, stats)
+        elif ext == ".xlsx":
+            source = self._iter_spreadsheet(path, stats)
+        elif ext == ".docx":
+            source = self._iter_single(_extract_docx, path, stats)
+        elif ext == ".pptx":
+            source = self._iter_slides(path, stats)
+        elif ext == ".csv":
+            source = self._iter_single(_extract_csv, path, stats)
+        elif ext in PLAIN_TEXT_EXTENSIONS:
+            source = _iter_plain(path, stats)
+        else:
+            raise ValueError(f"Unsupported document type: {ext}")
+
+        started = time.perf_counter()
+        try:
+            yield from source
+        finally:
+            stats.elapsed = time.perf_counter() - started
+            summary = stats.summary()
+            logger.info(
+                f"📄 Extracted {os.path.basename(path)}: {summary['parts']} parts in {summary['tasks']} tasks, "
+                f"{summary['elapsed_seconds']}s (slowest: {summary['slowest_parts']})"
+            )
+
+    def iter_text(self, path: str, stats: Optional[ExtractionResult] = None) -> Iterator[str]:
+        for text, _ in self.iter_parts(path, stats):
+            yield text
+
+    def extract(self, path: str) -> ExtractionResult:
+        result = ExtractionResult()
+        result.text = "".join(self.iter_text(path, result))
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.max_workers, "task_timeout": self.task_timeout, "recycled_pools": self.recycled}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ============================================================
+# Benchmarks
+# ============================================================
+def _memory_check(sizes_mb=(8, 64)):
+    """Peak Python memory of extract -> chunk for text files of very different sizes."""
+    import tempfile
+    import tracemalloc
+
+    from chunking import TokenChunker
+
+    engine = ExtractionEngine(max_workers=1)
+    sentence = "The clinic opens at nine. Appointments can be booked online or by phone! Is parking available? "
+    peaks = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in sizes_mb:
+            path = os.path.join(tmp, f"doc_{size_mb}mb.txt")
+            line = (sentence * 10 + "\n").encode("utf-8")
+            with open(path, "wb") as f:
+                for _ in range(size_mb * 1024 * 1024 // len(line)):
+                    f.write(line)
+
+            tracemalloc.start()
+            chunks = sum(1 for _ in TokenChunker().chunks(engine.iter_parts(path)))
+            peaks[size_mb] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{size_mb:>5} MB file  {chunks:>9} chunks  peak {peaks[size_mb] / 1024 / 1024:6.2f} MB")
+    engine.shutdown()
+
+    small, large = peaks[sizes_mb[0]], peaks[sizes_mb[-1]]
+    # Peak is a few read blocks regardless of size; allow 20% noise
+    assert large < small * 1.2, "peak memory grows with document size"
+    print("memory is flat across document sizes")
+
+
+if __name__ == "__main__":
+    import glob
+    import sys
+
+    logging.basicConfig(level=logging.WARNING)
+    if sys.argv[1:] == ["--memory"]:
+        _memory_check()
+        raise SystemExit(0)
+
+    files = sys.argv[1:] or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads", "*", "*.pdf")))
+    if not files:
+        raise SystemExit("No PDFs found under uploads/")
+
+    engine = ExtractionEngine()
+    engine.extract(files[0])  # warm up the worker processes
+
+    print(f"{engine.max_workers} workers")
+    for path in files:
+        started = time.perf_counter()
+        reader = PyPDF2.PdfReader(path)
+        sequential = "\n".join(page.extract_text() or "" for page in reader.pages)
+        sequential_time = time.perf_counter() - started
+
+        result = engine.extract(path)
+        assert result.text == sequential, f"page order differs for {path}"
+        summary = result.summary()
+        print(f"{os.path.basename(path)[:40]:40} {summary['parts']:>4} pages  "
+              f"sequential {sequential_time:7.3f}s  parallel {result.elapsed:7.3f}s  "
+              f"slowest {summary['slowest_parts']}")
+    engine.shutdown()
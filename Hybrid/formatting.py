@@ -0,0 +1,210 @@
+"""
+Response formatting (Style A - Professional).
+
+apply_global_formatting is a single-pass tokenizer: one compiled regex walks
+the text once and each token (bold span, bullet marker, trailing space, blank
+line run, space run, sentence punctuation) is rewritten by a small callback.
+Bold spans are emitted untouched, so no placeholders are needed, and the
+output is a fixed point: formatting already-formatted text changes nothing.
+
+StreamingFormatter applies the same rules incrementally to LLM token
+streams: it only emits complete lines, so a bold span or bullet is never
+formatted half-way.
+
+Run `python formatting.py` for a benchmark on large responses.
+"""
+
+import re
+from typing import List
+
+_ESCAPES = {"\\n": "\n", "\\t": " ", "\\r": "", '\\"': '"', "\\'": "'", "\r\n": "\n", "\r": "\n"}
+_ESCAPE_PATTERN = re.compile(r"""\\[ntr"']|\r\n?""")
+
+_TOKEN_PATTERN = re.compile(
+    r"(?P<bold>\*\*[^*\n]+\*\*)"                  # **bold** is copied verbatim
+    r"|(?P<bullet>^[ \t]*(?:[-•]|\*(?!\*))[ \t]*)"  # -, *, • at line start -> "- "
+    r"|(?P<trail>[ \t]+(?=\n|\Z))"                 # trailing spaces
+    r"|(?P<blank>\n(?:[ \t]*\n){2,})"              # 2+ blank lines -> one
+    r"|(?P<spaces>[ \t]{2,})"                      # runs of spaces/tabs -> one space
+    r"|(?P<punct>[!?](?=[A-Za-z0-9])|\.(?=[A-Z])|(?<!\d)\.(?=\d))",  # "end.Next" -> "end. Next"
+    re.MULTILINE,
+)
+
+
+def _rewrite(match: "re.Match") -> str:
+    kind = match.lastgroup
+    if kind == "bold":
+        return match.group(0)
+    if kind == "bullet":
+        end = match.end()
+        text = match.string
+        # A bare marker at the end of a line keeps no trailing space
+        return "-" if end == len(text) or text[end] == "\n" else "- "
+    if kind == "trail":
+        return ""
+    if kind == "blank":
+        return "\n\n"
+    if kind == "spaces":
+        return " "
+    return match.group(0) + " "
+
+
+def apply_global_formatting(text: str) -> str:
+    """
+    Normalize and enforce the global Style A format:
+    **Title** (handled in format_response_block)
+    • Bullet lines
+    - Clean spacing and punctuation
+    """
+    if not text:
+        return ""
+
+    # Normalize escaped characters and line endings
+    text = _ESCAPE_PATTERN.sub(lambda m: _ESCAPES[m.group(0)], text)
+
+    # One pass over the text; strip() drops leading/trailing blank lines
+    return _TOKEN_PATTERN.sub(_rewrite, text).strip()
+
+
+class StreamingFormatter:
+    """Incremental apply_global_formatting for token streams (line-buffered)."""
+
+    def __init__(self):
+        self._raw_tail = ""   # undecoded suffix that may start an escape sequence
+        self._partial = ""    # decoded text of the current, unfinished line
+        self._started = False
+        self._pending_blank = False
+
+    def _emit_line(self, line: str) -> str:
+        formatted = _TOKEN_PATTERN.sub(_rewrite, line)
+        if not formatted.strip():
+            if self._started:
+                self._pending_blank = True
+            return ""
+        if not self._started:
+            self._started = True
+            return formatted.lstrip()
+        separator = "\n\n" if self._pending_blank else "\n"
+        self._pending_blank = False
+        return separator + formatted
+
+    def feed(self, chunk: str) -> str:
+        """Add streamed text; return the formatted text that is now final."""
+        raw = self._raw_tail + chunk
+        cut = len(raw) - 1 if raw.endswith(("\\", "\r")) else len(raw)
+        self._raw_tail = raw[cut:]
+        text = self._partial + _ESCAPE_PATTERN.sub(lambda m: _ESCAPES[m.group(0)], raw[:cut])
+        lines = text.split("\n")
+        self._partial = lines.pop()
+        return "".join(self._emit_line(line) for line in lines)
+
+    def flush(self) -> str:
+        """Emit whatever is left at the end of the stream."""
+        tail = self._partial + _ESCAPE_PATTERN.sub(lambda m: _ESCAPES[m.group(0)], self._raw_tail)
+        self._partial = self._raw_tail = ""
+        # A held-back "\r" decodes to a line break: emit line by line, like feed()
+        return "".join(self._emit_line(line) for line in tail.split("\n")) if tail else ""
+
+
+def format_response_block(title: str, body: str) -> str:
+    """
+    Produce Style A block:
+    **Title**
+
+    • item 1
+    • item 2
+
+    Closing line
+    """
+    # Clean the title - remove any existing asterisks and extra spaces
+    title = title.strip()
+    title = re.sub(r'^\**', '', title)  # Remove leading asterisks
+    title = re.sub(r'\**$', '', title)  # Remove trailing asterisks
+    title = title.strip()
+
+    # Format the block with proper spacing
+    block = f"**{title}**\n\n{body.strip()}"
+
+    # Apply formatting but ensure we don't break the bold markers
+    formatted = apply_global_formatting(block)
+
+    # Final cleanup: ensure exactly two asterisks around title
+    # Find the title line (first non-empty line)
+    lines = formatted.split('\n')
+    for i, line in enumerate(lines):
+        line_stripped = line.strip()
+        if line_stripped and not line_stripped.startswith('•'):
+            # This should be the title line
+            # Ensure it has exactly two asterisks at start and end
+            if not (line_stripped.startswith('**') and line_stripped.endswith('**')):
+                # Remove any asterisks and add proper ones
+                clean_title = re.sub(r'\*+', '', line_stripped).strip()
+                lines[i] = f"**{clean_title}**"
+            break
+
+    return '\n'.join(lines).strip()
+
+
+def format_bullet_list(items: List[str]) -> str:
+    if not items:
+        return ""
+    return "\n".join([f"• {item}" for item in items])
+
+
+def format_numbered_list(items: List[str]) -> str:
+    if not items:
+        return ""
+    return "\n".join([f"{i+1}. {item}" for i, item in enumerate(items)])
+
+
+# ============================================================
+# Benchmark
+# ============================================================
+def _legacy_apply_global_formatting(text: str) -> str:
+    """Placeholder-based formatter this module replaced (benchmark only)."""
+    text = text.replace("\\n", "\n").replace("\\t", " ").replace("\\r", "")
+    text = text.replace('\\"', '"').replace("\\'", "'")
+    bold_matches = list(re.finditer(r'\*\*([^*]+)\*\*', text))
+    protected_text = text
+    placeholders = []
+    for i, match in enumerate(bold_matches):
+        protected_text = protected_text.replace(match.group(0), f"__BOLD_{i}__")
+        placeholders.append(match.group(1))
+    protected_text = re.sub(r"[ \t]{2,}", " ", protected_text)
+    protected_text = re.sub(r"^\s*[-*•]\s*", "- ", protected_text, flags=re.MULTILINE)
+    protected_text = re.sub(r"([.!?])([A-Za-z0-9])", r"\1 \2", protected_text)
+    protected_text = re.sub(r"\n{3,}", "\n\n", protected_text)
+    lines = [ln.rstrip() for ln in protected_text.splitlines()]
+    while lines and not lines[0].strip():
+        lines.pop(0)
+    while lines and not lines[-1].strip():
+        lines.pop(-1)
+    final_text = "\n".join(lines).strip()
+    for i, original_text in enumerate(placeholders):
+        final_text = final_text.replace(f"__BOLD_{i}__", f"**{original_text}**")
+    return final_text
+
+
+if __name__ == "__main__":
+    import time
+
+    paragraph = (
+        "**Section {i}**\n\n"
+        "•  Dr. **Anindya Sen** works at **City Care**.Appointments are   open.\n"
+        "* Email: info@citycare.com  \n"
+        "-   Fees start at 5.50 and slots at 10.30 AM!Book now.\n\n\n\n"
+    )
+    for n in (10, 100, 1000):
+        text = "".join(paragraph.format(i=i) for i in range(n))
+        timings = {}
+        for name, fn in (("legacy", _legacy_apply_global_formatting), ("single-pass", apply_global_formatting)):
+            started = time.perf_counter()
+            out = fn(text)
+            timings[name] = (time.perf_counter() - started) * 1000
+        once = apply_global_formatting(text)
+        assert apply_global_formatting(once) == once, "formatter is not idempotent"
+        streamer = StreamingFormatter()
+        streamed = "".join(streamer.feed(text[i:i + 7]) for i in range(0, len(text), 7)) + streamer.flush()
+        assert streamed == once, "streaming formatter diverges from apply_global_formatting"
+        print(f"{len(text):>8} chars  {n * 2:>5} bold spans  "
+              f"legacy {timings['legacy']:8.2f}ms  single-pass {timings['single-pass']:6.2f}ms")
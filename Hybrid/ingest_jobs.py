@@ -0,0 +1,220 @@
+"""
+Background ingestion jobs for uploaded files.
+
+An upload only saves the file and enqueues a job; the job then runs as a
+pipeline of stages outside the request:
+
+    queued -> processing (extract -> chunk -> embed -> upsert) -> completed | failed
+
+The stages are a streaming pipeline on the job's thread: pages flow from the
+extraction engine's process pool into the chunker and on into the embedding
+pipeline, so they overlap and the document is never held in memory whole.
+Job state is persisted in SQLite, so jobs that were queued or running when the
+server stopped are resumed on the next start. At most `per_user_limit` jobs of
+the same user run at once, and at most `max_jobs` overall; the rest wait in
+FIFO order.
+
+Each job reads its own staged copy of the upload. A newer upload of the same
+file supersedes jobs for it that are still queued (their staged files are
+removed), and two jobs for the same file never run at the same time.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("formatted-nova-assistant.ingest")
+
+ACTIVE_STATUSES = ("queued", "processing")
+# queued -> superseded when a newer upload of the same file arrives first
+JOB_FIELDS = (
+    "id", "user_id", "filename", "path", "status", "progress", "chunks_total",
+    "chunks_done", "error", "result", "created_at", "updated_at",
+)
+
+
+class IngestJobQueue:
+    """Persistent FIFO of ingestion jobs with global and per-user concurrency limits."""
+
+    def __init__(
+        self,
+        db_path: str,
+        process: Callable[[Dict[str, Any], Callable[..., None]], Dict[str, Any]],
+        max_jobs: int = 4,
+        per_user_limit: int = 1,
+    ):
+        """
+        `process(job, report)` runs on a job thread, returns the job result and
+        calls `report(chunks_done=..., chunks_total=..., progress=...)` as it goes.
+        """
+        self.process = process
+        self.max_jobs = max_jobs
+        self.per_user_limit = per_user_limit
+        self._job_pool = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="ingest")
+        self._lock = threading.Lock()
+        self._pending: Deque[str] = deque()
+        self._running: Dict[str, Tuple[str, str]] = {}  # job id -> (user id, filename)
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                chunks_total INTEGER,
+                chunks_done INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                result TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs(user_id, created_at)")
+        self._conn.commit()
+
+    # ---------- persistence ----------
+    def _row_to_job(self, row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = {field: row[field] for field in JOB_FIELDS}
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    # ---------- public API ----------
+    def submit(self, user_id: str, filename: str, path: str) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            superseded = self._conn.execute(
+                "SELECT id, path FROM jobs WHERE user_id = ? AND filename = ? AND status = 'queued'", (user_id, filename)
+            ).fetchall()
+            for row in superseded:
+                if row["id"] in self._pending:
+                    self._pending.remove(row["id"])
+                if row["path"] != path and os.path.exists(row["path"]):
+                    os.remove(row["path"])
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'superseded', updated_at = ? WHERE id = ?", [(now, row["id"]) for row in superseded]
+            )
+            self._conn.execute(
+                "INSERT INTO jobs (id, user_id, filename, path, status, created_at, updated_at) VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, user_id, filename, path, now, now),
+            )
+            self._conn.commit()
+            self._pending.append(job_id)
+        if superseded:
+            logger.info(f"⏭️ Superseded {len(superseded)} queued job(s) for {filename} (user {user_id})")
+        logger.info(f"📥 Queued ingest job {job_id} for {filename} (user {user_id})")
+        self._dispatch()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            job = self._row_to_job(row)
+            if job and job["status"] == "queued":
+                job["queue_position"] = list(self._pending).index(job_id) + 1 if job_id in self._pending else None
+        return job
+
+    def list(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (user_id, limit)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def resume(self):
+        """Re-queue jobs that were queued or running when the process stopped."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM jobs WHERE status IN ({','.join('?' * len(ACTIVE_STATUSES))}) ORDER BY created_at",
+                ACTIVE_STATUSES,
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'queued', progress = 0, chunks_done = 0 WHERE id = ?", [(r["id"],) for r in rows]
+            )
+            self._conn.commit()
+            self._pending.extend(r["id"] for r in rows if r["id"] not in self._pending)
+        if rows:
+            logger.info(f"🔁 Resuming {len(rows)} unfinished ingest job(s)")
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            return {"pending": len(self._pending), "running": len(self._running), "by_status": counts}
+
+    def shutdown(self):
+        self._job_pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- scheduling ----------
+    def _dispatch(self):
+        """Start every pending job allowed by the global and per-user limits."""
+        to_start = []
+        with self._lock:
+            skipped: Deque[str] = deque()
+            while self._pending and len(self._running) < self.max_jobs:
+                job_id = self._pending.popleft()
+                row = self._conn.execute("SELECT user_id, filename FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None:
+                    continue
+                key = (row["user_id"], row["filename"])
+                active = sum(1 for uid, _ in self._running.values() if uid == key[0])
+                if active >= self.per_user_limit or key in self._running.values():
+                    skipped.append(job_id)
+                    continue
+                self._running[job_id] = key
+                to_start.append(job_id)
+            # Jobs of busy users (or of a file already being indexed) keep their place in line
+            self._pending.extendleft(reversed(skipped))
+        for job_id in to_start:
+            self._job_pool.submit(self._run, job_id)
+
+    def _run(self, job_id: str):
+        try:
+            job = self.get(job_id)
+            started = time.perf_counter()
+
+            self._update(job_id, status="processing")
+
+            def report(chunks_done: int, chunks_total: Optional[int] = None, progress: Optional[float] = None):
+                fields: Dict[str, Any] = {"chunks_done": chunks_done}
+                if chunks_total:
+                    fields["chunks_total"] = chunks_total
+                if progress is not None:
+                    fields["progress"] = round(min(progress, 0.99), 3)
+                self._update(job_id, **fields)
+
+            result = self.process(job, report)
+            result["timings"] = {"total_seconds": round(time.perf_counter() - started, 3)}
+            self._update(job_id, status="completed", progress=1.0, result=result)
+            logger.info(f"✅ Ingest job {job_id} completed in {result['timings']['total_seconds']:.1f}s")
+        except Exception as e:
+            logger.error(f"❌ Ingest job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e))
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+            self._dispatch()
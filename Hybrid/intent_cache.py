@@ -0,0 +1,205 @@
+"""
+Query-intent analysis cache.
+
+Lookups go through two levels:
+1. Exact match on the normalized query text
+2. Semantic match: cosine similarity between query embeddings above a threshold
+
+A semantic hit is only accepted when every literal filter value of the cached
+analysis (day names, doctor names, ...) also appears in the new query, so
+"monday slots" never answers "tuesday slots". With a `constraints` extractor
+both queries must also ask for the same constraints (doctor, date, status,
+...), so "appointments" never answers "pending appointments on 2024-05-01".
+Entries expire after a TTL, the least recently used are evicted first, and
+everything is dropped when the schema registry reports a change.
+"""
+
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger("formatted-nova-assistant.intent-cache")
+
+REGEX_META = set(r"^$.*+?()[]{}|\\")
+
+
+def filter_terms(filters: Any) -> Set[str]:
+    """Collect the literal string values of a Mongo filter (regex metacharacters stripped)."""
+    terms: Set[str] = set()
+    if isinstance(filters, dict):
+        for key, value in filters.items():
+            if key == "$options":
+                continue
+            terms |= filter_terms(value)
+    elif isinstance(filters, (list, tuple)):
+        for value in filters:
+            terms |= filter_terms(value)
+    elif isinstance(filters, str):
+        cleaned = "".join(ch for ch in filters if ch not in REGEX_META).strip()
+        if cleaned:
+            terms.add(cleaned)
+    return terms
+
+
+class _Entry:
+    __slots__ = ("query", "analysis", "vector", "constraints", "created_at")
+
+    def __init__(
+        self,
+        query: str,
+        analysis: Dict[str, Any],
+        vector: Optional[np.ndarray],
+        constraints: Optional[FrozenSet[str]] = None,
+    ):
+        self.query = query
+        self.analysis = analysis
+        self.vector = vector
+        self.constraints = constraints
+        self.created_at = time.monotonic()
+
+
+class IntentCache:
+    """LRU + TTL cache of intent analyses with near-duplicate matching."""
+
+    def __init__(
+        self,
+        normalize: Callable[[str], str],
+        embed: Optional[Callable[[str], List[float]]] = None,
+        threshold: float = 0.95,
+        ttl: float = 3600.0,
+        max_entries: int = 512,
+        constraints: Optional[Callable[[str], FrozenSet[str]]] = None,
+    ):
+        self.normalize = normalize
+        self.embed = embed
+        self.constraints = constraints
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _vector(self, text: str) -> Optional[np.ndarray]:
+        if self.embed is None:
+            return None
+        try:
+            vec = np.asarray(self.embed(text), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"⚠️ Intent cache embedding failed: {e}")
+            return None
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else None
+
+    def _expired(self, entry: _Entry) -> bool:
+        return (time.monotonic() - entry.created_at) > self.ttl
+
+    def _drop_locked(self, key: str):
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def _semantic_candidates_locked(self, vector: np.ndarray) -> List[str]:
+        """Keys scoring at least the threshold, best first."""
+        if self._matrix is None:
+            self._matrix_keys = [k for k, e in self._entries.items() if e.vector is not None]
+            self._matrix = (
+                np.stack([self._entries[k].vector for k in self._matrix_keys])
+                if self._matrix_keys else np.empty((0, vector.shape[0]), dtype=np.float32)
+            )
+        if not self._matrix_keys or self._matrix.shape[1] != vector.shape[0]:
+            return []
+        scores = self._matrix @ vector
+        above = np.flatnonzero(scores >= self.threshold)
+        return [self._matrix_keys[i] for i in above[np.argsort(-scores[above], kind="stable")]]
+
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        key = self.normalize(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._drop_locked(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return copy.deepcopy(entry.analysis)
+
+        vector = self._vector(key)
+        with self._lock:
+            # The closest entry may ask for another doctor or date; a slightly
+            # less similar one with matching filters is still a valid hit
+            candidates = self._semantic_candidates_locked(vector) if vector is not None else []
+            for match in candidates:
+                entry = self._entries.get(match)
+                if entry is None:
+                    continue
+                if self._expired(entry):
+                    self._drop_locked(match)
+                    continue
+                if self._filters_match(entry, key, query):
+                    self._entries.move_to_end(match)
+                    self.semantic_hits += 1
+                    logger.info(f"🧠 Intent cache semantic hit: '{key}' ≈ '{entry.query}'")
+                    return copy.deepcopy(entry.analysis)
+            self.misses += 1
+            return None
+
+    def _constraints(self, query: str) -> Optional[FrozenSet[str]]:
+        if self.constraints is None:
+            return None
+        try:
+            return frozenset(self.constraints(query))
+        except Exception as e:
+            logger.warning(f"⚠️ Intent cache constraint extraction failed: {e}")
+            return None
+
+    def _filters_match(self, entry: _Entry, normalized_query: str, query: str) -> bool:
+        terms = (self.normalize(t) for t in filter_terms(entry.analysis.get("filters")))
+        if not all(term in normalized_query for term in terms if term):
+            return False
+        if self.constraints is None:
+            return True
+        # A constraint only one of the queries has (a date, doctor, status...) would be lost
+        constraints = self._constraints(query)
+        return constraints is not None and constraints == entry.constraints
+
+    def put(self, query: str, analysis: Dict[str, Any]):
+        key = self.normalize(query)
+        vector = self._vector(key)
+        constraints = self._constraints(query)
+        with self._lock:
+            self._entries[key] = _Entry(key, copy.deepcopy(analysis), vector, constraints)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self, *_):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self.invalidations += 1
+        logger.info("🧹 Intent cache invalidated")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
@@ -13,6 +13,7 @@ Every response will follow the same clean, minimal format.
 import os
 import json
 import re
+import asyncio
 import boto3
 import uuid
 import numpy as np
@@ -21,31 +22,39 @@ from pymongo import MongoClient
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import AIMessage, HumanMessage
-from typing import Dict, Any, List, Literal, Optional, TypedDict, Annotated
+from typing import Dict, Any, Iterator, List, Literal, Optional, Tuple, TypedDict, Annotated
 import traceback
 import logging
 import time
 from fastapi import FastAPI, Form, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 import uvicorn
 from datetime import datetime
 from pydantic import BaseModel
 from jose import jwt, JWTError
 from fastapi import Depends, Request
 
-import whisper
 import logging
 
 import io
-import pandas as pd
-import docx
-from pptx import Presentation
-import PyPDF2
-import whisper
-from moviepy import AudioFileClip
 from PIL import Image
 
+from bedrock_async import BedrockExecutor, make_bedrock_client, model_limits_from_env
+from chunking import Chunk, Location, TokenChunker
+from document_manifest import DocumentManifest, file_sha256
+from embedding_cache import EmbeddingCache
+from embedding_pipeline import EmbeddingPipeline
+from extraction import DOCUMENT_EXTENSIONS, ExtractionEngine, ExtractionResult
+from formatting import StreamingFormatter, apply_global_formatting, format_bullet_list, format_numbered_list, format_response_block
+from ingest_jobs import IngestJobQueue
+from intent_cache import IntentCache
+from query_rules import AnalysisPathStats, EntityDictionary, QueryRuleEngine
+from router_engine import RouterEngine
+from schema_registry import SchemaRegistry
+from transcription import MEDIA_EXTENSIONS, TranscriptionService
+from vector_store import LocalVectorStore, PineconeVectorStore, VectorStore
+
 
 UPLOAD_DIR = os.path.join(os.getcwd(), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -90,115 +99,9 @@ def get_current_user_id(request: Request) -> str:
 
     return str(user_id)
 
-def apply_global_formatting(text: str) -> str:
-    """
-    Normalize and enforce the global Style A format:
-    **Title** (handled in format_response_block)
-    • Bullet lines
-    - Clean spacing and punctuation
-    """
-    if not text:
-        return ""
-
-    # Normalize escaped characters
-    text = text.replace("\\n", "\n").replace("\\t", " ").replace("\\r", "")
-    text = text.replace('\\"', '"').replace("\\'", "'")
-
-    # Protect bold markers by replacing them with a placeholder
-    # Find all **text** patterns and replace with placeholder
-    import re
-    bold_pattern = r'\*\*([^*]+)\*\*'
-    bold_matches = list(re.finditer(bold_pattern, text))
-    
-    # Replace bold markers with placeholders
-    protected_text = text
-    placeholders = []
-    for i, match in enumerate(bold_matches):
-        placeholder = f"__BOLD_{i}__"
-        protected_text = protected_text.replace(match.group(0), placeholder)
-        placeholders.append(match.group(1))  # Save the text inside **
-    
-    # Now apply formatting to the protected text
-    
-    # Collapse multiple spaces
-    protected_text = re.sub(r"[ \t]{2,}", " ", protected_text)
-
-    # Fix bullet-style consistency: convert -, *, • to "- "
-    protected_text = re.sub(r"^\s*[-*•]\s*", "- ", protected_text, flags=re.MULTILINE)
-
-    # Ensure spacing after punctuation (but not in numbers like "5:31")
-    protected_text = re.sub(r"([.!?])([A-Za-z0-9])", r"\1 \2", protected_text)
-
-    # Normalize multiple newlines -> at most one blank line
-    protected_text = re.sub(r"\n{3,}", "\n\n", protected_text)
-
-    # Trim each line's trailing/leading spaces
-    lines = [ln.rstrip() for ln in protected_text.splitlines()]
-    # Remove empty lines at start/end
-    while lines and not lines[0].strip():
-        lines.pop(0)
-    while lines and not lines[-1].strip():
-        lines.pop(-1)
-
-    # Reconstruct the text
-    protected_text = "\n".join(lines).strip()
-    
-    # Restore the bold markers
-    final_text = protected_text
-    for i, original_text in enumerate(placeholders):
-        placeholder = f"__BOLD_{i}__"
-        final_text = final_text.replace(placeholder, f"**{original_text}**")
-    
-    return final_text
-
-
-def format_response_block(title: str, body: str) -> str:
-    """
-    Produce Style A block:
-    **Title**
-
-    • item 1
-    • item 2
-
-    Closing line
-    """
-    # Clean the title - remove any existing asterisks and extra spaces
-    title = title.strip()
-    title = re.sub(r'^\**', '', title)  # Remove leading asterisks
-    title = re.sub(r'\**$', '', title)  # Remove trailing asterisks
-    title = title.strip()
-    
-    # Format the block with proper spacing
-    block = f"**{title}**\n\n{body.strip()}"
-    
-    # Apply formatting but ensure we don't break the bold markers
-    formatted = apply_global_formatting(block)
-    
-    # Final cleanup: ensure exactly two asterisks around title
-    # Find the title line (first non-empty line)
-    lines = formatted.split('\n')
-    for i, line in enumerate(lines):
-        line_stripped = line.strip()
-        if line_stripped and not line_stripped.startswith('•'):
-            # This should be the title line
-            # Ensure it has exactly two asterisks at start and end
-            if not (line_stripped.startswith('**') and line_stripped.endswith('**')):
-                # Remove any asterisks and add proper ones
-                clean_title = re.sub(r'\*+', '', line_stripped).strip()
-                lines[i] = f"**{clean_title}**"
-            break
-    
-    return '\n'.join(lines).strip()
-
-def format_bullet_list(items: List[str]) -> str:
-    if not items:
-        return ""
-    return "\n".join([f"• {item}" for item in items])
-
-def format_numbered_list(items: List[str]) -> str:
-    if not items:
-        return ""
-    return "\n".join([f"{i+1}. {item}" for i, item in enumerate(items)])
+def normalize_text(text: str) -> str:
+    """Normalize text for comparison."""
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', '', text.lower())).strip()
 
 # ============================================================
 # Environment & Clients
@@ -218,14 +121,49 @@ MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB = os.getenv("MONGO_DB", "Clinic")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX = os.getenv("PINECONE_INDEX", "voxora-2")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", os.path.join(os.getcwd(), "cache", "vectors"))
+VECTOR_NPROBE = int(os.getenv("VECTOR_NPROBE", 16))
+# Local partitions smaller than this are searched exactly (no IVF lists)
+VECTOR_EXACT_BELOW = int(os.getenv("VECTOR_EXACT_BELOW", 50000))
+SCHEMA_SAMPLE_SIZE = int(os.getenv("SCHEMA_SAMPLE_SIZE", 25))
+SCHEMA_TTL_SECONDS = float(os.getenv("SCHEMA_TTL_SECONDS", 300))
+INTENT_CACHE_THRESHOLD = float(os.getenv("INTENT_CACHE_THRESHOLD", 0.95))
+INTENT_CACHE_TTL_SECONDS = float(os.getenv("INTENT_CACHE_TTL_SECONDS", 3600))
+INTENT_CACHE_MAX_ENTRIES = int(os.getenv("INTENT_CACHE_MAX_ENTRIES", 512))
+ENTITY_TTL_SECONDS = float(os.getenv("ENTITY_TTL_SECONDS", 300))
+BEDROCK_MAX_WORKERS = int(os.getenv("BEDROCK_MAX_WORKERS", 32))
+BEDROCK_MODEL_CONCURRENCY = int(os.getenv("BEDROCK_MODEL_CONCURRENCY", 8))
+BEDROCK_TIMEOUT = float(os.getenv("BEDROCK_TIMEOUT", 60))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 8))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", 100))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(os.getcwd(), "cache", "embeddings.sqlite3"))
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", 512))
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", 4096))
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 256))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 32))
+UPLOAD_BLOCK_SIZE = int(os.getenv("UPLOAD_BLOCK_SIZE", 1024 * 1024))
+INGEST_DB_PATH = os.getenv("INGEST_DB_PATH", os.path.join(os.getcwd(), "cache", "ingest_jobs.sqlite3"))
+MANIFEST_DB_PATH = os.getenv("MANIFEST_DB_PATH", os.path.join(os.getcwd(), "cache", "documents.sqlite3"))
+INGEST_MAX_JOBS = int(os.getenv("INGEST_MAX_JOBS", 4))
+INGEST_PER_USER_LIMIT = int(os.getenv("INGEST_PER_USER_LIMIT", 1))
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", 0)) or None
+EXTRACTION_TASK_TIMEOUT = float(os.getenv("EXTRACTION_TASK_TIMEOUT", 600))
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "base")
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", 0)) or None
+WHISPER_WINDOW_SECONDS = float(os.getenv("WHISPER_WINDOW_SECONDS", 30))
+WHISPER_PRELOAD = os.getenv("WHISPER_PRELOAD", "false").lower() == "true"
 
 # ============================================================
 # Initialize external services (Bedrock, Mongo, Pinecone)
 # ============================================================
 def initialize_aws_clients():
     try:
-        session = boto3.Session(region_name=AWS_REGION)
-        bedrock = session.client("bedrock-runtime")
+        bedrock = make_bedrock_client(
+            AWS_REGION,
+            max_pool_connections=BEDROCK_MAX_WORKERS,
+            read_timeout=BEDROCK_TIMEOUT
+        )
         logger.info("✅ AWS Bedrock client initialized")
         return bedrock
     except Exception as e:
@@ -275,9 +213,32 @@ def initialize_pinecone():
         logger.error(f"❌ Pinecone traceback: {traceback.format_exc()}")
         return None, None
 
-bedrock = initialize_aws_clients()
-mongo, db = initialize_mongo_client()
-pc, pine_index = initialize_pinecone()
+def initialize_vector_store() -> Optional[VectorStore]:
+    if VECTOR_BACKEND == "local":
+        store = LocalVectorStore(VECTOR_STORE_PATH, nprobe=VECTOR_NPROBE, exact_below=VECTOR_EXACT_BELOW)
+        logger.info(f"✅ Local vector store at {VECTOR_STORE_PATH}")
+        return store
+    return PineconeVectorStore(pine_index) if pine_index is not None else None
+
+# Spawned extraction and Whisper workers re-import this file as __mp_main__ when
+# the server is started with `python main.py`; they only need the worker
+# functions, so they open no clients, caches, pools or queues (background work
+# starts in on_startup)
+SPAWNED_WORKER = __name__ == "__mp_main__"
+
+bedrock = None if SPAWNED_WORKER else initialize_aws_clients()
+mongo, db = (None, None) if SPAWNED_WORKER else initialize_mongo_client()
+pc, pine_index = (None, None) if SPAWNED_WORKER or VECTOR_BACKEND == "local" else initialize_pinecone()
+vector_store = None if SPAWNED_WORKER else initialize_vector_store()
+
+# Blocking Bedrock/Mongo/Pinecone work runs here, never on the event loop
+bedrock_executor = BedrockExecutor(
+    bedrock,
+    max_workers=BEDROCK_MAX_WORKERS,
+    default_model_limit=BEDROCK_MODEL_CONCURRENCY,
+    model_limits=model_limits_from_env({BEDROCK_EMBEDDING_MODEL_ID: EMBEDDING_CONCURRENCY}),
+    timeout=BEDROCK_TIMEOUT
+)
 
 # ============================================================
 # LLM & Embeddings
@@ -291,7 +252,7 @@ def call_nova_model(prompt: str, max_tokens: int = 1000, temperature: float = 0.
             "messages": [{"role": "user", "content": [{"text": prompt}]}],
             "inferenceConfig": {"maxTokens": max_tokens, "temperature": temperature}
         }
-        response = bedrock.invoke_model(
+        response = bedrock_executor.invoke_model(
             modelId=BEDROCK_MODEL_ID,
             body=json.dumps(body),
             contentType="application/json",
@@ -308,102 +269,59 @@ def call_nova_model(prompt: str, max_tokens: int = 1000, temperature: float = 0.
         logger.error(f"❌ Nova API error: {e}")
         return None
 
-def get_embedding(text: str):
-    try:
-        if bedrock is not None and BEDROCK_EMBEDDING_MODEL_ID:
-            body = json.dumps({"inputText": text})
-            response = bedrock.invoke_model(
-                modelId=BEDROCK_EMBEDDING_MODEL_ID,
-                body=body,
-                contentType="application/json",
-                accept="application/json"
-            )
-            response_body = json.loads(response.get('body').read())
-            embedding = response_body.get('embedding')
-            if embedding:
-                return embedding
-    except Exception:
-        pass
-    # Fallback deterministic pseudo-embedding
+def fallback_embedding(text: str):
+    """Deterministic pseudo-embedding used when Bedrock is unavailable."""
     import hashlib
     hash_obj = hashlib.md5(text.encode())
     seed = int(hash_obj.hexdigest()[:8], 16)
-    np.random.seed(seed)
-    return np.random.normal(0, 1, 1024).tolist()
+    # A generator per call: pipeline threads call this concurrently, and reseeding the
+    # global RNG let another thread change a text's vector. RandomState draws the same
+    # values the global np.random.seed() path did, so stored fallback vectors still match
+    return np.random.RandomState(seed).normal(0, 1, 1024).tolist()
+
+embedding_cache = None if SPAWNED_WORKER else EmbeddingCache(
+    EMBEDDING_CACHE_PATH,
+    max_bytes=EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+    memory_items=EMBEDDING_CACHE_MEMORY_ITEMS
+)
 
+embedding_pipeline = None if SPAWNED_WORKER else EmbeddingPipeline(
+    bedrock_executor if bedrock is not None else None,
+    BEDROCK_EMBEDDING_MODEL_ID,
+    max_concurrency=EMBEDDING_CONCURRENCY,
+    batch_size=UPSERT_BATCH_SIZE,
+    fallback=fallback_embedding,
+    cache=embedding_cache
+)
 
-logger.info("🔊 Loading Whisper model...")
-WHISPER_MODEL = whisper.load_model("base")
-logger.info("✅ Whisper model loaded")
+def get_embedding(text: str):
+    return embedding_pipeline.embed(text)
 
-def extract_text_from_any_file(file_path: str) -> str:
-    ext = os.path.splitext(file_path)[1].lower()
 
-    # ---------- PDF ----------
-    if ext == ".pdf":
-        reader = PyPDF2.PdfReader(file_path)
-        return "\n".join(page.extract_text() or "" for page in reader.pages)
-
-    # ---------- DOCX ----------
-    if ext == ".docx":
-        d = docx.Document(file_path)
-        text = [p.text for p in d.paragraphs if p.text.strip()]
-        for table in d.tables:
-            for row in table.rows:
-                text.append(" | ".join(cell.text for cell in row.cells))
-        return "\n".join(text)
-
-    # ---------- PPTX ----------
-    if ext == ".pptx":
-        prs = Presentation(file_path)
-        text = []
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text.append(shape.text)
-        return "\n".join(text)
-
-    # ---------- CSV ----------
-    if ext == ".csv":
-        return pd.read_csv(file_path).to_string(index=False)
-
-    # ---------- XLSX ----------
-    if ext == ".xlsx":
-        return pd.read_excel(file_path).to_string(index=False)
-
-    # ---------- TEXT / CODE ----------
-    if ext in [".txt", ".py", ".md"]:
-        with open(file_path, encoding="utf-8", errors="ignore") as f:
-            return f.read()
-
-    # ---------- AUDIO ----------
-    if ext in [".mp3", ".wav", ".m4a"]:
-        return WHISPER_MODEL.transcribe(file_path)["text"]
-
-    # ---------- VIDEO ----------
-    # ---------- VIDEO ----------
-    if ext in [".mp4", ".mov", ".mkv"]:
-      wav_path = file_path + ".wav"
+# Whisper runs in its own worker processes; the model loads on first use unless preloaded at startup
+transcription_service = None if SPAWNED_WORKER else TranscriptionService(
+    WHISPER_MODEL_SIZE,
+    workers=WHISPER_WORKERS,
+    window_seconds=WHISPER_WINDOW_SECONDS
+)
 
-    try:
-        clip = AudioFileClip(file_path)
-        clip.write_audiofile(
-            wav_path,
-            codec="pcm_s16le",
-            fps=16000,
-            logger=None
-        )
-        clip.close()
-    except Exception as e:
-        raise RuntimeError(f"Audio extraction failed: {e}")
+# PDF pages, DOCX/PPTX and spreadsheet sheets are parsed in worker processes
+extraction_engine = None if SPAWNED_WORKER else ExtractionEngine(
+    max_workers=EXTRACTION_WORKERS,
+    task_timeout=EXTRACTION_TASK_TIMEOUT
+)
 
-    result = WHISPER_MODEL.transcribe(
-        wav_path,
-        fp16=False
-    )
+def extract_text_from_any_file(file_path: str) -> str:
+    ext = os.path.splitext(file_path)[1].lower()
 
-    return result.get("text", "")
+    # ---------- DOCUMENTS (PDF, DOCX, PPTX, CSV, XLSX, TEXT) ----------
+    if ext in DOCUMENT_EXTENSIONS:
+        return extraction_engine.extract(file_path).text
 
+    # ---------- AUDIO / VIDEO ----------
+    # ffmpeg decodes the audio track straight into PCM; no WAV is written next to the upload
+    if ext in MEDIA_EXTENSIONS:
+        return transcription_service.transcribe(file_path)
 
     # ---------- IMAGE (OCR) ----------
     if ext in [".jpg", ".jpeg", ".png"]:
@@ -424,17 +342,77 @@ def extract_text_from_any_file(file_path: str) -> str:
 # ============================================================
 # Query analysis & Mongo interaction
 # ============================================================
+MONGO_COLLECTIONS = ['clinic', 'doctors', 'appointments', 'slots', 'notices', 'slotexception']
+
+schema_registry = SchemaRegistry(
+    db,
+    MONGO_COLLECTIONS,
+    sample_size=SCHEMA_SAMPLE_SIZE,
+    ttl=SCHEMA_TTL_SECONDS
+)
+
+def load_entity_names(collection_name: str, fields: List[str]) -> List[str]:
+    if db is None:
+        return []
+    names = []
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    for doc in db[collection_name].find({}, projection).limit(5000):
+        for field in fields:
+            if doc.get(field):
+                names.append(str(doc[field]))
+                break
+    return names
+
+doctor_names = EntityDictionary(
+    lambda: load_entity_names("doctors", ["name"]),
+    ttl=ENTITY_TTL_SECONDS,
+    prefixes=("dr", "doctor")
+)
+clinic_names = EntityDictionary(
+    lambda: load_entity_names("clinic", ["clinicName", "name"]),
+    ttl=ENTITY_TTL_SECONDS
+)
+schema_registry.add_listener(doctor_names.invalidate)
+schema_registry.add_listener(clinic_names.invalidate)
+
+rule_engine = QueryRuleEngine(
+    doctors=doctor_names,
+    clinics=clinic_names,
+    schemas=schema_registry.schemas,
+    field_types=schema_registry.field_types
+)
+analysis_paths = AnalysisPathStats()
+
+# Near-duplicate hits must ask for the same doctor/clinic/day/date/status as the cached query
+intent_cache = IntentCache(
+    normalize=normalize_text,
+    embed=get_embedding,
+    threshold=INTENT_CACHE_THRESHOLD,
+    ttl=INTENT_CACHE_TTL_SECONDS,
+    max_entries=INTENT_CACHE_MAX_ENTRIES,
+    constraints=rule_engine.constraints
+)
+schema_registry.add_listener(intent_cache.invalidate)
+
 def analyze_query_intent(query: str) -> Dict[str, Any]:
-    collection_schemas = {}
-    if db is not None:
-        for collection_name in ['clinic', 'doctors', 'appointments', 'slots', 'notices', 'slotexception']:
-            if collection_name in db.list_collection_names():
-                try:
-                    sample = db[collection_name].find_one({}, {"_id": 0})
-                    if sample:
-                        collection_schemas[collection_name] = list(sample.keys())
-                except Exception:
-                    continue
+    # 1. Deterministic rules: no LLM call for unambiguous queries
+    rules = rule_engine.analyze(query)
+    if rules.confident:
+        analysis_paths.record("rules")
+        logger.info(f"⚡ Query analysis (rules): {rules.analysis}")
+        return rules.analysis
+
+    # 2. Previously analyzed (or near-duplicate) queries
+    cached = intent_cache.get(query)
+    if cached is not None:
+        analysis_paths.record("cache")
+        logger.info(f"⚡ Query analysis (cached): {cached}")
+        return cached
+
+    logger.info(f"🤔 Ambiguous query for rules (unexplained: {rules.unexplained}), asking LLM")
+
+    collection_schemas = schema_registry.schemas() if db is not None else {}
 
     prompt = f"""Analyze this user query and determine how to query the MongoDB database.
 
@@ -479,14 +457,24 @@ Return ONLY valid JSON with keys:
                         result["collection"] = "slotexception"
 
                 logger.info(f"🤖 Query analysis: {result}")
+                intent_cache.put(query, result)
+                analysis_paths.record("llm")
                 return result
 
     except Exception as e:
         logger.error(f"❌ Query analysis failed: {e}")
 
+    analysis_paths.record("fallback")
     return analyze_query_fallback(query)
 
 def analyze_query_fallback(query: str) -> Dict[str, Any]:
+    # Best-effort rule analysis, even when the rules are not confident
+    rules = rule_engine.analyze(query)
+    if rules.analysis.get("collection"):
+        analysis = dict(rules.analysis)
+        analysis["explanation"] = "Fallback analysis"
+        return analysis
+
     ql = query.lower()
     collection = None
     filters = {}
@@ -516,11 +504,12 @@ def analyze_query_fallback(query: str) -> Dict[str, Any]:
         "query_type": "search_specific" if filters else "list_all"
     }
 
-def intelligent_mongo_query(query: str) -> List[Dict]:
+def intelligent_mongo_query(query: str, analysis: Optional[Dict[str, Any]] = None) -> List[Dict]:
     if db is None:
         return []
 
-    analysis = analyze_query_intent(query)
+    if analysis is None:
+        analysis = analyze_query_intent(query)
     collection_name = analysis.get("collection")
     if not collection_name:
       logger.info("⚠️ No schema detected → skip Mongo")
@@ -529,7 +518,7 @@ def intelligent_mongo_query(query: str) -> List[Dict]:
     filters = analysis.get("filters", {})
     fields = analysis.get("fields")
 
-    if not collection_name or collection_name not in db.list_collection_names():
+    if not collection_name or collection_name not in schema_registry.collection_names():
         logger.warning(f"⚠️ Invalid collection requested: {collection_name}")
         return []
 
@@ -826,18 +815,17 @@ Return only the response text (no extra JSON)."""
 # Pinecone helpers
 # ============================================================
 def query_pinecone_intelligent(query: str, user_id: str = "default_user") -> List[str]:
-    if pine_index is None:
+    if vector_store is None:
         return []
     try:
         embedding = get_embedding(query)
-        result = pine_index.query(
-            vector=embedding,
+        matches = vector_store.query(
+            embedding,
             top_k=5,
-            include_metadata=True,
             filter={"user_id": {"$eq": user_id}}
         )
         texts = []
-        for match in result.get("matches", []):
+        for match in matches:
             metadata = match.get("metadata", {})
             if metadata and "text" in metadata:
                 texts.append(metadata["text"])
@@ -850,69 +838,24 @@ def query_pinecone_intelligent(query: str, user_id: str = "default_user") -> Lis
 # Guardrail Functions
 # ============================================================
 
-def normalize_text(text: str) -> str:
-    """Normalize text for comparison."""
-    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', '', text.lower())).strip()
-
-SCHEMA_KEYWORDS = {
-    "doctor", "doctors", "clinic", "clinics",
-    "appointment", "appointments",
-    "slot", "slots",
-    "notice", "notices",
-    "exception", "holiday"
-}
+# All routing keyword sets compiled once into a single automaton
+router_engine = RouterEngine()
 
 def is_schema_query(text: str) -> bool:
     """Check if query is about database schema."""
-    normalized = normalize_text(text)
-    return any(word in normalized for word in SCHEMA_KEYWORDS)
+    return router_engine.is_schema_query(text)
 
 def is_knowledge_query(text: str) -> bool:
     """Check if this is asking for factual information we might not have."""
-    text_lower = text.lower()
-    
-    # Questions asking for definitions, full forms, explanations
-    question_patterns = [
-        r'what (is|are) (the )?(full form of|meaning of|definition of|information about)',
-        r'explain',
-        r'describe',
-        r'tell me about',
-        r'who (is|are)',
-        r'when (is|was|did)',
-        r'where (is|are|was)',
-        r'why (is|are|does)',
-        r'how (does|do|is|are)'
-    ]
-    
-    for pattern in question_patterns:
-        if re.search(pattern, text_lower):
-            return True
-    
-    # Specific factual queries
-    factual_keywords = [
-        'what is', 'what are', 'full form', 'meaning of', 
-        'definition', 'explain', 'describe', 'information about',
-        'tell me about'
-    ]
-    
-    return any(keyword in text_lower for keyword in factual_keywords)
+    return router_engine.is_knowledge_query(text)
 
-def format_pinecone_response(texts: List[str], query: str) -> str:
-    """Format Pinecone response with guardrail for no information."""
-    if not texts:
-        # Check if this looks like a factual/knowledge question
-        if is_knowledge_query(query):
-            return format_response_block(
-                "Answer", 
-                "I don't have information about that in my knowledge base. This information is not available in the provided documents."
-            )
-        else:
-            return format_response_block("Document Search", "No relevant information found in the uploaded documents.")
-    
+NO_INFO_ANSWER = "I don't have information about that in my knowledge base. This information is not available in the provided documents."
+
+def build_pinecone_prompt(texts: List[str], query: str) -> str:
     combined = " ".join(texts[:3])[:1500]
     
     # Modified prompt to handle "no info" cases
-    prompt = f"""User asked: "{query}"
+    return f"""User asked: "{query}"
     
 Relevant document content:
 {combined}
@@ -924,51 +867,149 @@ Based ONLY on the document content above:
 4. Keep the answer concise and focused on answering exactly what was asked
 
 Answer:"""
+
+# Phrases that mean the model found nothing in the documents
+NO_INFO_PHRASES = [
+    "i don't have information",
+    "information is not available",
+    "not found in the document",
+    "not available in the provided",
+    "no information about that",
+    "not mentioned in the text",
+    "based on the document content",
+    "the document does not mention"
+]
+
+# Lead-ins to strip: the answer is what follows them
+ANSWER_PREFIX_PATTERNS = [
+    r'Answer:\s*(.*)',
+    r'The answer is:\s*(.*)',
+    r'Based on.*?:\s*(.*)',
+]
+
+def finalize_pinecone_answer(response: str, query: str) -> str:
+    """Apply the no-information guardrail and answer cleanup to a raw LLM answer."""
+    response = response.strip()
+    
+    # Check if response indicates no information
+    if any(phrase in response.lower() for phrase in NO_INFO_PHRASES):
+        return format_response_block("Answer", NO_INFO_ANSWER)
+    
+    # Extract just the answer part
+    for pattern in ANSWER_PREFIX_PATTERNS:
+        match = re.search(pattern, response, re.IGNORECASE | re.DOTALL)
+        if match:
+            response = match.group(1).strip()
+            break
     
+    # Clean up the response
+    response = re.sub(r'\s+', ' ', response).strip()
+    
+    # Ensure it ends with proper punctuation
+    if response and not response.endswith(('.', '!', '?')):
+        response = response + '.'
+    
+    return format_response_block("Answer", response)
+
+class PineconeAnswerStream:
+    """
+    finalize_pinecone_answer for a token stream, so the text the user watches
+    is the text that gets stored.
+
+    The first HOLD_CHARS characters are held back until the guardrail can
+    decide: a no-information answer is replaced by the NO_INFO block before
+    anything is shown, and an "Answer:" / "Based on ...:" lead-in is cut.
+    The rest streams through StreamingFormatter (line breaks are kept), and a
+    closing period is added to an unterminated last line.
+
+    finish() checks the complete answer again, as finalize_pinecone_answer
+    does: when a no-information phrase only appears after the prefix,
+    `replaced` is set and `text` becomes the NO_INFO block, which the caller
+    must send in place of what was already streamed.
+    """
+
+    HOLD_CHARS = 160
+
+    def __init__(self):
+        self.formatter = StreamingFormatter()
+        self.no_info = False
+        self.replaced = False
+        self._raw = ""
+        self._held = ""
+        self._decided = False
+        self._last_char = ""
+        self._emitted: List[str] = []
+
+    @property
+    def text(self) -> str:
+        """Everything emitted so far (the final answer once finish() returned)."""
+        return "".join(self._emitted)
+
+    def _emit(self, chunk: str) -> str:
+        if chunk:
+            self._emitted.append(chunk)
+        return chunk
+
+    def _track(self, raw: str):
+        stripped = raw.rstrip(" \t")
+        if stripped:
+            self._last_char = stripped[-1]
+
+    def _decide(self) -> str:
+        self._decided = True
+        raw, self._held = self._held, ""
+        if any(phrase in raw.lower() for phrase in NO_INFO_PHRASES):
+            self.no_info = True
+            return self._emit(format_response_block("Answer", NO_INFO_ANSWER))
+        for pattern in ANSWER_PREFIX_PATTERNS:
+            match = re.search(pattern, raw, re.IGNORECASE | re.DOTALL)
+            if match:
+                raw = raw[match.start(1):]
+                break
+        raw = raw.lstrip()
+        self._track(raw)
+        return self._emit(self.formatter.feed("**Answer**\n\n" + raw))
+
+    def feed(self, delta: str) -> str:
+        """Add a raw delta; return the text to send now."""
+        if self.no_info:
+            return ""
+        self._raw += delta
+        if not self._decided:
+            self._held += delta
+            return self._decide() if len(self._held) >= self.HOLD_CHARS else ""
+        self._track(delta)
+        return self._emit(self.formatter.feed(delta))
+
+    def finish(self) -> str:
+        """Return the remaining text at the end of the stream."""
+        out = self._decide() if not self._decided else ""
+        if self.no_info:
+            return out
+        if any(phrase in self._raw.lower() for phrase in NO_INFO_PHRASES):
+            self.no_info = self.replaced = True
+            self._emitted = [format_response_block("Answer", NO_INFO_ANSWER)]
+            return self.text
+        # Same closing punctuation as finalize_pinecone_answer (only while the last line is still open)
+        if self._last_char and self._last_char not in ".!?\n\r":
+            out += self._emit(self.formatter.feed("."))
+        return out + self._emit(self.formatter.flush())
+
+def format_pinecone_response(texts: List[str], query: str) -> str:
+    """Format Pinecone response with guardrail for no information."""
+    if not texts:
+        # Check if this looks like a factual/knowledge question
+        if is_knowledge_query(query):
+            return format_response_block("Answer", NO_INFO_ANSWER)
+        else:
+            return format_response_block("Document Search", "No relevant information found in the uploaded documents.")
+    
+    prompt = build_pinecone_prompt(texts, query)
+
     try:
         response = call_nova_model(prompt, max_tokens=200, temperature=0.1)
         if response:
-            response = response.strip()
-            
-            # Check if response indicates no information
-            no_info_phrases = [
-                "i don't have information",
-                "information is not available",
-                "not found in the document",
-                "not available in the provided",
-                "no information about that",
-                "not mentioned in the text",
-                "based on the document content",
-                "the document does not mention"
-            ]
-            
-            if any(phrase in response.lower() for phrase in no_info_phrases):
-                return format_response_block(
-                    "Answer", 
-                    "I don't have information about that in my knowledge base. This information is not available in the provided documents."
-                )
-            
-            # Extract just the answer part
-            patterns = [
-                r'Answer:\s*(.*)',
-                r'The answer is:\s*(.*)',
-                r'Based on.*?:\s*(.*)',
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, response, re.IGNORECASE | re.DOTALL)
-                if match:
-                    response = match.group(1).strip()
-                    break
-            
-            # Clean up the response
-            response = re.sub(r'\s+', ' ', response).strip()
-            
-            # Ensure it ends with proper punctuation
-            if response and not response.endswith(('.', '!', '?')):
-                response = response + '.'
-            
-            return format_response_block("Answer", response)
+            return finalize_pinecone_answer(response, query)
     except Exception as e:
         logger.warning(f"⚠️ LLM formatting failed for pinecone: {e}")
     
@@ -1016,6 +1057,7 @@ class GraphState(TypedDict):
     user_id: str
     error: str
     route: str
+    analysis: Dict[str, Any]  # intent analysis, computed at most once per query
 
 def router(state: GraphState) -> Dict[str, Any]:
     messages = state["messages"]
@@ -1025,55 +1067,10 @@ def router(state: GraphState) -> Dict[str, Any]:
     query_obj = messages[-1]
     qtext = query_obj.content.strip() if hasattr(query_obj, "content") else str(query_obj).strip()
     logger.info(f"🎯 Routing query: '{qtext}'")
-    ql = qtext.lower().strip()
-    
-    normalized = normalize_text(qtext)
-
-    # Exact greetings
-    exact_greetings = {
-        "hi", "hello", "hey", "hii", "helloo",
-        "greetings", "good morning", "good afternoon", "good evening"
-    }
 
-    if normalized in exact_greetings:
-        logger.info("🔄 Routing to: greeting")
-        return {"route": "greeting"}
-
-    # System info queries
-    info_keywords = ["what can you do", "what do you know", "help", "what information", "what are you", "what can you help", "capabilities", "features"]
-    for kw in info_keywords:
-        if kw in ql:
-            logger.info("🔄 Routing to: system_info")
-            return {"route": "system_info"}
-
-    # Document-related queries
-    doc_keywords = ["document", "pdf", "upload", "file", "chapter", "textbook", "study", "material"]
-    for kw in doc_keywords:
-        if kw in ql:
-            logger.info("🔄 Routing to: pinecone")
-            return {"route": "pinecone"}
-
-    # Schema-based DB queries → Mongo
-    if is_schema_query(normalized):
-        logger.info("🔄 Routing to: mongo")
-        return {"route": "mongo"}
-    
-    # Specific handling for slot queries
-    slot_patterns = ["slot", "available", "appointment", "booking", "schedule", "time", "monday", "tuesday", 
-                    "wednesday", "thursday", "friday", "saturday", "sunday", "morning", "afternoon", "evening"]
-    
-    if any(pattern in ql for pattern in slot_patterns) and ("when" in ql or "available" in ql or "slot" in ql):
-        logger.info("🔄 Routing to: mongo (slot query)")
-        return {"route": "mongo"}
-
-    # Check if this is a factual/knowledge query
-    if is_knowledge_query(qtext):
-        logger.info("🔄 Routing to: pinecone (knowledge query)")
-        return {"route": "pinecone"}
-
-    # Everything else → Pinecone
-    logger.info("🔄 Routing to: pinecone (fallback)")
-    return {"route": "pinecone"}
+    decision = router_engine.route(qtext)
+    logger.info(f"🔄 Routing to: {decision.route} ({decision.reason}, evidence={decision.evidence})")
+    return {"route": decision.route}
 
 
 def route_decision(router_output: dict) -> str:
@@ -1115,7 +1112,7 @@ def system_info_node(state: GraphState) -> Dict[str, Any]:
     formatted = format_response_block(title, body)
     return {"messages": messages + [AIMessage(content=formatted)]}
 
-def mongo_query_node(state: GraphState) -> Dict[str, Any]:
+def run_mongo_query(state: GraphState) -> Dict[str, Any]:
     messages = state["messages"]
     
     # Check if we should actually run this node
@@ -1124,15 +1121,15 @@ def mongo_query_node(state: GraphState) -> Dict[str, Any]:
         # Even if not explicitly routed, check if the query is schema-related
         query_obj = messages[-1]
         qtext = query_obj.content if hasattr(query_obj, "content") else str(query_obj)
-        if not is_schema_query(normalize_text(qtext)):
+        if not is_schema_query(qtext):
             logger.info("⏭️ Skipping Mongo node (not a schema query)")
             return state
     
     query_obj = messages[-1]
     qtext = query_obj.content if hasattr(query_obj, "content") else str(query_obj)
     try:
-        results = intelligent_mongo_query(qtext)
-        analysis = analyze_query_intent(qtext)
+        analysis = state.get("analysis") or analyze_query_intent(qtext)
+        results = intelligent_mongo_query(qtext, analysis)
         # Choose a formatter based on collection
         collection = analysis.get("collection", "")
         if collection == "doctors":
@@ -1149,13 +1146,13 @@ def mongo_query_node(state: GraphState) -> Dict[str, Any]:
             response = format_exceptions_response(results, qtext)
         else:
             response = format_general_response(results, qtext, analysis)
-        return {"messages": messages + [AIMessage(content=response)]}
+        return {"messages": messages + [AIMessage(content=response)], "analysis": analysis}
     except Exception as e:
         logger.error(f"❌ MongoDB query error: {e}")
         error_msg = format_response_block("Error", "I encountered an error while searching the database. Please try again or rephrase your question.")
         return {"messages": messages + [AIMessage(content=error_msg)], "error": str(e)}
 
-def pinecone_query_node(state: GraphState) -> Dict[str, Any]:
+def run_pinecone_query(state: GraphState) -> Dict[str, Any]:
     messages = state["messages"]
     query_obj = messages[-1]
     qtext = query_obj.content if hasattr(query_obj, "content") else str(query_obj)
@@ -1169,6 +1166,25 @@ def pinecone_query_node(state: GraphState) -> Dict[str, Any]:
         error_msg = format_response_block("Error", "I encountered an error while searching your documents. Please make sure you've uploaded PDF files first.")
         return {"messages": messages + [AIMessage(content=error_msg)], "error": str(e)}
 
+# A node may chain several Bedrock calls (intent analysis + formatting)
+NODE_TIMEOUT = BEDROCK_TIMEOUT * 2
+
+async def mongo_query_node(state: GraphState) -> Dict[str, Any]:
+    try:
+        return await bedrock_executor.run(run_mongo_query, state, timeout=NODE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.error("❌ Mongo node timed out")
+        error_msg = format_response_block("Error", "The database search took too long. Please try again in a moment.")
+        return {"messages": state["messages"] + [AIMessage(content=error_msg)], "error": "timeout"}
+
+async def pinecone_query_node(state: GraphState) -> Dict[str, Any]:
+    try:
+        return await bedrock_executor.run(run_pinecone_query, state, timeout=NODE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.error("❌ Pinecone node timed out")
+        error_msg = format_response_block("Error", "The document search took too long. Please try again in a moment.")
+        return {"messages": state["messages"] + [AIMessage(content=error_msg)], "error": "timeout"}
+
 # Build workflow
 workflow = StateGraph(GraphState)
 workflow.add_node("router", router)
@@ -1194,8 +1210,10 @@ workflow.add_edge("pinecone", END)
 workflow.add_edge("greeting", END)
 workflow.add_edge("system_info", END)
 
-graph = workflow.compile()
-logger.info("✅ Enhanced workflow compiled successfully")
+graph = None
+if not SPAWNED_WORKER:
+    graph = workflow.compile()
+    logger.info("✅ Enhanced workflow compiled successfully")
 
 # ============================================================
 # Session-based chat storage (React Query compatible)
@@ -1306,8 +1324,8 @@ async def send_chat_message(
         route=router_output.get("route", "pinecone")  # Add route to state
     )
     
-    # Process through the graph
-    result = graph.invoke(state_with_route)
+    # Process through the graph (blocking nodes run on the Bedrock executor)
+    result = await graph.ainvoke(state_with_route)
     ai_text = apply_global_formatting(result["messages"][-1].content)
 
     # Add AI response to session
@@ -1325,88 +1343,304 @@ async def send_chat_message(
         "response": ai_text
     }
 
-@app.post("/api/upload-pdf")
-async def api_upload_pdf(
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/message/stream")
+async def stream_chat_message(
+    payload: ChatRequest,
     request: Request,
-    file: UploadFile = File(...),
     user_id: str = Depends(get_current_user_id)
 ):
-    try:
-        # ---- user folder ----
-        user_dir = os.path.join(UPLOAD_DIR, user_id)
-        os.makedirs(user_dir, exist_ok=True)
+    """Send message and stream the AI response as Server-Sent Events.
 
-        file_path = os.path.join(user_dir, file.filename)
+    Events: `route` (routing decision), `token` (formatted text deltas),
+    `replace` (the full answer, replacing every token so far), `done` (final
+    stored message) and `error`. An answer cut short by a disconnect is still
+    stored, marked `interrupted`, so the question never stands alone.
+    """
+    query = payload.query.strip()
+    session_id = f"session_{user_id}"
 
-        # ---- save file ----
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+    if not query:
+        raise HTTPException(400, "Query cannot be empty")
 
-        # ---- extract text (ANY FILE) ----
+    user_message = {
+        "id": str(uuid.uuid4()),
+        "text": query,
+        "isUser": True,
+        "timestamp": datetime.now().isoformat()
+    }
+    add_message_to_session(session_id, user_message)
+
+    decision = router_engine.route(query)
+
+    def store_answer(text: str, interrupted: bool = False) -> Dict[str, Any]:
+        ai_message = {
+            "id": str(uuid.uuid4()),
+            "text": text,
+            "isUser": False,
+            "timestamp": datetime.now().isoformat()
+        }
+        if interrupted:
+            ai_message["interrupted"] = True
+        add_message_to_session(session_id, ai_message)
+        return ai_message
+
+    # What the answer has produced so far, for storing an interrupted answer
+    progress: Dict[str, Any] = {"answer": None, "disconnected": False}
+
+    async def events():
+        completed = False
+        try:
+            yield sse_event("route", {"route": decision.route, "reason": decision.reason, "evidence": decision.evidence})
+            answer_stream = answer_events()
+            try:
+                async for event in answer_stream:
+                    yield event
+            finally:
+                await answer_stream.aclose()  # stops the Bedrock stream too
+            if not progress["disconnected"]:
+                completed = True
+                yield sse_event("done", {"message": store_answer(progress["text"])})
+        finally:
+            # Disconnected (or the generator was closed) before the answer was stored
+            if not completed:
+                answer = progress["answer"]
+                partial = answer.text if answer is not None else ""
+                store_answer(
+                    partial or format_response_block("Interrupted", "The response was interrupted before it was complete."),
+                    interrupted=True
+                )
+
+    async def answer_events():
+        """The answer's SSE events; the final text is left in progress["text"]."""
+        ai_text = ""
         try:
-            full_text = extract_text_from_any_file(file_path)
+            stream_answer = decision.route == "pinecone" and bedrock is not None
+            texts = []
+            if stream_answer:
+                texts = await bedrock_executor.run(query_pinecone_intelligent, query, user_id)
+
+            if stream_answer and not texts:
+                ai_text = format_pinecone_response(texts, query)
+                yield sse_event("token", {"text": ai_text})
+            elif texts:
+                # Only the document answer is a single LLM generation worth streaming;
+                # the guardrail decides on a short prefix, so the streamed text is the stored text
+                answer = progress["answer"] = PineconeAnswerStream()
+                deltas = bedrock_executor.astream_converse(
+                    modelId=BEDROCK_MODEL_ID,
+                    messages=[{"role": "user", "content": [{"text": build_pinecone_prompt(texts, query)}]}],
+                    inferenceConfig={"maxTokens": 200, "temperature": 0.1},
+                )
+                try:
+                    async for delta in deltas:
+                        if await request.is_disconnected():
+                            logger.info("🔌 Client disconnected, stopping stream")
+                            progress["disconnected"] = True
+                            return
+                        chunk = answer.feed(delta)
+                        if chunk:
+                            yield sse_event("token", {"text": chunk})
+                        if answer.no_info:
+                            break  # the rest of the generation would be discarded
+                finally:
+                    await deltas.aclose()
+                chunk = answer.finish()
+                if answer.replaced:
+                    # A no-information phrase past the held prefix: same answer as /chat/message
+                    yield sse_event("replace", {"text": answer.text})
+                elif chunk:
+                    yield sse_event("token", {"text": chunk})
+                ai_text = answer.text
+            else:
+                state = GraphState(
+                    messages=[HumanMessage(content=query)],
+                    user_id=user_id,
+                    error="",
+                    route=decision.route
+                )
+                result = await graph.ainvoke(state)
+                ai_text = apply_global_formatting(result["messages"][-1].content)
+                yield sse_event("token", {"text": ai_text})
         except Exception as e:
-            logger.error(f"Extraction failed: {e}")
-            full_text = ""
+            logger.error(f"❌ Streaming chat error: {e}")
+            ai_text = format_response_block("Error", "I encountered an error while generating the response. Please try again.")
+            yield sse_event("error", {"text": ai_text})
+        progress["text"] = ai_text
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+chunker = TokenChunker(max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+document_manifest = None if SPAWNED_WORKER else DocumentManifest(MANIFEST_DB_PATH)
+
+def iter_document_parts(file_path: str, stats: ExtractionResult) -> Iterator[Tuple[str, Location]]:
+    """Stream (text, location) parts of an uploaded file; extraction errors fail the job."""
+    try:
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext in DOCUMENT_EXTENSIONS:
+            yield from extraction_engine.iter_parts(file_path, stats)
+        elif ext in MEDIA_EXTENSIONS:
+            # Segments arrive window by window, so chunking starts before the recording is done
+            for segment in transcription_service.iter_segments(file_path):
+                yield segment.text + " ", {"start_seconds": round(segment.start, 1), "end_seconds": round(segment.end, 1)}
+        else:
+            yield extract_text_from_any_file(file_path), {}
+    except Exception as e:
+        logger.error(f"Extraction failed: {e}")
+        # A partial document must not be recorded as indexed: the manifest
+        # would drop the chunks that were never reached as stale
+        raise
+
+def iter_document_chunks(job: Dict[str, Any], stats: ExtractionResult) -> Iterator[Chunk]:
+    chunks = 0
+    for chunk in chunker.chunks(iter_document_parts(job["path"], stats)):
+        chunks += 1
+        yield chunk
+    if not chunks:
+        logger.warning(f"⚠️ No text extracted from {job['filename']}, using placeholder text")
+        placeholder = f"Document: {job['filename']}\nNo readable text found."
+        yield Chunk(placeholder, 0, chunker.counter.count(placeholder))
+
+def publish_upload(job: Dict[str, Any]) -> str:
+    """Move a job's staged upload to uploads/<user>/<filename>; returns that path."""
+    final_path = os.path.join(UPLOAD_DIR, job["user_id"], job["filename"])
+    # Missing when a resumed job had already published it before the restart
+    if job["path"] != final_path and os.path.exists(job["path"]):
+        os.replace(job["path"], final_path)
+    return final_path
+
+def process_ingest_job(job: Dict[str, Any], report) -> Dict[str, Any]:
+    """Extract, chunk, embed and upsert an uploaded file as one streaming pipeline."""
+    # The queue never runs two jobs for one file, so nothing else reads it now
+    job = {**job, "path": publish_upload(job)}
+    user_id = job["user_id"]
+    filename = job["filename"]
+    extraction = ExtractionResult()
+
+    if not vector_store:
+        logger.warning("⚠️ Vector store not available - skipping vector storage")
+        chunks = sum(1 for _ in iter_document_chunks(job, extraction))
+        return {"filename": filename, "chunks": chunks, "metrics": None, "extraction": extraction.summary()}
+
+    # Unchanged re-uploads are a no-op; otherwise only new or changed chunks are embedded
+    file_hash = file_sha256(job["path"])
+    plan = document_manifest.plan(user_id, filename)
+    if plan.previous is not None and plan.previous.file_hash == file_hash:
+        logger.info(f"⏭️ {filename} is unchanged, skipping re-indexing")
+        return {"filename": filename, "chunks": len(plan.previous.chunks), "unchanged": True, "metrics": None}
+    if plan.previous is None:
+        # Vectors indexed before the manifest existed had timestamped ids
+        vector_store.delete(filter={"source": filename, "user_id": user_id})
+
+    uploaded_at = datetime.utcfromtimestamp(job["created_at"]).isoformat()
+    vector_ids: Dict[int, str] = {}
+
+    def changed_chunks() -> Iterator[Chunk]:
+        for chunk in iter_document_chunks(job, extraction):
+            vector_id = plan.assign(user_id, filename, chunk)
+            if vector_id is not None:
+                vector_ids[chunk.index] = vector_id
+                yield chunk
+
+    def build_vector(i: int, chunk: Chunk, embedding: List[float]) -> Dict[str, Any]:
+        return {
+            "id": vector_ids.pop(chunk.index),
+            "values": embedding,
+            "metadata": {
+                "text": chunk.text,
+                "user_id": user_id,
+                "source": filename,
+                "chunk": chunk.index,
+                "tokens": chunk.tokens,
+                "uploaded_at": uploaded_at,
+                **chunk.location
+            }
+        }
 
-        full_text = full_text.strip()
-        if not full_text:
-            full_text = f"Document: {file.filename}\nNo readable text found."
-            logger.warning(f"⚠️ No text extracted from {file.filename}, using placeholder text")
+    logger.info(f"📤 Streaming {filename} into the {VECTOR_BACKEND} vector store")
+    metrics = embedding_pipeline.run(
+        changed_chunks(),
+        build_vector=build_vector,
+        upsert=vector_store.upsert,
+        on_progress=lambda m: report(chunks_done=m.upserted, progress=extraction.progress)
+    )
+    stale = plan.stale_ids()
+    if stale:
+        vector_store.delete(filter={"user_id": user_id}, ids=stale)
+    document_manifest.save(user_id, filename, file_hash, plan.chunks)
+    logger.info(
+        f"✅ {filename}: upserted {metrics.upserted} new or changed chunks, "
+        f"kept {plan.unchanged} unchanged, deleted {len(stale)} stale"
+    )
 
-        logger.info(f"📄 Extracted {len(full_text)} characters from {file.filename}")
+    return {
+        "filename": filename,
+        "chunks": len(plan.chunks),
+        "unchanged_chunks": plan.unchanged,
+        "deleted_chunks": len(stale),
+        "metrics": metrics.as_dict(),
+        "extraction": extraction.summary()
+    }
 
-        # ---- chunking (UNCHANGED LOGIC) ----
-        sentences = re.split(r'(?<=[.!?])\s+', full_text)
-        chunks, current = [], ""
+ingest_queue = None if SPAWNED_WORKER else IngestJobQueue(
+    INGEST_DB_PATH,
+    process=process_ingest_job,
+    max_jobs=INGEST_MAX_JOBS,
+    per_user_limit=INGEST_PER_USER_LIMIT
+)
 
-        for s in sentences:
-            if len(current) + len(s) < 800:
-                current += s + " "
-            else:
-                chunks.append(current.strip())
-                current = s + " "
+@app.on_event("startup")
+async def on_startup():
+    """Background work starts with the server, never on import."""
+    schema_registry.start_watching()
+    ingest_queue.resume()
+    if WHISPER_PRELOAD:
+        transcription_service.warm()
 
-        if current.strip():
-            chunks.append(current.strip())
+@app.post("/api/upload-pdf")
+async def api_upload_pdf(
+    request: Request,
+    file: UploadFile = File(...),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Save the upload and queue it for background extraction and indexing."""
+    try:
+        # ---- user folder ----
+        user_dir = os.path.join(UPLOAD_DIR, user_id)
+        staging_dir = os.path.join(user_dir, ".incoming")
+        os.makedirs(staging_dir, exist_ok=True)
 
-        logger.info(f"🧩 Chunks created: {len(chunks)}")
-        logger.info(f"📏 First chunk length: {len(chunks[0]) if chunks else 0}")
+        # ---- stage the file; the job moves it into user_dir when it starts, so an
+        # earlier job still reading uploads/<user>/<filename> is never overwritten ----
+        file_path = os.path.join(staging_dir, f"{uuid.uuid4().hex}_{file.filename}")
 
+        # ---- save file (copied in blocks, never held in memory whole) ----
+        try:
+            with open(file_path, "wb") as f:
+                while True:
+                    block = await file.read(UPLOAD_BLOCK_SIZE)
+                    if not block:
+                        break
+                    f.write(block)
+        except Exception:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
 
-        # ---- pinecone upsert (UNCHANGED) ----
-        logger.info(f"🔍 Pinecone check: pine_index={pine_index is not None}, chunks={len(chunks)}")
-        
-        if pine_index:
-            vectors = []
-            ts = int(time.time())
-
-            for i, chunk in enumerate(chunks):
-                vectors.append({
-                    "id": f"{user_id}:{file.filename}:{i}:{ts}",
-                    "values": get_embedding(chunk),
-                    "metadata": {
-                        "text": chunk,
-                        "user_id": user_id,
-                        "source": file.filename,
-                        "chunk": i,
-                        "uploaded_at": datetime.utcnow().isoformat()
-                    }
-                })
-
-            logger.info(f"📤 Upserting {len(vectors)} vectors to Pinecone")
-            for i in range(0, len(vectors), 100):
-                pine_index.upsert(vectors=vectors[i:i+100])
-            logger.info(f"✅ Successfully upserted vectors to Pinecone")
-        else:
-            logger.warning("⚠️ Pinecone index not available - skipping vector storage")
+        job = ingest_queue.submit(user_id, file.filename, file_path)
 
         return {
             "success": True,
             "filename": file.filename,
-            "chunks": len(chunks),
-            "message": f"{file.filename} uploaded and indexed successfully"
+            "job_id": job["id"],
+            "status": job["status"],
+            "message": f"{file.filename} uploaded and queued for indexing"
         }
 
     except Exception as e:
@@ -1414,6 +1648,23 @@ async def api_upload_pdf(
         raise HTTPException(500, f"Failed to process file: {str(e)}")
 
 
+@app.get("/api/jobs/{job_id}")
+async def get_ingest_job(job_id: str, user_id: str = Depends(get_current_user_id)):
+    """Progress of an ingest job: status, stage progress and final result."""
+    job = ingest_queue.get(job_id)
+    if job is None or job["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.pop("path", None)
+    return {"success": True, "job": job}
+
+@app.get("/api/jobs")
+async def list_ingest_jobs(user_id: str = Depends(get_current_user_id)):
+    jobs = ingest_queue.list(user_id)
+    for job in jobs:
+        job.pop("path", None)
+    return {"success": True, "jobs": jobs}
+
+
 @app.get("/api/files")
 async def list_files(request: Request):
     user_id = get_current_user_id(request)
@@ -1442,7 +1693,7 @@ async def list_files(request: Request):
 
 @app.post("/rag/delete")
 async def delete_file(request: Request, delete_request: DeleteFileRequest):
-    """Delete file from local storage and Pinecone"""
+    """Delete file from local storage and the vector store"""
     user_id = get_current_user_id(request)
     filename = delete_request.filename
     
@@ -1455,17 +1706,15 @@ async def delete_file(request: Request, delete_request: DeleteFileRequest):
             os.remove(file_path)
             logger.info(f"Deleted local file: {file_path}")
         
-        # Try to delete from Pinecone (optional - don't fail if this fails)
+        # Try to delete from the vector store (optional - don't fail if this fails)
         try:
-            if PINECONE_API_KEY:
-                pc = Pinecone(api_key=PINECONE_API_KEY)
-                index = pc.Index(PINECONE_INDEX)
-                
+            if vector_store:
                 # Delete vectors with metadata matching the source and user_id
-                index.delete(filter={"source": filename, "user_id": user_id})
-                logger.info(f"Deleted from Pinecone: {filename} for user {user_id}")
-        except Exception as pinecone_error:
-            logger.warning(f"Failed to delete from Pinecone: {pinecone_error}")
+                vector_store.delete(filter={"source": filename, "user_id": user_id})
+                document_manifest.delete(user_id, filename)
+                logger.info(f"Deleted from vector store: {filename} for user {user_id}")
+        except Exception as vector_error:
+            logger.warning(f"Failed to delete from vector store: {vector_error}")
             # Continue anyway - local file deletion is more important
         
         return {"success": True, "message": f"File {filename} deleted successfully"}
@@ -1523,7 +1772,16 @@ async def health_check():
         "database": mongo_status,
         "collections": collections,
         "bedrock": bedrock_status,
-        "pinecone": pinecone_status
+        "pinecone": pinecone_status,
+        "bedrock_models": bedrock_executor.stats(),
+        "intent_cache": intent_cache.stats(),
+        "query_analysis": analysis_paths.as_dict(),
+        "embedding_cache": embedding_cache.stats(),
+        "ingest_jobs": ingest_queue.stats(),
+        "documents": document_manifest.stats(),
+        "transcription": transcription_service.stats(),
+        "extraction": extraction_engine.stats(),
+        "vector_store": vector_store.stats() if vector_store else {"backend": VECTOR_BACKEND, "status": "disconnected"}
     }
 
 @app.get("/")
@@ -1555,7 +1813,7 @@ if __name__ == "__main__":
     print("=" * 50)
     print(f"Model: {BEDROCK_MODEL_ID}")
     print(f"Database: {MONGO_DB}")
-    print(f"Pinecone: {PINECONE_INDEX}")
+    print(f"Vector store: {VECTOR_BACKEND} ({PINECONE_INDEX if VECTOR_BACKEND == 'pinecone' else VECTOR_STORE_PATH})")
     print("=" * 50)
     print("API Endpoints:")
     print("  POST /api/chat")
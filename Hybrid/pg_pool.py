@@ -0,0 +1,394 @@
+"""
+Pooled Postgres connections for dbchat.
+
+Opening a psycopg2 connection to Neon costs a TLS handshake and SCRAM
+authentication - often more than the query itself. PostgresPool keeps up to
+`max_size` connections open and hands them out per query:
+
+- Checkout is LIFO, so the most recently used (warmest) connection is reused
+- Connections idle for more than `health_check_after` seconds are probed with
+  SELECT 1 before use; broken or expired (`max_lifetime`) ones are replaced
+- Every connection runs with `statement_timeout`, so a runaway query is
+  cancelled by the server instead of holding a connection forever
+- Callers wait at most `acquire_timeout` for a free connection
+- stats() reports size, in-use, idle and waiting connections and acquire
+  latency, for /api/health
+
+`run()` is the async entry point: the query runs on a thread pool sized to
+the connection pool, the event loop awaits it with a timeout, and if the
+await times out or is cancelled (client disconnected) the running statement
+is cancelled on the server with a cancel request.
+
+Threads are split by role so that waiting for a connection can never block
+giving one back: callers wait for a free connection on their own threads,
+only work on an already checked-out connection runs on the query threads,
+and streams return their connection on a third pool.
+
+`stream()` runs a query through a named (server-side) cursor and yields the
+result as batches of tuples. The next batch is only fetched when the consumer
+asks for it, so a slow client holds back the database instead of the rows
+piling up in memory.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+
+logger = logging.getLogger("formatted-nova-assistant.pg-pool")
+
+
+class PoolTimeout(TimeoutError):
+    pass
+
+
+def ping(conn) -> bool:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    return True
+
+
+@dataclass
+class _Pooled:
+    conn: Any
+    created: float
+    last_used: float
+
+
+class PostgresPool:
+    """Bounded, health-checked pool of psycopg2 connections."""
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        statement_timeout_ms: int = 15000,
+        acquire_timeout: float = 10.0,
+        connect_timeout: int = 10,
+        health_check_after: float = 30.0,
+        max_lifetime: float = 1800.0,
+        cursor_factory=RealDictCursor,
+    ):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.statement_timeout_ms = statement_timeout_ms
+        self.acquire_timeout = acquire_timeout
+        self.connect_timeout = connect_timeout
+        self.health_check_after = health_check_after
+        self.max_lifetime = max_lifetime
+        self.cursor_factory = cursor_factory
+
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle: Deque[_Pooled] = deque()
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._acquires = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._acquire_ms: Deque[float] = deque(maxlen=512)
+        self._cancelled = 0
+        # One query thread per connection: run() never queues behind the event loop
+        self._executor = ThreadPoolExecutor(max_workers=max_size, thread_name_prefix="pg")
+        self._acquire_executor = ThreadPoolExecutor(max_workers=max_size, thread_name_prefix="pg-acquire")
+        self._release_executor = ThreadPoolExecutor(max_workers=max_size, thread_name_prefix="pg-release")
+
+        for _ in range(min(min_size, max_size)):
+            try:
+                self._idle.append(self._connect())
+            except psycopg2.Error as e:
+                logger.warning(f"⚠️ Could not pre-open Postgres connection: {e}")
+                break
+
+    # ---------- connections ----------
+    def _connect(self) -> _Pooled:
+        conn = psycopg2.connect(
+            self.dsn,
+            cursor_factory=self.cursor_factory,
+            connect_timeout=self.connect_timeout,
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10,
+            keepalives_count=3,
+        )
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SET statement_timeout = %s", (self.statement_timeout_ms,))
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        now = time.monotonic()
+        with self._lock:
+            self._open += 1
+        return _Pooled(conn, now, now)
+
+    def _discard(self, item: _Pooled):
+        with self._lock:
+            self._open -= 1
+            self._discarded += 1
+        try:
+            item.conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, item: _Pooled) -> bool:
+        if item.conn.closed:
+            return False
+        now = time.monotonic()
+        if now - item.created > self.max_lifetime:
+            return False
+        if now - item.last_used > self.health_check_after:
+            try:
+                with item.conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                item.conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def _checkout(self) -> _Pooled:
+        while True:
+            with self._lock:
+                item = self._idle.pop() if self._idle else None
+            if item is None:
+                return self._connect()
+            if self._healthy(item):
+                return item
+            self._discard(item)
+
+    # ---------- public API ----------
+    def acquire(self) -> _Pooled:
+        started = time.perf_counter()
+        with self._lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(timeout=self.acquire_timeout)
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                self._timeouts += 1
+        if not acquired:
+            raise PoolTimeout(f"Timed out after {self.acquire_timeout}s waiting for a database connection")
+        try:
+            item = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+            self._acquires += 1
+            self._acquire_ms.append((time.perf_counter() - started) * 1000)
+        return item
+
+    def release(self, item: _Pooled, broken: bool = False):
+        try:
+            if broken or item.conn.closed:
+                self._discard(item)
+                return
+            try:
+                # Never hand out a connection with an open (or aborted) transaction
+                if item.conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    item.conn.rollback()
+            except psycopg2.Error:
+                self._discard(item)
+                return
+            item.last_used = time.monotonic()
+            with self._lock:
+                self._idle.append(item)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Borrow a connection; it is rolled back and returned to the pool afterwards."""
+        item = self.acquire()
+        broken = False
+        try:
+            yield item.conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(item, broken=broken)
+
+    async def _acquire_async(self) -> _Pooled:
+        """acquire() on the waiting threads; a connection acquired after the caller gave up goes straight back."""
+        future = asyncio.get_running_loop().run_in_executor(self._acquire_executor, self.acquire)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            def give_back(done):
+                if not done.cancelled() and done.exception() is None:
+                    self._release_executor.submit(self.release, done.result())
+            future.add_done_callback(give_back)
+            raise
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Await `fn(conn, *args, **kwargs)` on a pooled connection without blocking the loop.
+
+        `timeout` covers the wait for a connection and the query. On timeout
+        or cancellation the statement still running on the connection is
+        cancelled server-side, so it stops holding the connection and the
+        database.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        item = await asyncio.wait_for(self._acquire_async(), timeout=timeout)
+        if timeout is not None:
+            timeout = max(0.0, timeout - (loop.time() - started))
+        state: Dict[str, Any] = {"running": False, "cancelled": False}
+        state_lock = threading.Lock()
+
+        def call():
+            broken = False
+            try:
+                with state_lock:
+                    if state["cancelled"]:
+                        raise asyncio.CancelledError()
+                    state["running"] = True
+                return fn(item.conn, *args, **kwargs)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            finally:
+                with state_lock:
+                    state["running"] = False
+                self.release(item, broken=broken)
+
+        future = loop.run_in_executor(self._executor, call)
+        try:
+            # Shielded: call() must run even when abandoned, since it returns the connection
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            with state_lock:
+                state["cancelled"] = True
+                running = state["running"]
+            if running:
+                try:
+                    item.conn.cancel()
+                except psycopg2.Error as e:
+                    logger.warning(f"⚠️ Could not cancel running query: {e}")
+                with self._lock:
+                    self._cancelled += 1
+            raise
+
+    async def stream(
+        self,
+        sql: str,
+        params: Any = None,
+        batch_size: int = 1000,
+        timeout: Optional[float] = None,
+        statement_timeout_ms: Optional[int] = None,
+        read_only: bool = False,
+    ) -> AsyncIterator[Tuple[List[str], List[tuple]]]:
+        """
+        Yield (column names, rows) batches of `sql` from a server-side cursor.
+
+        The first batch is always yielded (possibly empty) so callers learn the
+        columns. `timeout` bounds each round trip; `statement_timeout_ms`
+        overrides the server-side timeout for this query only, and `read_only`
+        runs it in a READ ONLY transaction. Closing the generator early
+        cancels the query and returns the connection.
+        """
+        loop = asyncio.get_running_loop()
+        item = await self._acquire_async()
+        conn = item.conn
+        state = {"cursor": None, "broken": False, "done": False}
+
+        def open_cursor():
+            with conn.cursor() as cursor:
+                if read_only:
+                    cursor.execute("SET TRANSACTION READ ONLY")
+                if statement_timeout_ms:
+                    cursor.execute("SET LOCAL statement_timeout = %s", (int(statement_timeout_ms),))
+            # Plain tuple cursor: no per-row dict for results that are only serialized
+            cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=psycopg2.extensions.cursor)
+            cursor.itersize = batch_size
+            cursor.execute(sql, params)
+            state["cursor"] = cursor
+
+        def fetch() -> Tuple[List[str], List[tuple]]:
+            rows = state["cursor"].fetchmany(batch_size)
+            return [column.name for column in state["cursor"].description or []], rows
+
+        def close():
+            try:
+                if state["cursor"] is not None and not conn.closed:
+                    state["cursor"].close()
+            except psycopg2.Error:
+                pass
+            self.release(item, broken=state["broken"])
+
+        try:
+            await asyncio.wait_for(loop.run_in_executor(self._executor, open_cursor), timeout=timeout)
+            first = True
+            while True:
+                columns, rows = await asyncio.wait_for(loop.run_in_executor(self._executor, fetch), timeout=timeout)
+                if rows or first:
+                    yield columns, rows
+                first = False
+                if len(rows) < batch_size:
+                    break
+            state["done"] = True
+        except psycopg2.Error as e:
+            # The statement already ended on the server; nothing to cancel
+            state["done"] = True
+            state["broken"] = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            raise
+        finally:
+            if not state["done"]:
+                # Timed out, failed or abandoned by the consumer: stop the server-side work
+                try:
+                    conn.cancel()
+                except psycopg2.Error:
+                    pass
+                with self._lock:
+                    self._cancelled += 1
+            # Not awaited: this also runs when the generator is closed from a cancelled task
+            self._release_executor.submit(close)
+
+    def check(self) -> bool:
+        """Round trip through a pooled connection (for health endpoints)."""
+        with self.connection() as conn:
+            return ping(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._acquire_ms)
+            p95: Optional[float] = samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else None
+            return {
+                "size": self._open,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "acquires": self._acquires,
+                "acquire_timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "cancelled_queries": self._cancelled,
+                "acquire_ms_avg": round(sum(samples) / len(samples), 2) if samples else None,
+                "acquire_ms_p95": round(p95, 2) if p95 is not None else None,
+            }
+
+    def close(self):
+        for executor in (self._acquire_executor, self._executor, self._release_executor):
+            executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for item in idle:
+            self._discard(item)
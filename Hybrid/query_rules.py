@@ -0,0 +1,404 @@
+"""
+Deterministic fast path for Mongo query-intent analysis.
+
+Extends the keyword fallback (collection keywords + day-of-week) with doctor
+names, clinic names, dates and appointment status, matched against entity
+dictionaries cached from Mongo. A query is answered without the LLM only when
+every word in it is explained by a rule; anything else is reported as
+ambiguous and left to analyze_query_intent's Nova call.
+
+Run `python query_rules.py` for a latency / LLM-call benchmark on a sample corpus.
+"""
+
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("formatted-nova-assistant.rules")
+
+# Order matters: first matching collection wins, like analyze_query_fallback
+COLLECTION_KEYWORDS: List[Tuple[str, Tuple[str, ...]]] = [
+    ("doctors", ("doctor", "doctors", "dr", "physician", "physicians")),
+    ("clinic", ("clinic", "clinics")),
+    ("appointments", ("appointment", "appointments", "booking", "bookings")),
+    ("slots", ("slot", "slots")),
+    ("notices", ("notice", "notices", "announcement", "announcements")),
+    ("slotexception", ("exception", "exceptions", "holiday", "holidays")),
+]
+
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+STATUSES = ("pending", "confirmed", "cancelled", "canceled", "completed", "booked", "scheduled", "rescheduled")
+
+# Words that never change the meaning of a list/lookup query
+FILLER_WORDS = {
+    "a", "all", "an", "and", "any", "are", "available", "can", "could", "details", "do",
+    "for", "from", "get", "give", "have", "i", "in", "info", "information", "is", "list",
+    "me", "my", "of", "on", "please", "see", "show", "tell", "the", "there", "what",
+    "which", "with", "you", "about", "find", "current", "latest", "open", "free",
+    "named", "called", "by", "at", "to", "every", "our", "your", "s", "today",
+    "tomorrow", "yesterday", "day", "date", "status",
+}
+
+# Where an entity lives in each collection, in order of preference
+ENTITY_FIELDS = {
+    "doctor": {
+        "doctors": ("name",),
+        "slots": ("doctorName", "doctor"),
+        "appointments": ("doctorName", "doctor"),
+    },
+    "clinic": {
+        "clinic": ("clinicName", "name"),
+        "doctors": ("clinicName", "clinic"),
+    },
+}
+
+# Date fields per collection, in order of preference; only string dates can take a prefix regex
+DATE_FIELDS = {
+    "appointments": ("date", "appointmentDate"),
+    "slotexception": ("date", "exceptionDate"),
+    "notices": ("date",),
+}
+
+DATE_PATTERN = re.compile(
+    r"\b(?:(\d{4})-(\d{1,2})-(\d{1,2})|(\d{1,2})[/-](\d{1,2})[/-](\d{4}))\b"
+)
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s/-]", " ", text.lower())).strip()
+
+
+class EntityDictionary:
+    """Alias -> canonical name map for one entity type, reloaded on a TTL."""
+
+    def __init__(self, loader: Callable[[], Iterable[str]], ttl: float = 300.0, prefixes: Tuple[str, ...] = ()):
+        self.loader = loader
+        self.ttl = ttl
+        self.prefixes = prefixes
+        self._aliases: Dict[str, str] = {}
+        self._pattern: Optional[re.Pattern] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _build(self, names: Iterable[str]):
+        aliases: Dict[str, str] = {}
+        token_owners: Dict[str, set] = {}
+        for name in names:
+            if not name:
+                continue
+            canonical = str(name).strip()
+            full = _normalize(canonical)
+            for prefix in self.prefixes:
+                if full.startswith(prefix + " "):
+                    full = full[len(prefix) + 1:]
+            if not full:
+                continue
+            aliases[full] = canonical
+            for token in full.split():
+                if len(token) >= 4:
+                    token_owners.setdefault(token, set()).add(canonical)
+        # Single tokens ("anindya") only count when they identify one entity
+        for token, owners in token_owners.items():
+            if len(owners) == 1 and token not in aliases:
+                aliases[token] = next(iter(owners))
+        self._aliases = aliases
+        if aliases:
+            alternation = "|".join(re.escape(a) for a in sorted(aliases, key=len, reverse=True))
+            self._pattern = re.compile(rf"\b(?:{alternation})\b")
+        else:
+            self._pattern = None
+
+    def _ensure_loaded(self):
+        if time.monotonic() - self._loaded_at <= self.ttl:
+            return
+        try:
+            names = list(self.loader())
+        except Exception as e:
+            logger.warning(f"⚠️ Entity dictionary reload failed: {e}")
+            names = None
+        with self._lock:
+            if names is not None:
+                self._build(names)
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self, *_):
+        self._loaded_at = 0.0
+
+    def find(self, normalized_query: str) -> Optional[Tuple[str, str]]:
+        """Return (matched alias, canonical name) for the longest alias in the query."""
+        self._ensure_loaded()
+        with self._lock:
+            if self._pattern is None:
+                return None
+            match = self._pattern.search(normalized_query)
+            if not match:
+                return None
+            return match.group(0), self._aliases[match.group(0)]
+
+
+@dataclass
+class RuleResult:
+    analysis: Dict[str, Any]
+    confident: bool
+    evidence: List[str] = field(default_factory=list)
+    unexplained: List[str] = field(default_factory=list)
+
+
+class QueryRuleEngine:
+    """Compiled keyword/entity rules that can answer simple Mongo queries without Nova."""
+
+    def __init__(
+        self,
+        doctors: Optional[EntityDictionary] = None,
+        clinics: Optional[EntityDictionary] = None,
+        schemas: Optional[Callable[[], Dict[str, List[str]]]] = None,
+        field_types: Optional[Callable[[str], Dict[str, Any]]] = None,
+        today: Callable[[], date] = date.today,
+    ):
+        self.doctors = doctors
+        self.clinics = clinics
+        self.schemas = schemas
+        self.field_types = field_types
+        self.today = today
+        self._keyword_to_collection = {}
+        for collection, words in COLLECTION_KEYWORDS:
+            for word in words:
+                self._keyword_to_collection[word] = collection
+        self._collection_pattern = re.compile(
+            r"\b(" + "|".join(sorted(self._keyword_to_collection, key=len, reverse=True)) + r")\b"
+        )
+        self._day_pattern = re.compile(r"\b(" + "|".join(DAYS) + r")s?\b")
+        self._status_pattern = re.compile(r"\b(" + "|".join(STATUSES) + r")\b")
+        self._relative_pattern = re.compile(r"\b(today|tomorrow|yesterday)\b")
+
+    def _field_for(self, entity: str, collection: str) -> Optional[str]:
+        candidates = ENTITY_FIELDS.get(entity, {}).get(collection, ())
+        if not candidates:
+            return None
+        if self.schemas is None:
+            return candidates[0]
+        fields = set(self.schemas().get(collection, []))
+        for candidate in candidates:
+            if candidate in fields:
+                return candidate
+        return None
+
+    def _date_field_for(self, collection: str) -> Optional[str]:
+        """The collection's date field, if it stores ISO strings (a regex can't match a datetime)."""
+        candidates = DATE_FIELDS.get(collection, ())
+        if self.schemas is not None:
+            fields = set(self.schemas().get(collection, []))
+            candidates = tuple(c for c in candidates if c in fields)
+        if not candidates:
+            return None
+        if self.field_types is None:
+            return candidates[0]
+        types = self.field_types(collection).get(candidates[0], set())
+        return candidates[0] if types == {"str"} else None
+
+    def _extract_date(self, q: str) -> Optional[Tuple[str, str]]:
+        m = DATE_PATTERN.search(q)
+        if m:
+            try:
+                if m.group(1):
+                    d = date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+                else:
+                    d = date(int(m.group(6)), int(m.group(5)), int(m.group(4)))
+                return m.group(0), d.isoformat()
+            except ValueError:
+                return None
+        m = self._relative_pattern.search(q)
+        if m:
+            offset = {"today": 0, "tomorrow": 1, "yesterday": -1}[m.group(1)]
+            return m.group(1), (self.today() + timedelta(days=offset)).isoformat()
+        return None
+
+    def constraints(self, query: str) -> frozenset:
+        """Filter values the query asks for (doctor, clinic, day, date, status), to compare near-duplicates."""
+        q = _normalize(query)
+        found = set()
+        for entity, dictionary in (("doctor", self.doctors), ("clinic", self.clinics)):
+            match = dictionary.find(q) if dictionary else None
+            if match:
+                found.add(f"{entity}:{match[1]}")
+        found.update(f"day:{m.group(1)}" for m in self._day_pattern.finditer(q))
+        found.update(f"status:{m.group(1)}" for m in self._status_pattern.finditer(q))
+        found_date = self._extract_date(q)
+        if found_date:
+            found.add(f"date:{found_date[1]}")
+        return frozenset(found)
+
+    def analyze(self, query: str) -> RuleResult:
+        q = _normalize(query)
+        explained: set = set()
+        evidence: List[str] = []
+        filters: Dict[str, Any] = {}
+        ambiguous = False
+
+        collections = []
+        for m in self._collection_pattern.finditer(q):
+            collection = self._keyword_to_collection[m.group(1)]
+            explained.add(m.group(1))
+            if collection not in collections:
+                collections.append(collection)
+        collection = collections[0] if collections else None
+        if collection:
+            evidence.append(f"collection:{collection}")
+        # "doctor X's slots" is fine; "doctors and clinics" is not
+        if len(collections) > 1 and not (collections[0] == "doctors" and len(collections) == 2):
+            ambiguous = True
+
+        doctor = self.doctors.find(q) if self.doctors else None
+        clinic = self.clinics.find(q) if self.clinics else None
+        if len(collections) == 2 and collections[0] == "doctors":
+            # the doctor keyword only qualifies the second collection
+            collection = collections[1]
+            if not doctor:
+                ambiguous = True
+        if collection is None and doctor:
+            collection = "doctors"
+            evidence.append("collection:doctors(by name)")
+        if collection is None and clinic:
+            collection = "clinic"
+            evidence.append("collection:clinic(by name)")
+
+        for entity, found in (("doctor", doctor), ("clinic", clinic)):
+            if not found:
+                continue
+            alias, canonical = found
+            explained.update(alias.split())
+            field_name = self._field_for(entity, collection) if collection else None
+            if field_name:
+                filters[field_name] = canonical
+                evidence.append(f"{entity}:{canonical}")
+            else:
+                ambiguous = True
+
+        day = self._day_pattern.search(q)
+        if day:
+            explained.add(day.group(0))
+            if collection == "slots":
+                filters["dayOfWeek"] = {"$regex": day.group(1), "$options": "i"}
+                evidence.append(f"day:{day.group(1)}")
+            else:
+                ambiguous = True
+
+        found_date = self._extract_date(q)
+        if found_date:
+            raw, iso = found_date
+            explained.update(raw.split())
+            date_field = self._date_field_for(collection) if collection else None
+            if date_field:
+                filters[date_field] = {"$regex": f"^{iso}"}
+                evidence.append(f"date:{iso}")
+            else:
+                ambiguous = True
+
+        status = self._status_pattern.search(q)
+        if status:
+            explained.add(status.group(1))
+            if collection == "appointments":
+                filters["status"] = {"$regex": f"^{status.group(1)}$", "$options": "i"}
+                evidence.append(f"status:{status.group(1)}")
+            else:
+                ambiguous = True
+
+        unexplained = [w for w in q.split() if w not in explained and w not in FILLER_WORDS]
+        if unexplained:
+            ambiguous = True
+
+        date_keys = {"dayOfWeek"} | {f for fields in DATE_FIELDS.values() for f in fields}
+        if filters.keys() & {"name", "doctorName", "doctor", "clinicName"} and not (date_keys & filters.keys()):
+            query_type = "find_by_name"
+        elif date_keys & filters.keys():
+            query_type = "find_by_date"
+        elif filters:
+            query_type = "search_specific"
+        else:
+            query_type = "list_all"
+
+        analysis = {
+            "collection": collection,
+            "fields": None,
+            "filters": filters,
+            "explanation": "Rule-based analysis: " + (", ".join(evidence) or "no rules matched"),
+            "query_type": query_type,
+        }
+        return RuleResult(
+            analysis=analysis,
+            confident=bool(collection) and not ambiguous,
+            evidence=evidence,
+            unexplained=unexplained,
+        )
+
+
+class AnalysisPathStats:
+    """Counts which path (rules / cache / llm / fallback) answered each query."""
+
+    def __init__(self):
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, path: str):
+        with self._lock:
+            self._counts[path] = self._counts.get(path, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(self._counts.values())
+            counts = dict(self._counts)
+        llm_calls = counts.get("llm", 0) + counts.get("fallback", 0)
+        return {
+            "paths": counts,
+            "total": total,
+            "llm_avoided_rate": round(1 - llm_calls / total, 4) if total else 0.0,
+        }
+
+
+# ============================================================
+# Benchmark (fake LLM latency, no network)
+# ============================================================
+BENCH_CORPUS = [
+    "show all doctors", "list doctors", "monday slots", "slots on friday",
+    "what clinics are available", "show clinics", "any notices", "latest notices",
+    "holidays", "show appointments", "confirmed appointments", "appointments on 2025-03-14",
+    "tell me about doctor anindya", "dr anindya slots on tuesday", "appointments for tomorrow",
+    "which doctor has the most experience in cardiology", "doctors and clinics near me",
+    "how many appointments were cancelled last week", "is sunrise clinic open on sunday",
+    "show all doctors", "monday slots", "list doctors",
+]
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    fake_llm_latency = 0.4
+
+    engine = QueryRuleEngine(
+        doctors=EntityDictionary(lambda: ["Dr. Anindya Sen", "Dr. Priya Rao"], prefixes=("dr",)),
+        clinics=EntityDictionary(lambda: ["Sunrise Clinic", "City Care"]),
+        schemas=lambda: {
+            "doctors": ["name", "specialization", "email"],
+            "slots": ["dayOfWeek", "startTime", "endTime", "doctorName"],
+            "appointments": ["patientName", "doctorName", "date", "status"],
+            "clinic": ["clinicName", "address"],
+        },
+    )
+
+    llm_calls = 0
+    started = time.perf_counter()
+    for query in BENCH_CORPUS:
+        result = engine.analyze(query)
+        if not result.confident:
+            llm_calls += 1
+            time.sleep(fake_llm_latency)
+        print(f"{'rules' if result.confident else 'llm  '}  {query!r:60} {result.analysis['filters']}")
+    elapsed = time.perf_counter() - started
+
+    baseline = len(BENCH_CORPUS) * fake_llm_latency
+    print(f"\nqueries={len(BENCH_CORPUS)}  llm_calls={llm_calls} (baseline {len(BENCH_CORPUS)})")
+    print(f"mean latency {elapsed / len(BENCH_CORPUS) * 1000:.1f}ms vs {fake_llm_latency * 1000:.0f}ms with LLM-only analysis "
+          f"({(1 - elapsed / baseline) * 100:.0f}% lower)")
@@ -0,0 +1,233 @@
+"""
+Precompiled keyword router.
+
+All greeting, system-info, document, schema, slot and knowledge keyword sets
+are compiled at startup into one Aho-Corasick automaton. A query is
+normalized once, scanned once, and the route is chosen from the categories
+that matched, with the same precedence as the original router:
+
+greeting > system_info > document > schema (mongo) > slot (mongo) > knowledge > fallback
+
+Run `python router_engine.py` for the golden-corpus check and a micro-benchmark.
+"""
+
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+EXACT_GREETINGS = {
+    "hi", "hello", "hey", "hii", "helloo",
+    "greetings", "good morning", "good afternoon", "good evening"
+}
+
+KEYWORD_SETS: Dict[str, Tuple[str, ...]] = {
+    "system_info": (
+        "what can you do", "what do you know", "help", "what information",
+        "what are you", "what can you help", "capabilities", "features",
+    ),
+    "document": ("document", "pdf", "upload", "file", "chapter", "textbook", "study", "material"),
+    "schema": (
+        "doctor", "doctors", "clinic", "clinics", "appointment", "appointments",
+        "slot", "slots", "notice", "notices", "exception", "holiday",
+    ),
+    "slot": (
+        "slot", "available", "appointment", "booking", "schedule", "time",
+        "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+        "morning", "afternoon", "evening",
+    ),
+    "slot_trigger": ("when", "available", "slot"),
+    # Literal expansion of the old question regexes plus the factual keywords
+    "knowledge": (
+        "what is", "what are", "full form", "meaning of", "definition",
+        "explain", "describe", "information about", "tell me about",
+        "who is", "who are", "when is", "when was", "when did",
+        "where is", "where are", "where was", "why is", "why are", "why does",
+        "how does", "how do", "how is", "how are",
+    ),
+}
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation, collapse whitespace (same as normalize_text)."""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", "", text.lower())).strip()
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: one pass over the text reports every keyword."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, str]]):
+        # patterns: (keyword, category)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, str]]] = [[]]
+        for keyword, category in patterns:
+            self._add(keyword, category)
+        self._build()
+
+    def _add(self, keyword: str, category: str):
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((category, keyword))
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0) if state else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def scan(self, text: str) -> Dict[str, str]:
+        """Return {category: first keyword matched} for every category found in text."""
+        found: Dict[str, str] = {}
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for category, keyword in out[state]:
+                if category not in found:
+                    found[category] = keyword
+        return found
+
+
+@dataclass
+class RouteDecision:
+    route: str
+    reason: str
+    normalized: str
+    evidence: Dict[str, str] = field(default_factory=dict)
+
+
+class RouterEngine:
+    """One-pass query classifier for the LangGraph router."""
+
+    def __init__(self, keyword_sets: Optional[Dict[str, Iterable[str]]] = None, greetings: Optional[Set[str]] = None):
+        keyword_sets = keyword_sets or KEYWORD_SETS
+        self.greetings = set(greetings or EXACT_GREETINGS)
+        self._automaton = AhoCorasick(
+            (keyword, category)
+            for category, keywords in keyword_sets.items()
+            for keyword in keywords
+        )
+
+    def classify(self, text: str) -> Tuple[str, Dict[str, str]]:
+        normalized = normalize_query(text)
+        return normalized, self._automaton.scan(normalized)
+
+    def is_schema_query(self, text: str) -> bool:
+        return "schema" in self.classify(text)[1]
+
+    def is_knowledge_query(self, text: str) -> bool:
+        return "knowledge" in self.classify(text)[1]
+
+    def route(self, text: str) -> RouteDecision:
+        normalized, found = self.classify(text)
+
+        if normalized in self.greetings:
+            return RouteDecision("greeting", "greeting", normalized, {"greeting": normalized})
+        if "system_info" in found:
+            return RouteDecision("system_info", "system_info", normalized, found)
+        if "document" in found:
+            return RouteDecision("pinecone", "document", normalized, found)
+        if "schema" in found:
+            return RouteDecision("mongo", "schema", normalized, found)
+        if "slot" in found and "slot_trigger" in found:
+            return RouteDecision("mongo", "slot query", normalized, found)
+        if "knowledge" in found:
+            return RouteDecision("pinecone", "knowledge query", normalized, found)
+        return RouteDecision("pinecone", "fallback", normalized, found)
+
+
+# ============================================================
+# Golden corpus + micro-benchmark
+# ============================================================
+GOLDEN_ROUTES = [
+    ("hi", "greeting"),
+    ("Hello!", "greeting"),
+    ("good morning", "greeting"),
+    ("hi there", "pinecone"),
+    ("What can you do?", "system_info"),
+    ("I need help", "system_info"),
+    ("what features do you have", "system_info"),
+    ("summarize the uploaded PDF", "pinecone"),
+    ("what does chapter 3 of the textbook say", "pinecone"),
+    ("show all doctors", "mongo"),
+    ("Tell me about doctor Anindya", "mongo"),
+    ("What clinics are available?", "mongo"),
+    ("When are Monday slots available?", "mongo"),
+    ("Do you have any notices?", "mongo"),
+    ("any holiday this month", "mongo"),
+    ("is anything available on friday evening", "mongo"),
+    ("when can I come on tuesday", "mongo"),
+    ("what time is it on monday", "pinecone"),
+    ("What is the full form of IEI?", "pinecone"),
+    ("explain the certification process", "pinecone"),
+    ("who is the director", "pinecone"),
+    ("revenue figures for 2023", "pinecone"),
+    ("", "pinecone"),
+]
+
+
+def _legacy_route(qtext: str) -> str:
+    """Reference copy of the pre-automaton router, for the benchmark only."""
+    ql = qtext.lower().strip()
+    normalized = normalize_query(qtext)
+    if normalized in EXACT_GREETINGS:
+        return "greeting"
+    for kw in KEYWORD_SETS["system_info"]:
+        if kw in ql:
+            return "system_info"
+    for kw in KEYWORD_SETS["document"]:
+        if kw in ql:
+            return "pinecone"
+    if any(word in normalize_query(normalized) for word in KEYWORD_SETS["schema"]):
+        return "mongo"
+    if any(p in ql for p in KEYWORD_SETS["slot"]) and ("when" in ql or "available" in ql or "slot" in ql):
+        return "mongo"
+    question_patterns = [
+        r'what (is|are) (the )?(full form of|meaning of|definition of|information about)',
+        r'explain', r'describe', r'tell me about', r'who (is|are)', r'when (is|was|did)',
+        r'where (is|are|was)', r'why (is|are|does)', r'how (does|do|is|are)'
+    ]
+    if any(re.search(p, ql) for p in question_patterns):
+        return "pinecone"
+    return "pinecone"
+
+
+if __name__ == "__main__":
+    import time
+
+    engine = RouterEngine()
+    failures = 0
+    for query, expected in GOLDEN_ROUTES:
+        decision = engine.route(query)
+        legacy = _legacy_route(query)
+        status = "ok " if decision.route == expected == legacy else "BAD"
+        failures += status == "BAD"
+        print(f"{status} {query!r:48} -> {decision.route:12} ({decision.reason}) {decision.evidence}")
+    print(f"\ngolden corpus: {len(GOLDEN_ROUTES) - failures}/{len(GOLDEN_ROUTES)} match\n")
+
+    corpus = [q for q, _ in GOLDEN_ROUTES] * 2000
+    for name, fn in (("legacy", _legacy_route), ("automaton", lambda q: engine.route(q).route)):
+        started = time.perf_counter()
+        for q in corpus:
+            fn(q)
+        per_query = (time.perf_counter() - started) / len(corpus) * 1e6
+        print(f"{name:10} {per_query:.2f} µs/query")
+
+    raise SystemExit(1 if failures else 0)
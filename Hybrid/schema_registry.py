@@ -0,0 +1,158 @@
+"""
+MongoDB schema registry for query-intent analysis.
+
+Builds the field list of every known collection once (union of keys over a
+sample of documents instead of a single find_one), serves it from memory and
+refreshes it when the TTL expires or a change stream reports a new field,
+a new collection or a dropped one. The Python types seen for each field in
+the sample are kept too (field_types()), so callers can tell a string date
+from a datetime.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger("formatted-nova-assistant.schema")
+
+
+class SchemaRegistry:
+    """Cached collection -> field list map with TTL and change-stream refresh."""
+
+    def __init__(self, db, collections: Iterable[str], sample_size: int = 25, ttl: float = 300.0):
+        self.db = db
+        self.known_collections = list(collections)
+        self.sample_size = sample_size
+        self.ttl = ttl
+        self.version = 0
+        self._schemas: Dict[str, List[str]] = {}
+        self._types: Dict[str, Dict[str, Set[str]]] = {}
+        self._present: Set[str] = set()
+        self._loaded_at = 0.0
+        self._stale = True
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[int], None]] = []
+        self._watcher: Optional[threading.Thread] = None
+
+    # ---------- building ----------
+    def _sample_fields(self, collection_name: str) -> Dict[str, Set[str]]:
+        """Field name -> type names seen in the sample, in first-seen order."""
+        fields: Dict[str, Set[str]] = {}
+        cursor = self.db[collection_name].find({}, {"_id": 0}).limit(self.sample_size)
+        for doc in cursor:
+            for key, value in doc.items():
+                if value is not None:
+                    fields.setdefault(key, set()).add(type(value).__name__)
+                else:
+                    fields.setdefault(key, set())
+        return fields
+
+    def refresh(self):
+        """Rebuild the registry: one list_collection_names + one sample query per collection."""
+        if self.db is None:
+            return
+        started = time.perf_counter()
+        try:
+            present = set(self.db.list_collection_names())
+        except Exception as e:
+            logger.error(f"❌ Schema refresh failed: {e}")
+            return
+
+        schemas, types = {}, {}
+        for name in self.known_collections:
+            if name not in present:
+                continue
+            try:
+                fields = self._sample_fields(name)
+                if fields:
+                    schemas[name] = list(fields)
+                    types[name] = fields
+            except Exception:
+                continue
+
+        with self._lock:
+            changed = schemas != self._schemas or present != self._present
+            self._schemas = schemas
+            self._types = types
+            self._present = present
+            self._loaded_at = time.monotonic()
+            self._stale = False
+            if changed:
+                self.version += 1
+            listeners = list(self._listeners) if changed else []
+
+        logger.info(f"🗂️ Schema registry refreshed in {(time.perf_counter() - started) * 1000:.0f}ms (v{self.version})")
+        for listener in listeners:
+            try:
+                listener(self.version)
+            except Exception as e:
+                logger.warning(f"⚠️ Schema listener failed: {e}")
+
+    def _ensure_fresh(self):
+        with self._lock:
+            expired = self._stale or (time.monotonic() - self._loaded_at) > self.ttl
+        if expired:
+            self.refresh()
+
+    # ---------- public API ----------
+    def schemas(self) -> Dict[str, List[str]]:
+        self._ensure_fresh()
+        with self._lock:
+            return {name: list(fields) for name, fields in self._schemas.items()}
+
+    def field_types(self, collection_name: str) -> Dict[str, Set[str]]:
+        """Field -> Python type names seen in the sample ("str", "datetime", ...)."""
+        self._ensure_fresh()
+        with self._lock:
+            return {field: set(names) for field, names in self._types.get(collection_name, {}).items()}
+
+    def collection_names(self) -> Set[str]:
+        self._ensure_fresh()
+        with self._lock:
+            return set(self._present)
+
+    def invalidate(self):
+        with self._lock:
+            self._stale = True
+
+    def add_listener(self, callback: Callable[[int], None]):
+        """Call `callback(version)` whenever a refresh changes the schemas."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    # ---------- change stream ----------
+    def _is_schema_change(self, event: dict) -> bool:
+        op = event.get("operationType")
+        if op in ("drop", "rename", "dropDatabase", "invalidate", "create"):
+            return True
+        collection = (event.get("ns") or {}).get("coll")
+        if collection not in self.known_collections:
+            return False
+        with self._lock:
+            known = set(self._schemas.get(collection, []))
+        if op in ("insert", "replace"):
+            doc = event.get("fullDocument") or {}
+            return any(key != "_id" and key not in known for key in doc)
+        if op == "update":
+            updated = (event.get("updateDescription") or {}).get("updatedFields") or {}
+            return any(key.split(".")[0] not in known for key in updated)
+        return False
+
+    def _watch(self):
+        try:
+            with self.db.watch() as stream:
+                logger.info("👀 Schema registry watching change stream")
+                for event in stream:
+                    if self._is_schema_change(event):
+                        logger.info(f"🗂️ Schema change detected ({event.get('operationType')}), refreshing")
+                        self.invalidate()
+        except Exception as e:
+            # Standalone servers have no change streams; the TTL still applies.
+            logger.info(f"ℹ️ Change stream unavailable, using TTL refresh only: {e}")
+
+    def start_watching(self):
+        if self.db is None or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name="schema-watch", daemon=True)
+        self._watcher.start()
@@ -0,0 +1,264 @@
+"""
+Two-level cache for dbchat's natural-language-to-SQL path.
+
+1. Question -> SQL: the normalized question maps to the SQL the model wrote
+   for it, so a repeated question skips the Bedrock call.
+2. SQL -> rows: the canonicalized SQL (case and whitespace outside string
+   literals folded) maps to its result rows, so a repeated query skips
+   Postgres. The TTL of a result is the shortest TTL of the tables it reads
+   (SQL_CACHE_TABLE_TTLS overrides the default per table). Tables are found
+   from the sql_guard tokens of every FROM / JOIN, comma lists included; a
+   query whose FROM clause cannot be read gets the shortest TTL of all and
+   counts as reading every table. The least
+   recently used results are evicted once the cache holds more than
+   `max_rows` rows or `max_bytes` of serialized rows.
+
+invalidate() drops everything, or only the results that read given tables
+(the question -> SQL level stays valid as long as the schema does).
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sql_guard import SqlGuardError, Token, tokenize
+
+logger = logging.getLogger("formatted-nova-assistant.sql-cache")
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+# Words that end a FROM list, or follow a relation without being its alias
+CLAUSE_WORDS = {
+    "where", "join", "inner", "left", "right", "full", "outer", "cross", "natural", "on", "using",
+    "group", "having", "window", "order", "limit", "offset", "fetch", "for", "union", "intersect",
+    "except", "tablesample", "lateral", "select", "returning",
+}
+FROM_LIST_END = {"where", "group", "having", "window", "order", "limit", "offset", "fetch", "for",
+                 "union", "intersect", "except", "select", "returning"}
+
+
+def normalize_question(question: str) -> str:
+    """Case and whitespace only: operators and numbers must survive ("> 5000" vs "< 5000")."""
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+def canonicalize_sql(sql: str) -> str:
+    """Lowercase and collapse whitespace outside string literals; drop the trailing semicolon."""
+    parts, last = [], 0
+    for match in STRING_LITERAL.finditer(sql):
+        parts.append(" ".join(sql[last:match.start()].lower().split()))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(" ".join(sql[last:].lower().split()))
+    return " ".join(p for p in parts if p).strip().rstrip(";").strip()
+
+
+def _relation(tokens: List[Token], i: int, tables: Set[str]) -> bool:
+    """Record the table named at tokens[i], if any; False when no relation starts there."""
+    while i < len(tokens) and tokens[i].lower in ("only", "lateral"):
+        i += 1
+    if i >= len(tokens):
+        return False
+    if tokens[i].text == "(":
+        return True  # subquery or join group: its own FROMs and JOINs are read separately
+    if tokens[i].kind not in ("word", "quoted") or tokens[i].lower in CLAUSE_WORDS:
+        return False
+    name = tokens[i].text
+    i += 1
+    while i + 1 < len(tokens) and tokens[i].text == "." and tokens[i + 1].kind in ("word", "quoted"):
+        name = tokens[i + 1].text
+        i += 2
+    if i >= len(tokens) or tokens[i].text != "(":  # otherwise a set-returning function
+        tables.add(name.replace('"', "").lower())
+    return True
+
+
+def referenced_tables(canonical_sql: str) -> Optional[Set[str]]:
+    """
+    Unqualified names of the tables after FROM, JOIN and the commas of a FROM
+    list; None when a top-level FROM list cannot be read.
+    """
+    try:
+        tokens = tokenize(canonical_sql)
+    except SqlGuardError:
+        return None
+    tables: Set[str] = set()
+    from_depths: Set[int] = set()  # parenthesis depths currently inside a FROM list
+    for i, token in enumerate(tokens):
+        from_depths = {depth for depth in from_depths if depth <= token.depth}
+        starts = (
+            (token.kind == "word" and token.lower in ("from", "join"))
+            or (token.text == "," and token.depth in from_depths)
+        )
+        if token.kind == "word" and token.lower in FROM_LIST_END:
+            from_depths.discard(token.depth)
+        if not starts:
+            continue
+        if token.lower == "from":
+            from_depths.add(token.depth)
+        # Inside parentheses FROM also belongs to EXTRACT / SUBSTRING / TRIM
+        if not _relation(tokens, i + 1, tables) and token.depth == 0:
+            return None
+    return tables
+
+
+def table_ttls_from_env(default: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Parse SQL_CACHE_TABLE_TTLS='{"salary": 300, "department": 86400}' into a dict."""
+    raw = os.getenv("SQL_CACHE_TABLE_TTLS")
+    if not raw:
+        return dict(default or {})
+    try:
+        return {str(k): float(v) for k, v in json.loads(raw).items()}
+    except (ValueError, AttributeError) as e:
+        logger.warning(f"⚠️ Ignoring invalid SQL_CACHE_TABLE_TTLS: {e}")
+        return dict(default or {})
+
+
+class _Result:
+    __slots__ = ("rows", "tables", "size", "created_at", "expires_at")
+
+    def __init__(self, rows: List[Dict[str, Any]], tables: Optional[Set[str]], size: int, ttl: float):
+        self.rows = rows
+        self.tables = tables  # None: unknown, treated as reading every table
+        self.size = size
+        self.created_at = time.monotonic()
+        self.expires_at = self.created_at + ttl
+
+
+class SqlCache:
+    """LRU + TTL caches of question -> SQL and SQL -> result rows."""
+
+    def __init__(
+        self,
+        sql_ttl: float = 86400.0,
+        result_ttl: float = 600.0,
+        table_ttls: Optional[Dict[str, float]] = None,
+        max_sql_entries: int = 2048,
+        max_rows: int = 200000,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entry_rows: int = 10000,
+    ):
+        self.sql_ttl = sql_ttl
+        self.result_ttl = result_ttl
+        self.table_ttls = table_ttls or {}
+        self.max_sql_entries = max_sql_entries
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_entry_rows = max_entry_rows
+        self._sql: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._results: "OrderedDict[str, _Result]" = OrderedDict()
+        self._rows = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.sql_hits = 0
+        self.sql_misses = 0
+        self.result_hits = 0
+        self.result_misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ---------- question -> SQL ----------
+    def get_sql(self, question: str) -> Optional[str]:
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._sql.get(key)
+            if entry is not None and time.monotonic() > entry[1]:
+                del self._sql[key]
+                entry = None
+            if entry is None:
+                self.sql_misses += 1
+                return None
+            self._sql.move_to_end(key)
+            self.sql_hits += 1
+            return entry[0]
+
+    def put_sql(self, question: str, sql: str):
+        key = normalize_question(question)
+        with self._lock:
+            self._sql[key] = (sql, time.monotonic() + self.sql_ttl)
+            self._sql.move_to_end(key)
+            while len(self._sql) > self.max_sql_entries:
+                self._sql.popitem(last=False)
+
+    # ---------- SQL -> rows ----------
+    def _drop_result_locked(self, key: str):
+        entry = self._results.pop(key)
+        self._rows -= len(entry.rows)
+        self._bytes -= entry.size
+
+    def get_rows(self, sql: str) -> Optional[Tuple[List[Dict[str, Any]], float]]:
+        """Cached rows of `sql` and their age in seconds, or None."""
+        key = canonicalize_sql(sql)
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and time.monotonic() > entry.expires_at:
+                self._drop_result_locked(key)
+                entry = None
+            if entry is None:
+                self.result_misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.result_hits += 1
+            return [dict(row) for row in entry.rows], time.monotonic() - entry.created_at
+
+    def put_rows(self, sql: str, rows: List[Dict[str, Any]]):
+        if len(rows) > self.max_entry_rows:
+            return
+        key = canonicalize_sql(sql)
+        tables = referenced_tables(key)
+        if tables is None:
+            ttl = min([self.result_ttl, *self.table_ttls.values()])
+        else:
+            ttl = min([self.table_ttls.get(table, self.result_ttl) for table in tables] or [self.result_ttl])
+        if ttl <= 0:
+            return
+        size = len(json.dumps(rows, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._results:
+                self._drop_result_locked(key)
+            self._results[key] = _Result([dict(row) for row in rows], tables, size, ttl)
+            self._rows += len(rows)
+            self._bytes += size
+            while self._results and (self._rows > self.max_rows or self._bytes > self.max_bytes):
+                self._drop_result_locked(next(iter(self._results)))
+                self.evictions += 1
+
+    # ---------- maintenance ----------
+    def invalidate(self, tables: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Drop every entry, or only the results reading any of `tables`."""
+        with self._lock:
+            self.invalidations += 1
+            if tables is None:
+                dropped = {"sql": len(self._sql), "results": len(self._results)}
+                self._sql.clear()
+                self._results.clear()
+                self._rows = self._bytes = 0
+            else:
+                names = {t.lower().split(".")[-1] for t in tables}
+                stale = [key for key, entry in self._results.items() if entry.tables is None or entry.tables & names]
+                for key in stale:
+                    self._drop_result_locked(key)
+                dropped = {"sql": 0, "results": len(stale)}
+        logger.info(f"🧹 SQL cache invalidated ({'all' if tables is None else ', '.join(tables)}): {dropped}")
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sql_lookups = self.sql_hits + self.sql_misses
+            result_lookups = self.result_hits + self.result_misses
+            return {
+                "sql_entries": len(self._sql),
+                "result_entries": len(self._results),
+                "rows": self._rows,
+                "bytes": self._bytes,
+                "sql_hit_rate": round(self.sql_hits / sql_lookups, 4) if sql_lookups else 0.0,
+                "result_hit_rate": round(self.result_hits / result_lookups, 4) if result_lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
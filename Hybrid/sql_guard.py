@@ -0,0 +1,198 @@
+"""
+Pre-execution guard for LLM-generated SQL.
+
+The SQL is tokenized (string literals - E'...' with backslash escapes too -,
+quoted identifiers and comments are recognized; dollar quoting is rejected),
+so checks look at real keywords: a column named `created_at`
+or `update_date` is one identifier token and no longer trips a substring
+match on "create" / "update".
+
+guard_sql() enforces:
+- exactly one statement, starting with SELECT or WITH
+- no data-modifying or session keyword anywhere (INSERT ... INTO, FOR
+  UPDATE, SET, COPY, ...) and no dangerous functions (pg_sleep, dblink, ...)
+- a top-level LIMIT: added when missing, lowered when above `max_limit`.
+  Only `LIMIT <integer>` (optionally followed by OFFSET) is trusted; any
+  other LIMIT (an expression, NULL, 1e9, ...) or a FETCH FIRST clause is
+  kept, and the whole query is wrapped in SELECT * FROM (...) LIMIT n
+
+explain_and_budget() then runs EXPLAIN (FORMAT JSON) on the same connection
+and rejects plans whose estimated total cost exceeds `max_cost`, or lowers
+the LIMIT when the plan estimates more than `max_rows` rows. Statements run
+in a READ ONLY transaction (set_read_only), so functions the denylist does
+not know about (lo_unlink, nextval, ...) still cannot write, and under SET
+LOCAL statement_timeout, scoped to that transaction.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+TOKEN = re.compile(
+    r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<symbol>::|<=|>=|<>|!=|\|\||[^\sA-Za-z0-9_])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+FORBIDDEN_KEYWORDS = {
+    "insert", "update", "delete", "merge", "drop", "alter", "create", "truncate", "grant",
+    "revoke", "copy", "call", "do", "execute", "prepare", "deallocate", "vacuum", "analyze",
+    "cluster", "reindex", "refresh", "lock", "set", "reset", "begin", "commit", "rollback",
+    "savepoint", "listen", "notify", "unlisten", "into",
+}
+FORBIDDEN_FUNCTIONS = {
+    "pg_sleep", "pg_sleep_for", "pg_sleep_until", "pg_terminate_backend", "pg_cancel_backend",
+    "pg_reload_conf", "pg_read_file", "pg_read_binary_file", "pg_ls_dir", "pg_stat_file",
+    "lo_import", "lo_export", "dblink", "dblink_exec", "set_config", "txid_current",
+}
+
+
+class SqlGuardError(ValueError):
+    pass
+
+
+@dataclass
+class Token:
+    kind: str
+    text: str
+    depth: int  # parenthesis depth at the token
+    start: int
+    end: int
+
+    @property
+    def lower(self) -> str:
+        return self.text.lower()
+
+
+@dataclass
+class GuardedSql:
+    sql: str
+    limit: Optional[int]
+    rewrites: List[str] = field(default_factory=list)
+    plan: Optional[Dict[str, Any]] = None  # {"total_cost", "plan_rows"} once explained
+
+
+def tokenize(sql: str) -> List[Token]:
+    tokens, depth, position = [], 0, 0
+    while position < len(sql):
+        match = TOKEN.match(sql, position)
+        if match is None:
+            raise SqlGuardError(f"Unterminated string or identifier near: {sql[position:position + 20]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        text = match.group(0)
+        if text == "$":
+            # Dollar quoting ($$...$$, $tag$...$tag$) and $n parameters are not tokenized
+            raise SqlGuardError("'$' is not allowed in generated queries")
+        if text == ")":
+            depth -= 1
+        tokens.append(Token(kind, text, depth, match.start(), match.end()))
+        if text == "(":
+            depth += 1
+        if depth < 0:
+            raise SqlGuardError("Unbalanced parentheses")
+    if depth != 0:
+        raise SqlGuardError("Unbalanced parentheses")
+    return tokens
+
+
+def guard_sql(sql: str, max_limit: Optional[int] = 50, default_limit: Optional[int] = None) -> GuardedSql:
+    """
+    Validate a generated query and return it with a top-level LIMIT.
+
+    `default_limit` (max_limit when None) is added when the query has no
+    LIMIT; a LIMIT above `max_limit` is lowered. max_limit=None skips LIMIT
+    handling (streaming, which caps rows itself).
+    """
+    tokens = tokenize(sql)
+    while tokens and tokens[-1].text == ";":
+        tokens.pop()
+    if not tokens:
+        raise SqlGuardError("Empty query")
+    if any(t.text == ";" for t in tokens):
+        raise SqlGuardError("Only a single statement is allowed")
+    if tokens[0].kind != "word" or tokens[0].lower not in ("select", "with"):
+        raise SqlGuardError("Only SELECT queries are allowed")
+
+    for i, token in enumerate(tokens):
+        if token.kind != "word":
+            continue
+        if token.lower in FORBIDDEN_KEYWORDS:
+            raise SqlGuardError(f"'{token.text.upper()}' is not allowed in read-only queries")
+        is_call = i + 1 < len(tokens) and tokens[i + 1].text == "("
+        if is_call and token.lower in FORBIDDEN_FUNCTIONS:
+            raise SqlGuardError(f"Function {token.text}() is not allowed")
+
+    # Edits are spliced into the original text; everything else is kept verbatim
+    sql = sql[:tokens[-1].end]
+    rewrites: List[str] = []
+    limit: Optional[int] = None
+    if max_limit is not None:
+        top_level = [i for i, t in enumerate(tokens) if t.depth == 0 and t.kind == "word"]
+        top_limit = next((i for i in top_level if tokens[i].lower == "limit"), None)
+        has_fetch = any(tokens[i].lower == "fetch" for i in top_level)
+        value = tokens[top_limit + 1] if top_limit is not None and top_limit + 1 < len(tokens) else None
+        following = tokens[top_limit + 2] if top_limit is not None and top_limit + 2 < len(tokens) else None
+        # LIMIT <integer> or LIMIT ALL, ending the query or followed by OFFSET
+        plain = (
+            not has_fetch
+            and value is not None
+            and ((value.kind == "number" and "." not in value.text) or value.lower == "all")
+            and (following is None or following.lower == "offset")
+        )
+        if top_limit is None and not has_fetch:
+            limit = default_limit or max_limit
+            sql = f"{sql} LIMIT {limit}"
+            rewrites.append(f"added LIMIT {limit}")
+        elif plain:
+            limit = None if value.lower == "all" else int(value.text)
+            if limit is None or limit > max_limit:
+                sql = f"{sql[:value.start]}{max_limit}{sql[value.end:]}"
+                rewrites.append(f"lowered LIMIT {value.text} to {max_limit}")
+                limit = max_limit
+        else:
+            # An expression or FETCH FIRST cannot be checked here: cap the whole query
+            limit = max_limit
+            sql = f"SELECT * FROM ({sql}) AS capped LIMIT {limit}"
+            rewrites.append(f"capped at {limit} rows")
+    return GuardedSql(sql, limit, rewrites)
+
+
+def set_read_only(cursor):
+    """Nothing the query calls can write; applies to the surrounding transaction."""
+    cursor.execute("SET TRANSACTION READ ONLY")
+
+
+def set_statement_timeout(cursor, timeout_ms: int):
+    """Per-query timeout; SET LOCAL ends with the surrounding transaction."""
+    cursor.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+
+
+def explain_and_budget(cursor, guarded: GuardedSql, max_cost: float, max_rows: Optional[int] = None) -> GuardedSql:
+    """EXPLAIN the query; reject it over `max_cost`, lower its LIMIT over `max_rows` (if given)."""
+    cursor.execute("EXPLAIN (FORMAT JSON) " + guarded.sql)
+    row = cursor.fetchone()
+    explained = row[0] if isinstance(row, (list, tuple)) else next(iter(row.values()))
+    plan = explained[0]["Plan"]
+    total_cost, plan_rows = float(plan["Total Cost"]), int(plan["Plan Rows"])
+    guarded.plan = {"total_cost": total_cost, "plan_rows": plan_rows}
+
+    if total_cost > max_cost:
+        raise SqlGuardError(
+            f"Query is too expensive to run (estimated cost {total_cost:,.0f}, budget {max_cost:,.0f}); "
+            "try narrowing it down, e.g. to one department or a date range"
+        )
+    if max_rows is not None and plan_rows > max_rows and (guarded.limit is None or guarded.limit > max_rows):
+        rewritten = guard_sql(guarded.sql, max_limit=max_rows)
+        guarded.sql, guarded.limit = rewritten.sql, rewritten.limit
+        guarded.rewrites += rewritten.rewrites
+    return guarded
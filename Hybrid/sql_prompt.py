@@ -0,0 +1,208 @@
+"""
+Prompt assembly for dbchat's question -> SQL call.
+
+The request is kept small rather than cached:
+
+- system[0]: static rules (identical on every call). There is no cachePoint:
+  the rules plus even the full schema come to a few hundred tokens, below
+  the minimum prefix Bedrock caches, so a checkpoint would never take effect
+- system[1]: only the tables relevant to the question, in one compact line
+  each. Tables are picked by keyword match against the question plus the
+  tables needed to join them (names live in employee, department names in
+  department). When nothing matches, or the question names values the
+  keywords cannot place (codes like d005, quoted text, proper names),
+  the whole schema is sent
+- inferenceConfig: a small maxTokens and stopSequences [";"], because the
+  answer is a single statement
+
+record() keeps the token usage Bedrock reports (input and output) and the
+latency, per request and in aggregate for /api/health.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+RULES = """You translate questions about an employees database into one PostgreSQL SELECT statement.
+Rules:
+1. Use only the tables and columns listed under Schema, with the exact names shown (schema-qualified).
+2. Use explicit JOINs and short aliases (e employee, d department, s salary, t title).
+3. Rows with to_date > CURRENT_DATE are current; older rows are history.
+4. Only SELECT. Add ORDER BY where it helps and LIMIT 50 unless the user asks otherwise.
+5. For vague questions (e.g. "highest salary") include employee names with the requested value.
+6. Prefer a summary view when one answers a question about the current state.
+Return only the SQL statement, without explanation or markdown."""
+
+
+@dataclass
+class SchemaTable:
+    name: str
+    columns: str
+    keywords: Tuple[str, ...]
+    requires: Tuple[str, ...] = ()  # tables needed to join or label this one
+
+    def line(self) -> str:
+        return f"{self.name}({self.columns})"
+
+
+DEPARTMENT_NAMES = (
+    "sales", "marketing", "development", "production", "research", "finance", "quality",
+    "customer", "service", "human", "resources", "hr",
+)
+
+SCHEMA = [
+    SchemaTable(
+        "employees.employee",
+        "id PK, birth_date, first_name, last_name, gender, hire_date",
+        ("employee", "name", "first", "last", "gender", "male", "female", "birth", "born", "age",
+         "hire", "hired", "person", "people", "who", "oldest", "youngest", "staff"),
+    ),
+    SchemaTable(
+        "employees.department",
+        "id PK, dept_name",
+        ("department", "dept", "division") + DEPARTMENT_NAMES,
+    ),
+    SchemaTable(
+        "employees.department_employee",
+        "employee_id -> employee.id, department_id -> department.id, from_date, to_date",
+        ("department", "dept", "division", "work", "works", "worked", "member", "headcount", "transfer")
+        + DEPARTMENT_NAMES,
+        requires=("employees.department",),
+    ),
+    SchemaTable(
+        "employees.department_manager",
+        "employee_id -> employee.id, department_id -> department.id, from_date, to_date",
+        ("manager", "manage", "managed", "manages", "head", "lead", "boss"),
+        requires=("employees.department", "employees.employee"),
+    ),
+    SchemaTable(
+        "employees.title",
+        "employee_id -> employee.id, title, from_date, to_date",
+        ("title", "role", "position", "job", "engineer", "senior", "assistant", "technique",
+         "leader", "promoted", "promotion"),
+        requires=("employees.employee",),
+    ),
+    SchemaTable(
+        "employees.salary",
+        "employee_id -> employee.id, amount, from_date, to_date",
+        ("salary", "pay", "paid", "earn", "earns", "earning", "income", "wage", "compensation",
+         "raise", "payroll", "highest", "lowest", "richest"),
+        requires=("employees.employee",),
+    ),
+]
+
+WORD = re.compile(r"[a-z]+")
+# Codes like d005, quoted text and capitalized words after the first one (plain
+# numbers are usually limits, years or amounts of a table the keywords found)
+VALUE = re.compile(r"\b[A-Za-z]+\d\w*|'[^']+'|\"[^\"]+\"|(?<=[^\s.!?] )[A-Z][a-z]+")
+# WITH [RECURSIVE] name [(columns)] AS [[NOT] MATERIALIZED] ( - prose starting with "With" does not match
+CTE_START = re.compile(
+    r"\bwith\s+(?:recursive\s+)?(?:[a-z_][a-z0-9_]*|\"[^\"]+\")\s*(?:\([^()]*\)\s*)?"
+    r"as\s*(?:(?:not\s+)?materialized\s*)?\(",
+    re.IGNORECASE,
+)
+SELECT_LINE = re.compile(r"^\s*select\b", re.IGNORECASE | re.MULTILINE)
+SELECT = re.compile(r"\bselect\b", re.IGNORECASE)
+
+
+def question_words(question: str) -> set:
+    words = set(WORD.findall(question.lower()))
+    # Crude plural folding: "salaries" -> "salary", "managers" -> "manager"
+    return words | {w[:-3] + "y" for w in words if w.endswith("ies")} | {w[:-1] for w in words if w.endswith("s")}
+
+
+def select_tables(question: str, tables: Sequence[Any], fallback_all: bool = True) -> List[Any]:
+    """
+    Tables whose keywords occur in the question, plus what they require.
+
+    With `fallback_all`, every table is returned when none match or when the
+    question names a value, since any table may hold it.
+    """
+    words = question_words(question)
+    by_name = {table.name: table for table in tables}
+    selected = [table for table in tables if words & set(table.keywords)]
+    known = {keyword for table in tables for keyword in table.keywords}
+    if fallback_all and any(m.group(0).lower() not in known for m in VALUE.finditer(question)):
+        return list(tables)
+    if not selected:
+        return list(tables) if fallback_all else []
+    names = {table.name for table in selected}
+    for table in list(selected):
+        for required in getattr(table, "requires", ()):
+            if required not in names and required in by_name:
+                names.add(required)
+    return [table for table in tables if table.name in names]
+
+
+def extract_sql(text: str) -> Optional[str]:
+    """The statement in a model reply (markdown fences and prose dropped), ending with ';'."""
+    text = re.sub(r"```(?:sql)?", "", text, flags=re.IGNORECASE)
+    # The first CTE or line-starting SELECT; otherwise the first SELECT anywhere
+    matches = [m for m in (CTE_START.search(text), SELECT_LINE.search(text)) if m]
+    match = min(matches, key=lambda m: m.start()) if matches else SELECT.search(text)
+    if not match:
+        return None
+    sql = text[match.start():].split(";")[0].strip().rstrip("`").strip()
+    return f"{sql};" if sql else None
+
+
+class SqlPromptBuilder:
+    """Builds Converse requests for SQL generation and tracks their token usage."""
+
+    def __init__(
+        self,
+        schema: Optional[List[SchemaTable]] = None,
+        views: Optional[Callable[[], List[Any]]] = None,
+        max_tokens: int = 200,
+    ):
+        self.schema = schema if schema is not None else SCHEMA
+        self.views = views
+        self.max_tokens = max_tokens
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latency_ms = 0
+
+    def schema_block(self, question: str) -> str:
+        lines = ["Schema:"] + [table.line() for table in select_tables(question, self.schema)]
+        views = select_tables(question, self.views(), fallback_all=False) if self.views is not None else []
+        if views:
+            lines.append("Summary views of the current state (faster than joining history tables):")
+            lines += [f"{view.name}: {view.description}" for view in views]
+        return "\n".join(lines)
+
+    def build(self, question: str, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """Keyword arguments for converse() (everything but modelId)."""
+        return {
+            "system": [{"text": RULES}, {"text": self.schema_block(question)}],
+            "messages": [{"role": "user", "content": [{"text": question}]}],
+            "inferenceConfig": {
+                "maxTokens": max_tokens or self.max_tokens,
+                "temperature": 0.1,
+                "topP": 0.9,
+                "stopSequences": [";"],
+            },
+        }
+
+    def record(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Token usage and latency of one Converse response (also added to the totals)."""
+        usage = response.get("usage", {})
+        record = {
+            "input_tokens": usage.get("inputTokens", 0),
+            "output_tokens": usage.get("outputTokens", 0),
+            "latency_ms": response.get("metrics", {}).get("latencyMs"),
+        }
+        self.requests += 1
+        self.input_tokens += record["input_tokens"]
+        self.output_tokens += record["output_tokens"]
+        self.latency_ms += record["latency_ms"] or 0
+        return record
+
+    def stats(self) -> Dict[str, Any]:
+        n = self.requests
+        return {
+            "requests": n,
+            "avg_input_tokens": round(self.input_tokens / n, 1) if n else None,
+            "avg_output_tokens": round(self.output_tokens / n, 1) if n else None,
+            "avg_latency_ms": round(self.latency_ms / n, 1) if n else None,
+        }
@@ -0,0 +1,219 @@
+"""
+Materialized current-state summaries of the employees dataset.
+
+Most dbchat questions are about the current state - salary per department,
+headcount by title, who manages what - and the generated SQL answers them by
+scanning employees.salary / department_employee / title with to_date
+filters every time. The views below precompute those answers:
+
+- employees.current_employee           one row per employee with current
+                                       department, title and salary
+- employees.department_salary_summary  headcount and salary stats per department
+- employees.title_headcount            headcount and average salary per title
+- employees.current_department_manager current manager(s) of each department
+
+SummaryRefresher creates missing views on start (in the background, so a cold
+database does not delay startup), refreshes them CONCURRENTLY every
+`interval` seconds so readers are never blocked, retries creating any view
+that failed before each refresh, and calls `on_refresh` with
+the refreshed view names so cached results built on them can be dropped.
+available_views() lists the views that are ready, for the SQL-generation prompt.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("formatted-nova-assistant.sql-summaries")
+
+
+@dataclass
+class SummaryView:
+    name: str
+    definition: str
+    unique_columns: Tuple[str, ...]  # required by REFRESH ... CONCURRENTLY
+    description: str                 # schema line for the prompt
+    keywords: Tuple[str, ...] = ()   # question words that make the view relevant
+    indexes: Tuple[str, ...] = ()
+
+
+SUMMARY_VIEWS = [
+    SummaryView(
+        name="employees.current_employee",
+        definition="""
+            SELECT DISTINCT ON (e.id)
+                e.id AS employee_id, e.first_name, e.last_name, e.gender, e.birth_date, e.hire_date,
+                de.department_id, d.dept_name, t.title, s.amount AS salary
+            FROM employees.employee e
+            LEFT JOIN employees.department_employee de ON de.employee_id = e.id AND de.to_date > CURRENT_DATE
+            LEFT JOIN employees.department d ON d.id = de.department_id
+            LEFT JOIN employees.title t ON t.employee_id = e.id AND t.to_date > CURRENT_DATE
+            LEFT JOIN employees.salary s ON s.employee_id = e.id AND s.to_date > CURRENT_DATE
+            ORDER BY e.id, de.from_date DESC, t.from_date DESC, s.from_date DESC
+        """,
+        unique_columns=("employee_id",),
+        keywords=("current", "currently", "now", "today", "present", "highest", "lowest", "top", "earn",
+                  "earns", "paid", "salary"),
+        indexes=("salary", "department_id", "title"),
+        description=(
+            "employee_id, first_name, last_name, gender, birth_date, hire_date, department_id, dept_name, "
+            "title, salary -- one row per employee, CURRENT department/title/salary (NULL if none)"
+        ),
+    ),
+    SummaryView(
+        name="employees.department_salary_summary",
+        definition="""
+            SELECT d.id AS department_id, d.dept_name, COUNT(*) AS headcount,
+                ROUND(AVG(s.amount)) AS avg_salary, MIN(s.amount) AS min_salary,
+                MAX(s.amount) AS max_salary, SUM(s.amount) AS total_salary
+            FROM employees.department d
+            JOIN employees.department_employee de ON de.department_id = d.id AND de.to_date > CURRENT_DATE
+            JOIN employees.salary s ON s.employee_id = de.employee_id AND s.to_date > CURRENT_DATE
+            GROUP BY d.id, d.dept_name
+        """,
+        unique_columns=("department_id",),
+        keywords=("average", "avg", "total", "payroll", "sum", "budget", "headcount", "per", "each"),
+        description=(
+            "department_id, dept_name, headcount, avg_salary, min_salary, max_salary, total_salary "
+            "-- CURRENT employees and salaries per department"
+        ),
+    ),
+    SummaryView(
+        name="employees.title_headcount",
+        definition="""
+            SELECT t.title, COUNT(*) AS headcount, ROUND(AVG(s.amount)) AS avg_salary
+            FROM employees.title t
+            LEFT JOIN employees.salary s ON s.employee_id = t.employee_id AND s.to_date > CURRENT_DATE
+            WHERE t.to_date > CURRENT_DATE
+            GROUP BY t.title
+        """,
+        unique_columns=("title",),
+        keywords=("title", "role", "position", "job", "headcount", "many"),
+        description="title, headcount, avg_salary -- CURRENT holders of each title",
+    ),
+    SummaryView(
+        name="employees.current_department_manager",
+        definition="""
+            SELECT dm.department_id, d.dept_name, e.id AS employee_id, e.first_name, e.last_name, dm.from_date
+            FROM employees.department_manager dm
+            JOIN employees.department d ON d.id = dm.department_id
+            JOIN employees.employee e ON e.id = dm.employee_id
+            WHERE dm.to_date > CURRENT_DATE
+        """,
+        unique_columns=("department_id", "employee_id"),
+        keywords=("manager", "manage", "manages", "managed", "head", "boss"),
+        description="department_id, dept_name, employee_id, first_name, last_name, from_date -- CURRENT managers",
+    ),
+]
+
+
+def _index_name(view: SummaryView, columns: Tuple[str, ...]) -> str:
+    return f"{view.name.split('.')[-1]}_{'_'.join(columns)}_idx"
+
+
+class SummaryRefresher:
+    """Creates the summary views and keeps them fresh on a background thread."""
+
+    def __init__(
+        self,
+        pool,
+        views: Optional[List[SummaryView]] = None,
+        interval: float = 3600.0,
+        refresh_timeout_ms: int = 600000,
+        on_refresh: Optional[Callable[[List[str]], Any]] = None,
+    ):
+        self.pool = pool
+        self.views = views if views is not None else SUMMARY_VIEWS
+        self.interval = interval
+        self.refresh_timeout_ms = refresh_timeout_ms
+        self.on_refresh = on_refresh
+        self._lock = threading.Lock()
+        self._status: Dict[str, Dict[str, Any]] = {
+            view.name: {"available": False, "refreshed_at": None, "seconds": None, "error": None}
+            for view in self.views
+        }
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _execute(self, statements: List[str]):
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                # Building or refreshing a summary takes longer than any chat query may
+                cursor.execute("SET LOCAL statement_timeout = %s", (self.refresh_timeout_ms,))
+                for statement in statements:
+                    cursor.execute(statement)
+            conn.commit()
+
+    def _record(self, view: SummaryView, started: float, error: Optional[Exception] = None):
+        with self._lock:
+            status = self._status[view.name]
+            if error is None:
+                status.update(available=True, refreshed_at=time.time(),
+                              seconds=round(time.perf_counter() - started, 2), error=None)
+            else:
+                status["error"] = str(error)
+
+    def ensure(self, views: Optional[List[SummaryView]] = None):
+        """Create missing views (populated) and their indexes; all views by default."""
+        for view in self.views if views is None else views:
+            started = time.perf_counter()
+            statements = [
+                f"CREATE MATERIALIZED VIEW IF NOT EXISTS {view.name} AS {view.definition} WITH DATA",
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {_index_name(view, view.unique_columns)} "
+                f"ON {view.name} ({', '.join(view.unique_columns)})",
+            ] + [
+                f"CREATE INDEX IF NOT EXISTS {_index_name(view, (column,))} ON {view.name} ({column})"
+                for column in view.indexes
+            ]
+            try:
+                self._execute(statements)
+                self._record(view, started)
+                logger.info(f"📊 Summary {view.name} ready in {time.perf_counter() - started:.1f}s")
+            except Exception as e:
+                self._record(view, started, e)
+                logger.warning(f"⚠️ Could not create summary {view.name}: {e}")
+
+    def refresh(self, views: Optional[List[SummaryView]] = None) -> List[str]:
+        """Refresh the given (by default every available) views; returns the names that were refreshed."""
+        refreshed = []
+        for view in self.available_views() if views is None else views:
+            started = time.perf_counter()
+            try:
+                self._execute([f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view.name}"])
+                self._record(view, started)
+                refreshed.append(view.name)
+            except Exception as e:
+                self._record(view, started, e)
+                logger.warning(f"⚠️ Refreshing summary {view.name} failed: {e}")
+        if refreshed and self.on_refresh is not None:
+            self.on_refresh(refreshed)
+        logger.info(f"📊 Refreshed {len(refreshed)} summary view(s)")
+        return refreshed
+
+    def _loop(self):
+        self.ensure()
+        while not self._stop.wait(self.interval):
+            ready = self.available_views()
+            missing = [view for view in self.views if view not in ready]
+            if missing:
+                # Views created now are already populated, so only the older ones are refreshed
+                self.ensure(missing)
+            self.refresh(ready)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="summary-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def available_views(self) -> List[SummaryView]:
+        with self._lock:
+            return [view for view in self.views if self._status[view.name]["available"]]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"interval_seconds": self.interval, "views": {name: dict(s) for name, s in self._status.items()}}
@@ -0,0 +1,186 @@
+"""
+Row counts for dbchat's /api/stats without scanning the tables on every load.
+
+- Estimates come from the catalog in one round trip: pg_class.reltuples
+  (maintained by ANALYZE / autovacuum), falling back to
+  pg_stat_user_tables.n_live_tup for tables that were never analyzed
+- Estimates are cached for `ttl` seconds; concurrent requests share one refresh
+- Exact COUNT(*)s run in the background when the last exact counts are older
+  than `exact_ttl`, at most `exact_concurrency` at a time (one table per
+  pooled connection), so long scans never take over the pool chat queries
+  share; they are served instead of estimates while they are fresh. After
+  a failed round no new one starts for `exact_retry` seconds (default
+  `exact_ttl`), so page loads never keep restarting long scans
+- get() reports where each number came from and how old it is
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("formatted-nova-assistant.table-stats")
+
+ESTIMATE_SQL = """
+    SELECT c.relname AS table_name,
+           c.reltuples::bigint AS reltuples,
+           s.n_live_tup AS live_tuples,
+           GREATEST(s.last_analyze, s.last_autoanalyze) AS analyzed_at
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE n.nspname = %s AND c.relname = ANY(%s)
+"""
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp else None
+
+
+def fetch_estimates(conn, schema: str, tables: List[str]) -> Dict[str, Dict[str, Any]]:
+    with conn.cursor() as cursor:
+        cursor.execute(ESTIMATE_SQL, (schema, list(tables)))
+        rows = cursor.fetchall()
+    conn.rollback()
+    estimates = {}
+    for row in rows:
+        # reltuples is -1 (PG 14+) or 0 for a table that was never analyzed
+        count = row["reltuples"] if row["reltuples"] and row["reltuples"] > 0 else row["live_tuples"]
+        analyzed_at = row["analyzed_at"]
+        estimates[row["table_name"]] = {
+            "count": int(count or 0),
+            "analyzed_at": analyzed_at.isoformat() if analyzed_at else None,
+        }
+    return estimates
+
+
+def count_table(conn, schema: str, table: str, timeout_ms: int) -> int:
+    with conn.cursor() as cursor:
+        # Longer than the pool's default statement timeout; ends with the transaction
+        cursor.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+        cursor.execute(f'SELECT COUNT(*) AS count FROM "{schema}"."{table}"')
+        count = cursor.fetchone()["count"]
+    conn.rollback()
+    return int(count)
+
+
+class TableStats:
+    """TTL-cached row count estimates with background exact counts."""
+
+    def __init__(
+        self,
+        pool,
+        schema: str,
+        tables: List[str],
+        ttl: float = 60.0,
+        exact_ttl: float = 3600.0,
+        exact_counts: bool = True,
+        timeout: float = 15.0,
+        exact_timeout: float = 300.0,
+        exact_concurrency: int = 1,
+        exact_retry: Optional[float] = None,
+    ):
+        self.pool = pool
+        self.schema = schema
+        self.tables = list(tables)
+        self.ttl = ttl
+        self.exact_ttl = exact_ttl
+        self.exact_counts = exact_counts
+        self.timeout = timeout
+        self.exact_timeout = exact_timeout
+        self.exact_concurrency = max(1, exact_concurrency)
+        self.exact_retry = exact_ttl if exact_retry is None else exact_retry
+        self._estimates: Dict[str, Dict[str, Any]] = {}
+        self._estimated_at: Optional[float] = None
+        self._exact: Dict[str, int] = {}
+        self._exact_at: Optional[float] = None
+        self._exact_seconds: Optional[float] = None
+        self._exact_error: Optional[str] = None
+        self._exact_failed_at: Optional[float] = None
+        self._exact_task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _refresh_estimates(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another request may have refreshed while this one waited
+            if self._estimated_at is not None and time.time() - self._estimated_at < self.ttl:
+                return
+            self._estimates = await self.pool.run(fetch_estimates, self.schema, self.tables, timeout=self.timeout)
+            self._estimated_at = time.time()
+
+    async def _count(self, semaphore: asyncio.Semaphore, table: str) -> int:
+        async with semaphore:
+            return await self.pool.run(
+                count_table, self.schema, table, int(self.exact_timeout * 1000), timeout=self.exact_timeout
+            )
+
+    async def _refresh_exact(self):
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.exact_concurrency)
+        try:
+            counts = await asyncio.gather(*[self._count(semaphore, table) for table in self.tables])
+            self._exact = dict(zip(self.tables, counts))
+            self._exact_at = time.time()
+            self._exact_seconds = round(time.perf_counter() - started, 2)
+            self._exact_error = None
+            self._exact_failed_at = None
+            logger.info(f"📊 Exact counts for {len(self.tables)} tables in {self._exact_seconds}s")
+        except Exception as e:
+            self._exact_error = str(e) or type(e).__name__
+            self._exact_failed_at = time.time()
+            logger.warning(f"⚠️ Exact counts failed, next attempt in {self.exact_retry:.0f}s: {self._exact_error}")
+
+    def _exact_fresh(self) -> bool:
+        return self._exact_at is not None and time.time() - self._exact_at < self.exact_ttl
+
+    def _backing_off(self) -> bool:
+        return self._exact_failed_at is not None and time.time() - self._exact_failed_at < self.exact_retry
+
+    def _start_exact_refresh(self):
+        if (
+            self.exact_counts
+            and not self._exact_fresh()
+            and not self._backing_off()
+            and (self._exact_task is None or self._exact_task.done())
+        ):
+            self._exact_task = asyncio.create_task(self._refresh_exact())
+
+    async def get(self) -> Dict[str, Any]:
+        """Per-table counts (exact when fresh, otherwise estimated) with freshness info."""
+        if self._estimated_at is None or time.time() - self._estimated_at >= self.ttl:
+            await self._refresh_estimates()
+        self._start_exact_refresh()
+
+        now = time.time()
+        use_exact = self._exact_fresh()
+        tables = {}
+        for table in self.tables:
+            estimate = self._estimates.get(table, {})
+            if use_exact and table in self._exact:
+                tables[table] = {"count": self._exact[table], "source": "exact", "as_of": _iso(self._exact_at)}
+            else:
+                tables[table] = {
+                    "count": estimate.get("count"),
+                    "source": "estimate",
+                    "as_of": _iso(self._estimated_at),
+                    "analyzed_at": estimate.get("analyzed_at"),
+                }
+        return {
+            "tables": tables,
+            "source": "exact" if use_exact else "estimate",
+            "age_seconds": round(now - (self._exact_at if use_exact else self._estimated_at), 1),
+            "exact_refreshing": self._exact_task is not None and not self._exact_task.done(),
+            "exact_as_of": _iso(self._exact_at),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "estimate_age_seconds": round(time.time() - self._estimated_at, 1) if self._estimated_at else None,
+            "exact_age_seconds": round(time.time() - self._exact_at, 1) if self._exact_at else None,
+            "exact_seconds": self._exact_seconds,
+            "exact_error": self._exact_error,
+            "exact_failed_age_seconds": round(time.time() - self._exact_failed_at, 1) if self._exact_failed_at else None,
+        }
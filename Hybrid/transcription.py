@@ -0,0 +1,352 @@
+"""
+Whisper transcription service.
+
+The Whisper model is never loaded in the server process. A pool of worker
+processes is started on first use (or warmed explicitly) and each worker
+loads the model once, lazily, and keeps it for its lifetime.
+
+Audio and video uploads are decoded by an ffmpeg subprocess straight into
+16 kHz mono PCM on a pipe - no intermediate WAV file is written. The stream
+is read window by window (WHISPER_WINDOW_SECONDS, 30 s = Whisper's native
+context), so only the windows in flight are held in memory, however long the
+recording. Each cut is moved to the quietest 20 ms frame in the last seconds
+before the boundary, so words are rarely split. Windows are transcribed in
+parallel across the workers and segments are yielded in order as soon as
+their window is done, so ingestion can chunk and embed the start of a
+recording while the rest is still being decoded and transcribed.
+
+Run `python transcription.py [media file]` for a CPU benchmark (defaults to
+the bundled tushar.mp4).
+"""
+
+import logging
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("formatted-nova-assistant.transcription")
+
+SAMPLE_RATE = 16000
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".m4a"}
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".mkv"}
+MEDIA_EXTENSIONS = AUDIO_EXTENSIONS | VIDEO_EXTENSIONS
+
+
+@dataclass
+class TranscriptSegment:
+    start: float  # seconds from the start of the recording
+    end: float
+    text: str
+
+
+def _ffmpeg_command(path: str, sample_rate: int) -> List[str]:
+    # -vn: never decode the video stream of .mp4/.mov/.mkv uploads
+    return [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0", "-i", path, "-vn",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-",
+    ]
+
+
+def iter_audio(path: str, block_seconds: float = 30.0, sample_rate: int = SAMPLE_RATE) -> Iterator[np.ndarray]:
+    """Decode any ffmpeg-readable audio or video file to float32 PCM blocks, streamed from a pipe."""
+    block_bytes = int(block_seconds * sample_rate) * 2
+    proc = subprocess.Popen(
+        _ffmpeg_command(path, sample_rate), stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    # Drain stderr on a thread so a chatty ffmpeg can never block on a full pipe
+    errors: List[bytes] = []
+    drain = threading.Thread(target=lambda: errors.append(proc.stderr.read()), daemon=True)
+    drain.start()
+    try:
+        while True:
+            data = proc.stdout.read(block_bytes)
+            if not data:
+                break
+            data = data[:len(data) - len(data) % 2]
+            yield np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        returncode = proc.wait()
+        drain.join()
+    if returncode != 0:
+        raise RuntimeError(f"Failed to decode audio: {b''.join(errors).decode(errors='ignore')[-500:]}")
+
+
+def load_audio(path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Decode a whole file to mono float32 PCM (same as whisper.load_audio)."""
+    blocks = list(iter_audio(path, sample_rate=sample_rate))
+    return np.concatenate(blocks) if blocks else np.zeros(0, np.float32)
+
+
+def _cut_point(audio: np.ndarray, start: int, window: int, search: int, frame: int) -> int:
+    """End of the window starting at `start`: the quietest frame in the last `search` samples."""
+    end = start + window
+    low = max(start + window // 2, end - search)
+    frames = (end - low) // frame
+    if frames:
+        energy = np.square(audio[low:low + frames * frame].reshape(frames, frame)).mean(axis=1)
+        end = low + int(np.argmin(energy)) * frame + frame // 2
+    return end
+
+
+def split_windows(
+    audio: np.ndarray,
+    window_seconds: float = 30.0,
+    search_seconds: float = 2.0,
+    sample_rate: int = SAMPLE_RATE,
+) -> List[Tuple[int, int]]:
+    """Cut audio into ~window_seconds spans, each ending at the quietest nearby frame."""
+    window = int(window_seconds * sample_rate)
+    search = int(search_seconds * sample_rate)
+    frame = int(0.02 * sample_rate)
+    bounds, start, total = [], 0, len(audio)
+    while start < total:
+        if start + window >= total:
+            bounds.append((start, total))
+            break
+        end = _cut_point(audio, start, window, search, frame)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def iter_windows(
+    blocks: Iterable[np.ndarray],
+    window_seconds: float = 30.0,
+    search_seconds: float = 2.0,
+    sample_rate: int = SAMPLE_RATE,
+) -> Iterator[Tuple[float, np.ndarray]]:
+    """Streaming split_windows: yield (offset seconds, window) from a stream of PCM blocks."""
+    window = int(window_seconds * sample_rate)
+    search = int(search_seconds * sample_rate)
+    frame = int(0.02 * sample_rate)
+    buffer = np.zeros(0, np.float32)
+    offset = 0
+    for block in blocks:
+        buffer = np.concatenate((buffer, block))
+        while len(buffer) > window:
+            end = _cut_point(buffer, 0, window, search, frame)
+            yield offset / sample_rate, buffer[:end]
+            buffer = buffer[end:]
+            offset += end
+    if len(buffer):
+        yield offset / sample_rate, buffer
+
+
+# ============================================================
+# Worker process side
+# ============================================================
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+
+
+def _init_worker(threads: int):
+    # Split the cores between workers instead of every worker using all of them
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _load_model(model_size: str):
+    global _MODEL
+    with _MODEL_LOCK:
+        if _MODEL is None:
+            import whisper  # heavy (torch); only ever imported inside workers
+            started = time.perf_counter()
+            _MODEL = whisper.load_model(model_size, device="cpu")
+            logger.info(f"🔊 Whisper '{model_size}' loaded in worker {os.getpid()} in {time.perf_counter() - started:.1f}s")
+    return _MODEL
+
+
+def _warm(model_size: str) -> int:
+    _load_model(model_size)
+    return os.getpid()
+
+
+def _transcribe_window(model_size: str, audio: np.ndarray, offset: float, language: Optional[str]) -> List[Tuple[float, float, str]]:
+    model = _load_model(model_size)
+    result = model.transcribe(audio, fp16=False, language=language, condition_on_previous_text=False)
+    return [
+        (offset + segment["start"], offset + segment["end"], segment["text"].strip())
+        for segment in result.get("segments", [])
+        if segment["text"].strip()
+    ]
+
+
+# ============================================================
+# Service
+# ============================================================
+class TranscriptionService:
+    """Lazily started pool of Whisper workers with windowed, streamed transcription."""
+
+    def __init__(
+        self,
+        model_size: str = "base",
+        workers: Optional[int] = None,
+        window_seconds: float = 30.0,
+        language: Optional[str] = None,
+    ):
+        self.model_size = model_size
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) // 2))
+        self.window_seconds = window_seconds
+        self.language = language
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+        self.recordings = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(threads,),
+                )
+                logger.info(f"🔊 Started {self.workers} Whisper worker(s), {threads} thread(s) each")
+            return self._pool
+
+    def warm(self):
+        """Start the workers and load the model in each of them in the background."""
+        pool = self._executor()
+        for _ in range(self.workers):
+            pool.submit(_warm, self.model_size)
+
+    def iter_segments(self, source: Any) -> Iterator[TranscriptSegment]:
+        """Transcribe a media file path or a 16 kHz float32 array; yield segments in order."""
+        started = time.perf_counter()
+        blocks = iter_audio(source, self.window_seconds) if isinstance(source, str) else [source]
+        windows = iter_windows(blocks, self.window_seconds)
+        pool = self._executor()
+
+        in_flight: Deque = deque()
+        count, duration = 0, 0.0
+        try:
+            while True:
+                # Bounded in-flight windows keep memory flat on long recordings
+                while len(in_flight) < self.workers * 2:
+                    item = next(windows, None)
+                    if item is None:
+                        break
+                    offset, audio = item
+                    count += 1
+                    duration = offset + len(audio) / SAMPLE_RATE
+                    in_flight.append(pool.submit(_transcribe_window, self.model_size, audio, offset, self.language))
+                if not in_flight:
+                    break
+                for start, end, text in in_flight.popleft().result():
+                    yield TranscriptSegment(start, end, text)
+        finally:
+            for future in in_flight:
+                future.cancel()
+            windows.close()
+            if isinstance(source, str):
+                blocks.close()  # stops ffmpeg if the caller gave up early
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.recordings += 1
+                self.audio_seconds += duration
+                self.busy_seconds += elapsed
+            logger.info(
+                f"🔊 Transcribed {duration:.1f}s of audio in {count} window(s), "
+                f"{elapsed:.1f}s ({duration / elapsed if elapsed else 0:.1f}x realtime)"
+            )
+
+    def transcribe(self, source: Any) -> str:
+        return " ".join(segment.text for segment in self.iter_segments(source))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "model": self.model_size,
+                "workers": self.workers,
+                "started": self._pool is not None,
+                "recordings": self.recordings,
+                "audio_seconds": round(self.audio_seconds, 1),
+                "realtime_factor": round(self.audio_seconds / self.busy_seconds, 2) if self.busy_seconds else None,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+# ============================================================
+# Benchmark: whole-file transcribe vs windowed worker pool (CPU)
+# ============================================================
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    here = os.path.dirname(os.path.abspath(__file__))
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(here, "uploads", "68ecd3c07504827902404c34", "tushar.mp4")
+    model_size = os.getenv("WHISPER_MODEL_SIZE", "base")
+
+    # Decode: temp WAV round trip (the old moviepy path) vs PCM streamed from the pipe
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wav_path = os.path.join(tmp, "audio.wav")
+        started = time.perf_counter()
+        subprocess.run(["ffmpeg", "-nostdin", "-loglevel", "error", "-i", path, "-vn", "-ac", "1",
+                        "-ar", str(SAMPLE_RATE), "-acodec", "pcm_s16le", wav_path], check=True)
+        audio = load_audio(wav_path)
+        wav_time = time.perf_counter() - started
+        wav_bytes = os.path.getsize(wav_path)
+    started = time.perf_counter()
+    samples = sum(len(block) for block in iter_audio(path))
+    pipe_time = time.perf_counter() - started
+    duration = len(audio) / SAMPLE_RATE
+    assert samples == len(audio), "pipe and WAV decode differ"
+    print(f"{os.path.basename(path)}: {duration:.1f}s of audio, model '{model_size}', {os.cpu_count()} cores")
+    print(f"decode via WAV : {wav_time:6.2f}s  ({wav_bytes / 1024 / 1024:.1f} MB written to disk)")
+    print(f"decode via pipe: {pipe_time:6.2f}s  (0 MB written to disk)")
+
+    import whisper
+
+    started = time.perf_counter()
+    model = whisper.load_model(model_size, device="cpu")
+    load_time = time.perf_counter() - started
+    started = time.perf_counter()
+    baseline = model.transcribe(audio, fp16=False)["text"].strip()
+    baseline_time = time.perf_counter() - started
+    print(f"single process : load {load_time:5.1f}s  transcribe {baseline_time:6.1f}s  ({duration / baseline_time:.1f}x realtime)")
+    del model
+
+    # Short windows so even a short clip is spread over the workers
+    for window_seconds in (30.0, max(5.0, duration / 4)):
+        service = TranscriptionService(model_size, window_seconds=window_seconds)
+        started = time.perf_counter()
+        for future in [service._executor().submit(_warm, model_size) for _ in range(service.workers)]:
+            future.result()
+        warm_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        first_segment = None
+        segments = []
+        for segment in service.iter_segments(path):
+            first_segment = first_segment or time.perf_counter() - started
+            segments.append(segment.text)
+        elapsed = time.perf_counter() - started
+        print(f"pool {service.workers}w/{window_seconds:4.0f}s: warm {warm_time:5.1f}s  decode+transcribe {elapsed:6.1f}s  "
+              f"({duration / elapsed:.1f}x realtime, first segment after {first_segment or 0:.1f}s)")
+        service.shutdown()
+
+    print(f"\nbaseline: {baseline[:200]}\nwindowed: {' '.join(segments)[:200]}")
@@ -0,0 +1,552 @@
+"""
+Pluggable vector store for document retrieval.
+
+VectorStore is the small interface the RAG code needs: upsert, query with a
+metadata filter, delete by filter. Two backends implement it:
+
+- PineconeVectorStore: thin wrapper around a Pinecone index (the default)
+- LocalVectorStore: on-disk IVF index, one partition per user, for
+  air-gapped deployments and to skip the network round trip on every query
+
+A local partition keeps its vectors (unit-normalized float32) in an
+append-only file read through a memory map, and ids, metadata and the IVF list
+of every row in SQLite. Inserts are assigned to the nearest centroid, so they
+are incremental; deletes and overwrites only mark rows as tombstones, and the
+partition is compacted once tombstones pass a fraction of the rows.
+
+SQLite is the source of truth. Vectors are appended before their rows are
+committed, so after a crash the file can only be longer than the row table,
+and it is truncated back on open. Compaction writes a new file generation and
+switches to it in the same transaction that rewrites the rows.
+
+Below `exact_below` live vectors a partition is searched exactly: one matrix
+product over the memory map is faster than probing lists at that size, and
+loses no recall. Centroids are only trained, with spherical k-means, once the
+partition reaches that size, and retrained as it keeps growing.
+
+Filters use the Pinecone subset the app sends: {"field": value} or
+{"field": {"$eq": value}}, combined with AND.
+
+Run `python vector_store.py` for a recall/latency benchmark against brute force.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("formatted-nova-assistant.vector-store")
+
+
+def _filter_equals(filter: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Flatten {"field": {"$eq": v}} / {"field": v} into {"field": v}."""
+    equals = {}
+    for field, condition in (filter or {}).items():
+        if isinstance(condition, dict):
+            unsupported = set(condition) - {"$eq"}
+            if unsupported:
+                raise ValueError(f"Unsupported filter operator(s) for '{field}': {sorted(unsupported)}")
+            condition = condition["$eq"]
+        equals[field] = condition
+    return equals
+
+
+class VectorStore:
+    """Interface shared by the vector backends."""
+
+    backend = "none"
+
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        """Insert or replace [{"id", "values", "metadata"}, ...]."""
+        raise NotImplementedError
+
+    def query(self, vector: List[float], top_k: int = 5, filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Return [{"id", "score", "metadata"}, ...] ordered by similarity."""
+        raise NotImplementedError
+
+    def delete(self, filter: Optional[Dict[str, Any]] = None, ids: Optional[List[str]] = None):
+        """Delete by metadata filter, or by `ids` (the filter's user_id then only routes the delete)."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend}
+
+
+class PineconeVectorStore(VectorStore):
+    backend = "pinecone"
+
+    def __init__(self, index):
+        self.index = index
+
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        self.index.upsert(vectors=vectors)
+
+    def query(self, vector: List[float], top_k: int = 5, filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        result = self.index.query(vector=vector, top_k=top_k, include_metadata=True, filter=filter)
+        return [
+            {"id": match.get("id"), "score": match.get("score"), "metadata": match.get("metadata") or {}}
+            for match in result.get("matches", [])
+        ]
+
+    def delete(self, filter: Optional[Dict[str, Any]] = None, ids: Optional[List[str]] = None):
+        if ids is None:
+            self.index.delete(filter=filter)
+            return
+        # Pinecone accepts at most 1000 ids per delete
+        for start in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[start:start + 1000])
+
+
+def _spherical_kmeans(data: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Unit-norm centroids maximizing cosine similarity to their members."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # Re-seed empty clusters with random points
+        sums[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+        norms[empty] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class _Partition:
+    """IVF index over one user's vectors."""
+
+    def __init__(self, path: str, nprobe: int, exact_below: int, compact_ratio: float):
+        self.path = path
+        self.nprobe = nprobe
+        self.exact_below = exact_below
+        self.compact_ratio = compact_ratio
+        self.lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._centroids_path = os.path.join(path, "centroids.npy")
+
+        self._conn = sqlite3.connect(os.path.join(path, "meta.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                source TEXT,
+                metadata TEXT NOT NULL,
+                list INTEGER NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rows_id ON rows(id) WHERE deleted = 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rows_source ON rows(source) WHERE deleted = 0")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+        info = dict(self._conn.execute("SELECT key, value FROM info").fetchall())
+        self.dim = int(info["dim"]) if "dim" in info else None
+        self.trained_at = int(info.get("trained_at", 0))
+        self.generation = int(info.get("generation", 0))
+        self._vectors_path = self._generation_path(self.generation)
+        self.centroids = np.load(self._centroids_path) if os.path.exists(self._centroids_path) else None
+
+        # In-memory row state, rebuilt from SQLite
+        lists, alive = [], []
+        for list_id, deleted in self._conn.execute("SELECT list, deleted FROM rows ORDER BY row"):
+            lists.append(list_id)
+            alive.append(not deleted)
+        self._lists = np.array(lists, dtype=np.int32)
+        self._alive = np.array(alive, dtype=bool)
+        self._inverted: Optional[List[np.ndarray]] = None
+        self._mmap: Optional[np.memmap] = None
+        self._reconcile()
+
+    # ---------- storage ----------
+    def _generation_path(self, generation: int) -> str:
+        name = "vectors.f32" if generation == 0 else f"vectors.{generation}.f32"
+        return os.path.join(self.path, name)
+
+    def _reconcile(self):
+        """Make the vector file match the committed rows after an interrupted write."""
+        current = os.path.basename(self._vectors_path)
+        for name in os.listdir(self.path):
+            # Leftovers of a compaction that did not commit, or of one that did
+            if name.startswith("vectors.") and name.endswith((".f32", ".compact")) and name != current:
+                os.remove(os.path.join(self.path, name))
+        if self.dim is None:
+            return
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        if size > self.rows * row_bytes:
+            logger.warning(f"⚠️ {self.path}: dropping {size - self.rows * row_bytes} uncommitted vector bytes")
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(self.rows * row_bytes)
+        elif size < self.rows * row_bytes:
+            # Rows without vectors (the file lost its tail): forget them
+            stored = size // row_bytes
+            logger.warning(f"⚠️ {self.path}: {self.rows - stored} rows have no stored vector, dropping them")
+            self._conn.execute("DELETE FROM rows WHERE row >= ?", (stored,))
+            self._conn.commit()
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(stored * row_bytes)
+            self._lists = self._lists[:stored]
+            self._alive = self._alive[:stored]
+
+    @property
+    def rows(self) -> int:
+        return len(self._alive)
+
+    @property
+    def live(self) -> int:
+        return int(self._alive.sum())
+
+    def _matrix(self) -> np.ndarray:
+        if self._mmap is None or len(self._mmap) != self.rows:
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self.rows, self.dim)) if self.rows else None
+        return self._mmap if self._mmap is not None else np.empty((0, self.dim or 0), dtype=np.float32)
+
+    def _assign(self, data: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.zeros(len(data), dtype=np.int32)
+        return np.argmax(data @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        if self._inverted is None:
+            live_rows = np.flatnonzero(self._alive)
+            nlist = 1 if self.centroids is None else len(self.centroids)
+            order = np.argsort(self._lists[live_rows], kind="stable")
+            sorted_rows = live_rows[order]
+            bounds = np.searchsorted(self._lists[sorted_rows], np.arange(nlist + 1))
+            self._inverted = [sorted_rows[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+        return self._inverted
+
+    # ---------- writes ----------
+    def upsert(self, ids: List[str], data: np.ndarray, metadatas: List[Dict[str, Any]]):
+        with self.lock:
+            if self.dim is None:
+                self.dim = data.shape[1]
+                self._conn.execute("INSERT OR REPLACE INTO info VALUES ('dim', ?)", (str(self.dim),))
+            elif data.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {data.shape[1]} does not match index dimension {self.dim}")
+
+            # Overwrites tombstone the previous version of the id
+            self._tombstone_where(f"id IN ({','.join('?' * len(ids))})", ids)
+
+            start = self.rows
+            assign = self._assign(data)
+            # Vectors first: rows are only committed once their vectors are on disk
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(data, dtype=np.float32).tobytes())
+            try:
+                self._conn.executemany(
+                    "INSERT INTO rows (row, id, source, metadata, list) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (start + i, vid, meta.get("source"), json.dumps(meta), int(assign[i]))
+                        for i, (vid, meta) in enumerate(zip(ids, metadatas))
+                    ],
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                self._alive = np.array([not d for (d,) in self._conn.execute("SELECT deleted FROM rows ORDER BY row")], dtype=bool)
+                self._inverted = None
+                with open(self._vectors_path, "r+b") as f:
+                    f.truncate(start * self.dim * 4)
+                raise
+            self._lists = np.concatenate([self._lists, assign])
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            self._inverted = None
+
+            if self.live >= self.exact_below and (self.centroids is None or self.live >= 4 * self.trained_at):
+                self._train()
+
+    def _tombstone_where(self, clause: str, params: Iterable[Any]) -> int:
+        rows = [r for (r,) in self._conn.execute(f"SELECT row FROM rows WHERE deleted = 0 AND {clause}", list(params))]
+        if rows:
+            self._conn.executemany("UPDATE rows SET deleted = 1 WHERE row = ?", [(r,) for r in rows])
+            self._alive[rows] = False
+            self._inverted = None
+        return len(rows)
+
+    def delete(self, equals: Dict[str, Any], ids: Optional[List[str]] = None) -> int:
+        with self.lock:
+            if ids is not None:
+                removed = 0
+                for start in range(0, len(ids), 500):
+                    batch = ids[start:start + 500]
+                    removed += self._tombstone_where(f"id IN ({','.join('?' * len(batch))})", batch)
+            else:
+                clause, params = ["1 = 1"], []
+                for field, value in equals.items():
+                    if field == "source":
+                        clause.append("source = ?")
+                    else:
+                        clause.append(f"json_extract(metadata, '$.{field}') = ?")
+                    params.append(value)
+                removed = self._tombstone_where(" AND ".join(clause), params)
+            self._conn.commit()
+            if self.rows and (self.rows - self.live) / self.rows > self.compact_ratio:
+                self.compact()
+            return removed
+
+    def _train(self):
+        live_rows = np.flatnonzero(self._alive)
+        nlist = max(1, min(1024, int(np.sqrt(len(live_rows)))))
+        sample = live_rows if len(live_rows) <= 64 * nlist else np.random.default_rng(0).choice(live_rows, 64 * nlist, replace=False)
+        matrix = self._matrix()
+        self.centroids = _spherical_kmeans(np.asarray(matrix[np.sort(sample)]), nlist)
+        np.save(self._centroids_path, self.centroids)
+
+        # Re-assign every row in blocks to bound memory
+        lists = np.zeros(self.rows, dtype=np.int32)
+        for start in range(0, self.rows, 65536):
+            lists[start:start + 65536] = self._assign(np.asarray(matrix[start:start + 65536]))
+        self._conn.executemany("UPDATE rows SET list = ? WHERE row = ?", [(int(l), r) for r, l in enumerate(lists)])
+        self.trained_at = len(live_rows)
+        self._conn.execute("INSERT OR REPLACE INTO info VALUES ('trained_at', ?)", (str(self.trained_at),))
+        self._conn.commit()
+        self._lists = lists
+        self._inverted = None
+        logger.info(f"🧭 Trained IVF index at {self.path}: {nlist} lists over {len(live_rows)} vectors")
+
+    def compact(self):
+        """Rewrite the vector file and row table without tombstones."""
+        with self.lock:
+            live_rows = np.flatnonzero(self._alive)
+            matrix = self._matrix()
+            generation = self.generation + 1
+            new_path = self._generation_path(generation)
+            with open(new_path, "wb") as f:
+                for start in range(0, len(live_rows), 65536):
+                    f.write(np.asarray(matrix[live_rows[start:start + 65536]]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            # The rows and the file generation they index switch in one transaction
+            kept = self._conn.execute("SELECT id, source, metadata, list FROM rows WHERE deleted = 0 ORDER BY row").fetchall()
+            self._conn.execute("DELETE FROM rows")
+            self._conn.executemany(
+                "INSERT INTO rows (row, id, source, metadata, list) VALUES (?, ?, ?, ?, ?)",
+                [(i, *values) for i, values in enumerate(kept)],
+            )
+            self._conn.execute("INSERT OR REPLACE INTO info VALUES ('generation', ?)", (str(generation),))
+            self._conn.commit()
+            self._mmap = None
+            old_path, self._vectors_path, self.generation = self._vectors_path, new_path, generation
+            os.remove(old_path)
+            self._lists = self._lists[live_rows]
+            self._alive = np.ones(len(live_rows), dtype=bool)
+            self._inverted = None
+            logger.info(f"🧹 Compacted {self.path}: {len(live_rows)} live vectors")
+
+    # ---------- reads ----------
+    def search(self, query: np.ndarray, top_k: int, equals: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with self.lock:
+            if not self.live or query.shape[0] != self.dim:
+                return []
+            if self.centroids is None or self.live < self.exact_below:
+                # Exact: score every row in one pass, then drop the tombstones
+                scores = np.asarray(self._matrix()) @ query
+                candidates = np.arange(self.rows)
+                if self.live < self.rows:
+                    candidates = candidates[self._alive]
+                    scores = scores[self._alive]
+            else:
+                inverted = self._inverted_lists()
+                probe = np.argsort(-(self.centroids @ query))[:self.nprobe]
+                # Sorted rows read the memory map front to back
+                candidates = np.sort(np.concatenate([inverted[c] for c in probe]))
+                if not len(candidates):
+                    return []
+                scores = np.asarray(self._matrix()[candidates]) @ query
+
+            # Over-fetch when metadata filters may drop candidates
+            want = min(len(candidates), top_k * 4 if equals else top_k)
+            top = np.argpartition(-scores, want - 1)[:want]
+            top = top[np.argsort(-scores[top])]
+            rows = [int(candidates[i]) for i in top]
+            meta = dict(self._conn.execute(
+                f"SELECT row, id || char(0) || metadata FROM rows WHERE row IN ({','.join('?' * len(rows))})", rows
+            ).fetchall())
+
+        matches = []
+        for row, score in zip(rows, scores[top]):
+            vid, _, raw = meta[row].partition("\0")
+            metadata = json.loads(raw)
+            if all(metadata.get(field) == value for field, value in equals.items()):
+                matches.append({"id": vid, "score": float(score), "metadata": metadata})
+                if len(matches) == top_k:
+                    break
+        return matches
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "vectors": self.live,
+            "tombstones": self.rows - self.live,
+            "lists": 0 if self.centroids is None else len(self.centroids),
+        }
+
+
+class LocalVectorStore(VectorStore):
+    """On-disk vector store partitioned by the `user_id` metadata field (IVF for large partitions)."""
+
+    backend = "local"
+
+    def __init__(self, root: str, nprobe: int = 16, exact_below: int = 50_000, compact_ratio: float = 0.3):
+        self.root = root
+        self.nprobe = nprobe
+        self.exact_below = exact_below
+        self.compact_ratio = compact_ratio
+        self._partitions: Dict[str, _Partition] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _partition_dir(self, user_id: str) -> str:
+        return os.path.join(self.root, hashlib.sha256(str(user_id).encode("utf-8")).hexdigest()[:24])
+
+    def _partition(self, user_id: str, create: bool = True) -> Optional[_Partition]:
+        with self._lock:
+            partition = self._partitions.get(user_id)
+            if partition is None:
+                path = self._partition_dir(user_id)
+                if not create and not os.path.isdir(path):
+                    return None
+                partition = _Partition(path, self.nprobe, self.exact_below, self.compact_ratio)
+                self._partitions[user_id] = partition
+            return partition
+
+    def _all_user_ids(self) -> List[str]:
+        # Partition directories are hashed; the first metadata row names the user
+        user_ids = set(self._partitions)
+        for name in os.listdir(self.root):
+            db_path = os.path.join(self.root, name, "meta.sqlite3")
+            if not os.path.exists(db_path):
+                continue
+            conn = sqlite3.connect(db_path)
+            try:
+                row = conn.execute("SELECT json_extract(metadata, '$.user_id') FROM rows LIMIT 1").fetchone()
+            finally:
+                conn.close()
+            if row and row[0] is not None:
+                user_ids.add(row[0])
+        return list(user_ids)
+
+    @staticmethod
+    def _normalize(values: Any) -> np.ndarray:
+        data = np.atleast_2d(np.asarray(values, dtype=np.float32))
+        norms = np.linalg.norm(data, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return data / norms
+
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        by_user: Dict[str, List[Dict[str, Any]]] = {}
+        for vector in vectors:
+            user_id = (vector.get("metadata") or {}).get("user_id")
+            if user_id is None:
+                raise ValueError(f"Vector {vector.get('id')} has no user_id metadata")
+            by_user.setdefault(user_id, []).append(vector)
+        for user_id, group in by_user.items():
+            self._partition(user_id).upsert(
+                [v["id"] for v in group],
+                self._normalize([v["values"] for v in group]),
+                [v.get("metadata") or {} for v in group],
+            )
+
+    def query(self, vector: List[float], top_k: int = 5, filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        equals = _filter_equals(filter)
+        query = self._normalize(vector)[0]
+        user_id = equals.pop("user_id", None)
+        user_ids = [user_id] if user_id is not None else self._all_user_ids()
+        matches = []
+        for uid in user_ids:
+            partition = self._partition(uid, create=False)
+            if partition is not None:
+                matches.extend(partition.search(query, top_k, equals))
+        matches.sort(key=lambda m: m["score"], reverse=True)
+        return matches[:top_k]
+
+    def delete(self, filter: Optional[Dict[str, Any]] = None, ids: Optional[List[str]] = None):
+        equals = _filter_equals(filter)
+        user_id = equals.pop("user_id", None)
+        user_ids = [user_id] if user_id is not None else self._all_user_ids()
+        removed = 0
+        for uid in user_ids:
+            partition = self._partition(uid, create=False)
+            if partition is not None:
+                removed += partition.delete(equals, ids)
+        logger.info(f"🗑️ Tombstoned {removed} vectors matching {filter if ids is None else f'{len(ids)} ids'}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            partitions = dict(self._partitions)
+        return {
+            "backend": self.backend,
+            "partitions_loaded": len(partitions),
+            "vectors": sum(p.live for p in partitions.values()),
+            "tombstones": sum(p.rows - p.live for p in partitions.values()),
+        }
+
+
+# ============================================================
+# Benchmark: IVF recall/latency vs brute-force NumPy
+# ============================================================
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    logging.basicConfig(level=logging.WARNING)
+    rng = np.random.default_rng(42)
+    dim, n_queries, top_k = 256, 100, 5
+
+    # Clustered data, like document chunks
+    centers = rng.normal(size=(200, dim)).astype(np.float32)
+    queries = centers[rng.integers(0, 200, n_queries)] + 2.0 * rng.normal(size=(n_queries, dim)).astype(np.float32)
+
+    # 40k stays below exact_below (exact search); 120k is served by the IVF lists
+    for n in (40_000, 120_000):
+        data = centers[rng.integers(0, 200, n)] + 2.0 * rng.normal(size=(n, dim)).astype(np.float32)
+        root = tempfile.mkdtemp(prefix="vector-bench-")
+        try:
+            store = LocalVectorStore(root)
+            started = time.perf_counter()
+            for start in range(0, n, 5000):
+                store.upsert([
+                    {"id": f"v{i}", "values": data[i], "metadata": {"user_id": "bench", "source": f"doc{i % 50}.pdf", "text": ""}}
+                    for i in range(start, start + 5000)
+                ])
+            partition = store._partition("bench")
+            print(f"n={n}: inserted in {time.perf_counter() - started:.2f}s  {partition.stats()}")
+
+            normalized = LocalVectorStore._normalize(data)
+            for nprobe in ((None,) if partition.centroids is None else (8, 16, 32, 64)):
+                if nprobe is not None:
+                    partition.nprobe = nprobe
+                hits, search_time, brute_time = 0, 0.0, 0.0
+                for q in queries:
+                    started = time.perf_counter()
+                    found = store.query(q, top_k=top_k, filter={"user_id": {"$eq": "bench"}})
+                    search_time += time.perf_counter() - started
+
+                    started = time.perf_counter()
+                    scores = normalized @ LocalVectorStore._normalize(q)[0]
+                    truth = np.argpartition(-scores, top_k)[:top_k]
+                    brute_time += time.perf_counter() - started
+
+                    hits += len({f"v{i}" for i in truth} & {m["id"] for m in found})
+                mode = "exact   " if nprobe is None else f"nprobe={nprobe:>2}"
+                print(f"  {mode}  recall@{top_k} {hits / (n_queries * top_k):.3f}  "
+                      f"search {search_time / n_queries * 1000:.2f}ms/query  "
+                      f"in-memory brute force {brute_time / n_queries * 1000:.2f}ms/query")
+
+            store.delete({"user_id": "bench", "source": "doc1.pdf"})
+            assert not [m for m in store.query(data[1], top_k=10, filter={"user_id": "bench"}) if m["metadata"]["source"] == "doc1.pdf"]
+            print(f"  after delete: {store.stats()}")
+        finally:
+            shutil.rmtree(root)